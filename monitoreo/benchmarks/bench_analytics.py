@@ -0,0 +1,97 @@
+# benchmarks/bench_analytics.py
+"""
+Compara dispositivos/analytics.py (NumPy, vectorizado) con el cálculo
+equivalente recorriendo instancias de Measurement en Python puro.
+
+Uso (desde el directorio monitoreo/):
+
+    python benchmarks/bench_analytics.py --days 90 --interval 60
+"""
+import argparse
+import math
+import os
+import sys
+from collections import defaultdict
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import measure, setup_django  # noqa: E402
+
+
+def python_device_stats(device, days):
+    """Versión de referencia: un bucle sobre instancias del modelo."""
+    from django.utils import timezone
+    from dispositivos.models import Measurement
+
+    end = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    start = end - timedelta(days=days)
+    values = []
+    hourly = defaultdict(float)
+    for measurement in Measurement.objects.filter(
+        device=device, timestamp__gte=start, timestamp__lt=end
+    ).order_by('timestamp'):
+        value = float(measurement.consumption_kwh)
+        values.append(value)
+        hourly[measurement.timestamp.replace(minute=0, second=0, microsecond=0)] += value
+    if not values:
+        return {}
+
+    hours = int(days * 24)
+    series = [hourly.get(start + timedelta(hours=h), 0.0) for h in range(hours)]
+    mean = sum(values) / len(values)
+    ordered = sorted(values)
+
+    def percentile(p):
+        k = (len(ordered) - 1) * p / 100
+        f, c = math.floor(k), math.ceil(k)
+        return ordered[f] + (ordered[c] - ordered[f]) * (k - f)
+
+    profile = defaultdict(list)
+    for h, value in enumerate(series):
+        profile[(start + timedelta(hours=h)).hour].append(value)
+    rolling = [sum(series[i - 24:i]) / 24 for i in range(24, len(series) + 1)]
+    rated_kw = device.power_watts / 1000
+    return {
+        'total_kwh': sum(values),
+        'mean_kwh': mean,
+        'std_kwh': math.sqrt(sum((v - mean) ** 2 for v in values) / len(values)),
+        'percentiles_kwh': {f'p{p}': percentile(p) for p in (50, 90, 95, 99)},
+        'peak_hour': max(range(24), key=lambda h: sum(profile[h]) / max(len(profile[h]), 1)),
+        'rolling_24h_kw': rolling[-1] if rolling else None,
+        'load_factor': (sum(series) / hours) / rated_kw,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=5)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--interval', type=int, default=60, help='Seconds between readings')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--db', help='SQLite file to use (default: temporary file)')
+    args = parser.parse_args()
+
+    setup_django(args.db)
+    from dispositivos import analytics, loadgen
+    from dispositivos.models import Device
+
+    stats = loadgen.generate(devices=args.devices, days=args.days, interval=args.interval, alert_rate=0)
+    device = Device.objects.order_by('id').first()
+    print(f'{stats["measurements"]} measurements, {device.measurements.count()} for the benchmarked device')
+
+    numpy_result = analytics.device_analytics(device, days=args.days)
+    python_result = python_device_stats(device, args.days)
+    print(f'total_kwh numpy={numpy_result["total_kwh"]} python={round(python_result["total_kwh"], 3)}')
+    print(f'p95 numpy={numpy_result["percentiles_kwh"]["p95"]} python={round(python_result["percentiles_kwh"]["p95"], 3)}')
+    print(f'load_factor numpy={numpy_result["load_factor"]} python={round(python_result["load_factor"], 4)}')
+
+    vectorized = measure(lambda: analytics.device_analytics(device, days=args.days), repeat=args.repeat)
+    loop = measure(lambda: python_device_stats(device, args.days), repeat=args.repeat)
+    print(f'\nNumPy       median {vectorized["median_ms"]:>10.2f} ms')
+    print(f'ORM + loop  median {loop["median_ms"]:>10.2f} ms')
+    print(f'speedup x{loop["median_ms"] / vectorized["median_ms"]:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+# benchmarks/bench_indexes.py
+"""
+Compara planes de consulta y latencia de measurement_list, device_detail y
+alert_summary con y sin los índices compuestos de Measurement y Alert.
+
+Uso (desde el directorio monitoreo/):
+
+    python benchmarks/bench_indexes.py --devices 200 --days 30 --interval 900
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import measure, setup_django  # noqa: E402
+
+
+def seed(devices, days, interval, alert_rate):
+    """Dos organizaciones del mismo tamaño, para que el filtro por organización importe."""
+    from dispositivos import loadgen
+    from dispositivos.models import Device, Organization
+
+    stats = loadgen.generate(organizations=2, devices=devices, days=days,
+                             interval=interval, alert_rate=alert_rate)
+    org = Organization.objects.filter(email__endswith=f'@{loadgen.EMAIL_DOMAIN}').order_by('id').first()
+    return stats, org, Device.objects.filter(organization=org).order_by('id').first()
+
+
+def scenarios(org, device):
+    """Consultas principales de cada vista, para EXPLAIN, y su URL."""
+    from django.utils import timezone
+    from dispositivos.models import Alert, Measurement
+
+    week_ago = timezone.now() - timedelta(days=7)
+    return {
+        'measurement_list': (
+            '/measurements/',
+            Measurement.objects.filter(organization=org).select_related('device').order_by('-timestamp')[:50],
+        ),
+        'device_detail': (
+            f'/devices/{device.id}/',
+            Measurement.objects.filter(device=device).order_by('-timestamp')[:20],
+        ),
+        'alert_summary': (
+            '/alerts/',
+            Alert.objects.filter(organization=org, alert_date__gte=week_ago).order_by('-alert_date'),
+        ),
+    }
+
+
+def run_phase(label, org, device, repeat):
+    from django.test import Client
+
+    client = Client()
+    results = {}
+    for name, (url, queryset) in scenarios(org, device).items():
+        response = client.get(url)
+        assert response.status_code == 200, f'{url} returned {response.status_code}'
+        results[name] = {
+            'plan': queryset.explain(),
+            'latency': measure(lambda: client.get(url), repeat=repeat),
+        }
+    print(f'\n=== {label} ===')
+    for name, result in results.items():
+        print(f'\n[{name}] median {result["latency"]["median_ms"]} ms, p95 {result["latency"]["p95_ms"]} ms')
+        print(result['plan'])
+    return results
+
+
+def composite_indexes():
+    from dispositivos.models import Alert, Measurement
+    return [(model, index) for model in (Measurement, Alert) for index in model._meta.indexes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=100, help='Devices per organization')
+    parser.add_argument('--days', type=float, default=30)
+    parser.add_argument('--interval', type=int, default=1800, help='Seconds between readings')
+    parser.add_argument('--alert-rate', type=float, default=0.02)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--db', help='SQLite file to use (default: temporary file)')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    db_path = setup_django(args.db)
+    from django.db import connection
+
+    print(f'Seeding into {db_path}...')
+    stats, org, device = seed(args.devices, args.days, args.interval, args.alert_rate)
+    print(f'{stats["measurements"]} measurements, {stats["alerts"]} alerts in {stats["elapsed_seconds"]} s')
+
+    indexes = composite_indexes()
+    with connection.schema_editor() as editor:
+        for model, index in indexes:
+            editor.remove_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    before = run_phase('BEFORE (FK indexes only)', org, device, args.repeat)
+
+    with connection.schema_editor() as editor:
+        for model, index in indexes:
+            editor.add_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    after = run_phase('AFTER (composite indexes)', org, device, args.repeat)
+
+    print('\n=== SUMMARY (median ms) ===')
+    for name in before:
+        b = before[name]['latency']['median_ms']
+        a = after[name]['latency']['median_ms']
+        print(f'{name:<18} before {b:>10.3f}  after {a:>10.3f}  speedup x{b / a if a else 0:.1f}')
+
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump({'before': before, 'after': after}, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
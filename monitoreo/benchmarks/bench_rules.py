@@ -0,0 +1,99 @@
+# benchmarks/bench_rules.py
+"""
+Throughput del motor de reglas de alertas (dispositivos/rules.py).
+
+Genera un catálogo con loadgen y pasa lecturas sintéticas (sin guardar) por
+``RuleEngine.evaluate`` para medir lecturas/segundo sólo de la evaluación, y
+luego por ``ingest_measurements`` para medir la ingesta completa con reglas
+(bulk_create de mediciones y alertas).
+
+Uso (desde el directorio monitoreo/):
+
+    python benchmarks/bench_rules.py --devices 500 --readings 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import setup_django  # noqa: E402
+
+
+def synthetic_readings(devices, count, interval, seed):
+    """Lecturas en orden cronológico, rondando la potencia nominal de cada equipo."""
+    from django.utils import timezone
+    from dispositivos.models import Measurement
+
+    rng = random.Random(seed)
+    start = timezone.now() - timedelta(seconds=interval * (count // len(devices) + 1))
+    readings = []
+    for n in range(count):
+        device = devices[n % len(devices)]
+        step = n // len(devices)
+        # kWh por intervalo a ~0.5-1.6 veces la potencia nominal
+        kwh = device.power_watts / 1000 * interval / 3600 * rng.uniform(0.5, 1.6)
+        readings.append(Measurement(
+            organization_id=device.organization_id,
+            device_id=device.id,
+            consumption_kwh=Decimal(f'{kwh:.3f}'),
+            timestamp=start + timedelta(seconds=step * interval),
+        ))
+    return readings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--zones', type=int, default=20)
+    parser.add_argument('--readings', type=int, default=100000)
+    parser.add_argument('--interval', type=int, default=300, help='Seconds between readings of a device')
+    parser.add_argument('--batch', type=int, default=5000, help='Readings per ingest call')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='SQLite file to use (default: temporary file)')
+    args = parser.parse_args()
+
+    setup_django(args.db)
+    from dispositivos import loadgen
+    from dispositivos.ingestion import ingest_measurements
+    from dispositivos.models import Alert, Device
+    from dispositivos.rules import RuleEngine, engine
+
+    loadgen.generate(devices=args.devices, zones=args.zones, days=0, alert_rate=0, seed=args.seed)
+    devices = list(Device.objects.order_by('id'))
+    readings = synthetic_readings(devices, args.readings, args.interval, args.seed)
+
+    evaluator = RuleEngine()
+    started = time.perf_counter()
+    alerts = 0
+    for start in range(0, len(readings), args.batch):
+        alerts += len(evaluator.evaluate(readings[start:start + args.batch]))
+    elapsed = time.perf_counter() - started
+    print(f'evaluate  {len(readings)} readings in {elapsed:.3f}s -> '
+          f'{len(readings) / elapsed:,.0f} readings/s, {alerts} alerts')
+
+    engine.reset()
+    rows = [
+        {'device': m.device_id, 'consumption_kwh': str(m.consumption_kwh), 'timestamp': m.timestamp.isoformat()}
+        for m in readings
+    ]
+    started = time.perf_counter()
+    for start in range(0, len(rows), args.batch):
+        ingest_measurements(rows[start:start + args.batch])
+    elapsed = time.perf_counter() - started
+    print(f'ingest    {len(rows)} readings in {elapsed:.3f}s -> '
+          f'{len(rows) / elapsed:,.0f} readings/s, {Alert.objects.count()} alerts stored')
+
+    started = time.perf_counter()
+    for start in range(0, len(rows), args.batch):
+        ingest_measurements(rows[start:start + args.batch], evaluate_rules=False)
+    elapsed = time.perf_counter() - started
+    print(f'no rules  {len(rows)} readings in {elapsed:.3f}s -> {len(rows) / elapsed:,.0f} readings/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/common.py
+"""Utilidades compartidas por los scripts de benchmark."""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(db_path=None):
+    """
+    Inicializa Django apuntando a una base SQLite aparte (nunca a db.sqlite3)
+    y aplica las migraciones. Devuelve la ruta de la base usada.
+    """
+    if str(PROJECT_DIR) not in sys.path:
+        sys.path.insert(0, str(PROJECT_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'monitoreo.settings')
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='ecoenergy-bench-'), 'bench.sqlite3')
+
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = str(db_path)
+    settings.ALLOWED_HOSTS = ['*']
+    settings.DEBUG = False
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return db_path
+
+
+def switch_database(db_path):
+    """Cierra la conexión actual, apunta a otra base SQLite y la migra."""
+    from django.core.management import call_command
+    from django.db import connection
+
+    connection.close()
+    connection.settings_dict['NAME'] = str(db_path)
+    call_command('migrate', verbosity=0)
+    return db_path
+
+
+def measure(fn, repeat=10, warmup=1):
+    """Ejecuta ``fn`` varias veces y devuelve estadísticas de latencia en ms."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'min_ms': round(samples[0], 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'max_ms': round(samples[-1], 3),
+    }
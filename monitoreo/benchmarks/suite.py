@@ -0,0 +1,329 @@
+# benchmarks/suite.py
+"""
+Suite de benchmarks de las vistas, la ingesta y los agregados.
+
+Para cada tamaño de dataset crea una base SQLite aparte con loadgen y mide:
+
+- cada vista con nombre de ``monitoreo/urls.py`` (GET autenticado): latencia
+  (mediana/p95), consultas con el caché frío y tibio, y memoria pico;
+- ``ingest_measurements`` con un lote de lecturas nuevas (filas/segundo);
+- ``build_rollups`` incremental y ``--rebuild``.
+
+Los resultados se escriben como JSON y dos ejecuciones se pueden comparar
+para detectar regresiones.
+
+Uso (desde el directorio monitoreo/):
+
+    python benchmarks/suite.py --sizes small,medium --output before.json
+    python benchmarks/suite.py --sizes small,medium --output after.json
+    python benchmarks/suite.py --compare before.json after.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import measure, setup_django, switch_database  # noqa: E402
+
+SIZES = {
+    'small': {'devices': 20, 'zones': 4, 'days': 7, 'interval': 3600},
+    'medium': {'devices': 100, 'zones': 10, 'days': 30, 'interval': 900},
+    'large': {'devices': 300, 'zones': 20, 'days': 60, 'interval': 600},
+}
+
+# Vistas que no se pueden medir con un GET simple
+SKIPPED_VIEWS = {
+    'measurement_ingest': 'POST only; measured as ingestion',
+    'live_feed': 'endless event stream',
+    'logout': 'ends the benchmark session',
+}
+
+INGEST_BATCH = 5000
+
+
+def _reset_process_state():
+    """Limpia cachés y estado en memoria que sobreviven al cambio de base."""
+    from django.core.cache import caches
+    from dispositivos.caching import get_cache
+    from dispositivos.middleware import organization_cache
+    from dispositivos.rules import engine
+    from dispositivos.zoneload import tracker
+
+    get_cache().clear()
+    caches['default'].clear()
+    organization_cache.clear()
+    engine.reset()
+    tracker.reset()
+
+
+def seed(options):
+    from django.contrib.auth.models import User
+    from dispositivos import loadgen
+    from dispositivos.models import Device, Membership, Organization, Zone
+    from dispositivos.rollups import update_rollups
+
+    stats = loadgen.generate(alert_rate=0.01, **options)
+    organization = Organization.objects.order_by('id').first()
+    update_rollups()
+    user = User.objects.create_user('bench', 'bench@ecoenergy.test', 'bench', is_staff=True, is_superuser=True)
+    Membership.objects.create(user=user, organization=organization)
+    device = Device.objects.filter(organization=organization).order_by('id').first()
+    zone = Zone.objects.filter(organization=organization).order_by('id').first()
+    return stats, user, device, zone
+
+
+def view_targets(device, zone):
+    """(etiqueta, url) de cada vista con nombre, resolviendo sus parámetros."""
+    from django.urls import URLPattern, get_resolver, reverse
+    from dispositivos.api import RESOURCES
+
+    values = {
+        'device_id': device.pk,
+        'dispositivo_id': device.pk,
+        'zone_id': zone.pk,
+        'pk': device.pk,
+        'token': uuid.uuid4(),
+    }
+    targets = []
+    for pattern in get_resolver().url_patterns:
+        if not isinstance(pattern, URLPattern) or not pattern.name or pattern.name in SKIPPED_VIEWS:
+            continue
+        params = list(pattern.pattern.converters)
+        if 'resource' in params:
+            resources = RESOURCES if pattern.name == 'api_list' else ['devices']
+            for resource in resources:
+                kwargs = {name: values[name] for name in params if name != 'resource'}
+                targets.append((f'{pattern.name}[{resource}]', reverse(pattern.name, kwargs=dict(kwargs, resource=resource))))
+            continue
+        targets.append((pattern.name, reverse(pattern.name, kwargs={name: values[name] for name in params})))
+    return targets
+
+
+def _fetch(client, url):
+    response = client.get(url)
+    if getattr(response, 'streaming', False):
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def _count_queries(fn):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as queries:
+        result = fn()
+    return len(queries), result
+
+
+def _peak_memory_kb(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def bench_views(client, device, zone, organization_id, repeat):
+    from dispositivos.caching import invalidate_organization_blocks
+
+    results = {}
+    for label, url in view_targets(device, zone):
+        invalidate_organization_blocks(organization_id)
+        cold_queries, response = _count_queries(lambda: _fetch(client, url))
+        warm_queries, _ = _count_queries(lambda: _fetch(client, url))
+        results[label] = {
+            'url': url,
+            'status': response.status_code,
+            'queries_cold': cold_queries,
+            'queries_warm': warm_queries,
+            'peak_memory_kb': _peak_memory_kb(lambda: _fetch(client, url)),
+            **measure(lambda: _fetch(client, url), repeat=repeat),
+        }
+    return results
+
+
+def bench_ingestion(devices, batches):
+    from django.utils import timezone
+    from dispositivos.ingestion import ingest_measurements
+
+    now = timezone.now()
+    batch_rows = [
+        [
+            {
+                'device': devices[n % len(devices)],
+                'consumption_kwh': f'{(n % 97) / 10:.3f}',
+                'timestamp': (now - timedelta(seconds=batch * INGEST_BATCH + n)).isoformat(),
+            }
+            for n in range(INGEST_BATCH)
+        ]
+        for batch in range(batches)
+    ]
+    queries, _ = _count_queries(lambda: ingest_measurements(batch_rows[0]))
+    peak = _peak_memory_kb(lambda: ingest_measurements(batch_rows[1 % batches]))
+    started = time.perf_counter()
+    for rows in batch_rows:
+        ingest_measurements(rows)
+    elapsed = time.perf_counter() - started
+    total = INGEST_BATCH * batches
+    return {
+        'batch_size': INGEST_BATCH,
+        'batches': batches,
+        'queries_per_batch': queries,
+        'peak_memory_kb': peak,
+        'elapsed_ms': round(elapsed * 1000, 3),
+        'rows_per_second': round(total / elapsed, 1),
+    }
+
+
+def bench_rollups():
+    from django.core.management import call_command
+
+    def run(*args):
+        started = time.perf_counter()
+        with open(os.devnull, 'w') as devnull:
+            call_command('build_rollups', *args, stdout=devnull)
+        return round((time.perf_counter() - started) * 1000, 3)
+
+    # Incremental: procesa las mediciones que dejó la ingesta
+    incremental_queries, incremental_ms = _count_queries(run)
+    return {
+        'incremental_ms': incremental_ms,
+        'incremental_queries': incremental_queries,
+        'rebuild_ms': run('--rebuild'),
+    }
+
+
+def run_size(name, options, repeat, workdir):
+    from django.test import Client
+    from dispositivos.models import Device
+
+    switch_database(os.path.join(workdir, f'{name}.sqlite3'))
+    _reset_process_state()
+    print(f'[{name}] seeding {options}...', flush=True)
+    stats, user, device, zone = seed(options)
+
+    # Una vista con error queda registrada con su status en vez de abortar la suite
+    client = Client(raise_request_exception=False)
+    client.force_login(user)
+    print(f'[{name}] {stats["measurements"]} measurements; benchmarking views...', flush=True)
+    views = bench_views(client, device, zone, device.organization_id, repeat)
+
+    print(f'[{name}] ingestion and rollups...', flush=True)
+    device_ids = list(Device.objects.filter(organization_id=device.organization_id).values_list('id', flat=True))
+    ingestion = bench_ingestion(device_ids, batches=4)
+    rollups = bench_rollups()
+    return {'dataset': dict(options, **stats), 'views': views, 'ingestion': ingestion, 'rollups': rollups}
+
+
+def run(sizes, repeat):
+    import django
+
+    workdir = tempfile.mkdtemp(prefix='ecoenergy-suite-')
+    setup_django(os.path.join(workdir, 'setup.sqlite3'))
+    results = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+        },
+        'sizes': {},
+    }
+    for name in sizes:
+        results['sizes'][name] = run_size(name, SIZES[name], repeat, workdir)
+    return results
+
+
+# -- Comparación ---------------------------------------------------------------
+
+def _metrics(run_result):
+    """Aplana los resultados a {(tamaño, sección, nombre, métrica): valor}."""
+    flat = {}
+    for size, data in run_result['sizes'].items():
+        for label, view in data['views'].items():
+            for metric in ('median_ms', 'p95_ms', 'queries_cold', 'queries_warm', 'peak_memory_kb'):
+                flat[(size, 'view', label, metric)] = view[metric]
+        for metric in ('elapsed_ms', 'queries_per_batch', 'peak_memory_kb'):
+            flat[(size, 'ingestion', 'ingest_measurements', metric)] = data['ingestion'][metric]
+        for metric in ('incremental_ms', 'rebuild_ms'):
+            flat[(size, 'rollups', 'build_rollups', metric)] = data['rollups'][metric]
+    return flat
+
+
+def compare(baseline, current, threshold):
+    """
+    Regresiones de ``current`` frente a ``baseline``: tiempos y memoria que
+    crecen más que ``threshold`` (proporción) y cualquier consulta adicional.
+    """
+    before, after = _metrics(baseline), _metrics(current)
+    regressions = []
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        metric = key[3]
+        if metric.startswith('queries'):
+            regressed = new > old
+        else:
+            regressed = old > 0 and new > old * (1 + threshold)
+        if regressed:
+            change = f'+{(new - old) / old:.0%}' if old else 'new'
+            regressions.append({'size': key[0], 'section': key[1], 'name': key[2],
+                                'metric': metric, 'before': old, 'after': new, 'change': change})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='small', help=f'Comma separated: {", ".join(SIZES)}')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='Compare two result files instead of running')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed relative slowdown before flagging a regression')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as baseline_file, open(args.compare[1]) as current_file:
+            regressions = compare(json.load(baseline_file), json.load(current_file), args.threshold)
+        for item in regressions:
+            print(f'REGRESSION {item["size"]:<7} {item["section"]:<10} {item["name"]:<35} '
+                  f'{item["metric"]:<16} {item["before"]} -> {item["after"]} ({item["change"]})')
+        print(f'{len(regressions)} regressions (threshold {args.threshold:.0%})')
+        sys.exit(1 if regressions else 0)
+
+    sizes = [name.strip() for name in args.sizes.split(',') if name.strip()]
+    unknown = [name for name in sizes if name not in SIZES]
+    if unknown:
+        parser.error(f'unknown sizes: {", ".join(unknown)}')
+
+    results = run(sizes, args.repeat)
+    for size, data in results['sizes'].items():
+        print(f'\n== {size} ({data["dataset"]["measurements"]} measurements)')
+        for label, view in data['views'].items():
+            print(f'{label:<35} {view["status"]} median {view["median_ms"]:>9.2f} ms  '
+                  f'queries {view["queries_cold"]:>3}/{view["queries_warm"]:<3} '
+                  f'peak {view["peak_memory_kb"]:>9.1f} KB')
+        print(f'ingestion {data["ingestion"]["rows_per_second"]:,.0f} rows/s, '
+              f'rollups incremental {data["rollups"]["incremental_ms"]:.1f} ms, '
+              f'rebuild {data["rollups"]["rebuild_ms"]:.1f} ms')
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, default=str)
+        print(f'\nResults written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,37 +1,78 @@
 from django.contrib import admin
-from .models import Organization, Category, Zone, Device, Measurement, Alert
+from .models import Organization, Membership, Category, Zone, Device, Measurement, Alert, DeviceRollup, ZoneRollup
+
+
+class OrganizationScopedAdmin(admin.ModelAdmin):
+    """Limita el admin de usuarios no superusuarios a ``request.organization``."""
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.user.is_superuser:
+            return queryset
+        return queryset.filter(organization=getattr(request, 'organization', None))
+    
+    def save_model(self, request, obj, form, change):
+        if not request.user.is_superuser and getattr(request, 'organization', None):
+            obj.organization = request.organization
+        super().save_model(request, obj, form, change)
+
 
 @admin.register(Organization)
 class OrganizationAdmin(admin.ModelAdmin):
     list_display = ['name', 'email', 'created_at']
     search_fields = ['name', 'email']
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.user.is_superuser:
+            return queryset
+        organization = getattr(request, 'organization', None)
+        return queryset.filter(pk=organization.pk if organization else None)
+
+@admin.register(Membership)
+class MembershipAdmin(admin.ModelAdmin):
+    list_display = ['user', 'organization', 'created_at']
+    search_fields = ['user__username', 'user__email']
+    list_filter = ['organization']
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(OrganizationScopedAdmin):
     list_display = ['name', 'description', 'organization', 'created_at']
     search_fields = ['name']
     list_filter = ['organization']
 
 @admin.register(Zone)
-class ZoneAdmin(admin.ModelAdmin):
+class ZoneAdmin(OrganizationScopedAdmin):
     list_display = ['name', 'location', 'max_capacity', 'organization', 'created_at']
     search_fields = ['name', 'location']
     list_filter = ['organization']
 
 @admin.register(Device)
-class DeviceAdmin(admin.ModelAdmin):
+class DeviceAdmin(OrganizationScopedAdmin):
     list_display = ['name', 'model', 'category', 'zone', 'status', 'power_watts', 'organization']
     list_filter = ['category', 'zone', 'status', 'organization']
     search_fields = ['name', 'model']
 
 @admin.register(Measurement)
-class MeasurementAdmin(admin.ModelAdmin):
+class MeasurementAdmin(OrganizationScopedAdmin):
     list_display = ['device', 'consumption_kwh', 'timestamp', 'organization']
     list_filter = ['timestamp', 'device__category', 'organization']
     search_fields = ['device__name']
 
 @admin.register(Alert)
-class AlertAdmin(admin.ModelAdmin):
+class AlertAdmin(OrganizationScopedAdmin):
     list_display = ['device', 'alert_type', 'severity', 'status', 'alert_date', 'organization']
     list_filter = ['alert_type', 'severity', 'status', 'alert_date', 'organization']
-    search_fields = ['device__name', 'message']
\ No newline at end of file
+    search_fields = ['device__name', 'message']
+
+@admin.register(DeviceRollup)
+class DeviceRollupAdmin(OrganizationScopedAdmin):
+    list_display = ['device', 'period', 'bucket_start', 'total_kwh', 'min_kwh', 'max_kwh', 'reading_count']
+    list_filter = ['period', 'organization']
+    search_fields = ['device__name']
+
+@admin.register(ZoneRollup)
+class ZoneRollupAdmin(OrganizationScopedAdmin):
+    list_display = ['zone', 'period', 'bucket_start', 'total_kwh', 'min_kwh', 'max_kwh', 'reading_count']
+    list_filter = ['period', 'organization']
+    search_fields = ['zone__name']
\ No newline at end of file
@@ -0,0 +1,153 @@
+# dispositivos/analytics.py
+"""
+Estadísticas de consumo sobre series de tiempo, calculadas con NumPy.
+
+Las columnas ``timestamp``/``consumption_kwh`` se cargan una sola vez como
+arreglos y todo el cálculo (percentiles, perfiles horarios, promedios
+móviles, factor de carga) se hace vectorizado, sin recorrer instancias del
+modelo en Python. Las ventanas que llegan a meses archivados o a días
+empaquetados se leen también de las tablas de archivo (archive.py) y de los
+bloques columnares (columnar.py).
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .columnar import read_series
+
+PERCENTILES = (50, 90, 95, 99)
+SECONDS_PER_HOUR = 3600
+
+
+def load_series(measurements):
+    """
+    Devuelve (timestamps, kwh): epoch en segundos (int64) y consumo (float64),
+    ordenados cronológicamente. Las filas se leen en bloques directo a un
+    arreglo, sin materializar instancias ni listas intermedias.
+    """
+    rows = measurements.order_by('timestamp').values_list('timestamp', 'consumption_kwh')
+    return _series(rows.iterator(chunk_size=5000))
+
+
+def load_history(filter_queryset, start, end):
+    """
+    Como ``load_series`` para [start, end), incluyendo meses archivados y
+    bloques columnares (columnar.py).
+    """
+    return read_series(filter_queryset, start, end)
+
+
+def _series(rows):
+    data = np.fromiter(
+        ((timestamp.timestamp(), value) for timestamp, value in rows),
+        dtype=np.dtype((np.float64, 2)),
+    )
+    if not data.size:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    return data[:, 0].astype(np.int64), data[:, 1]
+
+
+def hourly_totals(timestamps, kwh, start, hours):
+    """kWh por hora en [start, start + hours) usando bincount (equivale a kW promedio)."""
+    slots = (timestamps - start) // SECONDS_PER_HOUR
+    mask = (slots >= 0) & (slots < hours)
+    return np.bincount(slots[mask], weights=kwh[mask], minlength=hours)
+
+
+def rolling_mean(values, window):
+    """Promedio móvil de ``window`` posiciones con suma acumulada (O(n))."""
+    if len(values) < window or window <= 0:
+        return np.empty(0)
+    cumsum = np.cumsum(np.insert(values, 0, 0.0))
+    return (cumsum[window:] - cumsum[:-window]) / window
+
+
+def _round(value, digits=3):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def series_stats(timestamps, kwh, start, hours, rated_kw=None, capacity_kw=None):
+    """Estadísticas de una serie ya cargada en arreglos."""
+    result = {'readings': int(kwh.size)}
+    if not kwh.size:
+        return result
+
+    hourly = hourly_totals(timestamps, kwh, start, hours)
+    hour_of_day = ((start + np.arange(hours) * SECONDS_PER_HOUR) // SECONDS_PER_HOUR) % 24
+    profile = np.bincount(hour_of_day, weights=hourly, minlength=24) / np.maximum(
+        np.bincount(hour_of_day, minlength=24), 1)
+    rolling_24h = rolling_mean(hourly, 24)
+
+    result.update({
+        'total_kwh': _round(kwh.sum()),
+        'mean_kwh': _round(kwh.mean()),
+        'std_kwh': _round(kwh.std()),
+        'min_kwh': _round(kwh.min()),
+        'max_kwh': _round(kwh.max()),
+        'percentiles_kwh': {
+            f'p{p}': _round(v) for p, v in zip(PERCENTILES, np.percentile(kwh, PERCENTILES))
+        },
+        'average_kw': _round(hourly.mean()),
+        'peak_kw': _round(hourly.max()),
+        'peak_hour': int(profile.argmax()),
+        'hourly_profile_kw': [_round(v) for v in profile],
+        'rolling_24h_kw': {
+            'latest': _round(rolling_24h[-1]) if rolling_24h.size else None,
+            'max': _round(rolling_24h.max()) if rolling_24h.size else None,
+        },
+    })
+    if rated_kw:
+        result['load_factor'] = _round(hourly.mean() / rated_kw, 4)
+        result['peak_load_factor'] = _round(hourly.max() / rated_kw, 4)
+    if capacity_kw:
+        utilization = hourly / capacity_kw
+        result['utilization'] = {
+            'mean': _round(utilization.mean(), 4),
+            'peak': _round(utilization.max(), 4),
+            'p95': _round(np.percentile(utilization, 95), 4),
+            'hours_over_capacity': int((utilization > 1).sum()),
+        }
+    return result
+
+
+def _window(days):
+    end = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    start = end - timedelta(days=days)
+    return start, end, int(days * 24)
+
+
+def device_analytics(device, days=30):
+    """Estadísticas de un dispositivo; el factor de carga es relativo a ``power_watts``."""
+    start, end, hours = _window(days)
+    timestamps, kwh = load_history(lambda measurements: measurements.filter(device=device), start, end)
+    result = {
+        'device': device.id,
+        'name': device.name,
+        'power_watts': device.power_watts,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+    }
+    result.update(series_stats(
+        timestamps, kwh, int(start.timestamp()), hours,
+        rated_kw=device.power_watts / 1000 if device.power_watts else None,
+    ))
+    return result
+
+
+def zone_analytics(zone, days=30):
+    """Estadísticas agregadas de la zona; la utilización es relativa a ``max_capacity`` (kW)."""
+    start, end, hours = _window(days)
+    timestamps, kwh = load_history(lambda measurements: measurements.filter(device__zone=zone), start, end)
+    result = {
+        'zone': zone.id,
+        'name': zone.name,
+        'max_capacity_kw': float(zone.max_capacity),
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+    }
+    result.update(series_stats(
+        timestamps, kwh, int(start.timestamp()), hours,
+        capacity_kw=float(zone.max_capacity) or None,
+    ))
+    return result
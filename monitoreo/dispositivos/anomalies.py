@@ -0,0 +1,248 @@
+# dispositivos/anomalies.py
+"""
+Detección de anomalías sobre las lecturas de cada dispositivo.
+
+A diferencia de las reglas de rules.py, que comparan contra límites fijos,
+aquí cada dispositivo se compara con su propia historia. ``AnomalyState``
+guarda unas pocas cifras por dispositivo, actualizadas lectura a lectura:
+
+- ``mean``/``variance``: media y varianza exponenciales (EWMA, ``ALPHA``);
+  una lectura a más de ``ANOMALY_Z_THRESHOLD`` desviaciones es un pico o
+  una caída;
+- ``baseline``/``baseline_variance``: media y varianza exponenciales
+  lentas (``BASELINE_ALPHA``); cuando ``mean`` se aleja de la línea base
+  varias desviaciones lentas el consumo está derivando. La varianza lenta
+  incluye el ciclo diario, así que el vaivén día/noche no cuenta como deriva;
+- ``last_value``/``repeats``: lecturas idénticas consecutivas; un medidor
+  trabado repite el mismo valor distinto de cero.
+
+``detect_anomalies`` procesa sólo las mediciones con id mayor a la marca de
+agua ``anomaly_detector``, por bloques: cada bloque actualiza estados,
+crea las alertas ``anomaly`` y avanza la marca en una misma transacción.
+Las lecturas atrasadas (anteriores a la última vista del dispositivo) no se
+puntúan para no mezclar el orden de la serie.
+"""
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import invalidate_organization_blocks
+from .events import publish_alerts
+from .models import Alert, AnomalyState, Measurement, Watermark
+
+WATERMARK_NAME = 'anomaly_detector'
+DEFAULT_BATCH_SIZE = 50000
+DEFAULT_Z_THRESHOLD = 3.5
+DEFAULT_WARMUP_READINGS = 24
+DEFAULT_FLATLINE_READINGS = 12
+DEFAULT_COOLDOWN_SECONDS = 3600
+
+ALPHA = 0.1
+BASELINE_ALPHA = 0.002
+# La media lenta necesita ~1/BASELINE_ALPHA lecturas antes de medir deriva
+DRIFT_WARMUP_READINGS = 500
+# Piso de la desviación (kWh) para series casi constantes
+MIN_STD = 0.001
+
+# |z| de una lectura a partir del cual se asigna cada severidad (el último
+# escalón es ANOMALY_Z_THRESHOLD)
+SPIKE_SEVERITY = (
+    (6.0, 'grave'),
+    (4.5, 'alta'),
+)
+# Distancia entre media y línea base, en desviaciones
+DRIFT_SEVERITY = (
+    (4.0, 'grave'),
+    (3.0, 'alta'),
+    (2.0, 'media'),
+)
+# Múltiplos de ANOMALY_FLATLINE_READINGS
+FLATLINE_SEVERITY = (
+    (4, 'grave'),
+    (2, 'alta'),
+    (1, 'media'),
+)
+SEVERITY_RANK = {'media': 0, 'alta': 1, 'grave': 2}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _grade(value, thresholds):
+    for threshold, severity in thresholds:
+        if value >= threshold:
+            return severity
+    return None
+
+
+class Detector:
+    """Parámetros de detección leídos una vez por ejecución."""
+
+    def __init__(self, z_threshold=None, warmup=None, flatline=None, cooldown_seconds=None):
+        self.z_threshold = z_threshold or _setting('ANOMALY_Z_THRESHOLD', DEFAULT_Z_THRESHOLD)
+        self.warmup = warmup or _setting('ANOMALY_WARMUP_READINGS', DEFAULT_WARMUP_READINGS)
+        self.flatline = flatline or _setting('ANOMALY_FLATLINE_READINGS', DEFAULT_FLATLINE_READINGS)
+        self.cooldown = cooldown_seconds or _setting('ANOMALY_COOLDOWN_SECONDS', DEFAULT_COOLDOWN_SECONDS)
+        self.spike_severity = SPIKE_SEVERITY + ((self.z_threshold, 'media'),)
+
+    def score(self, state, value, timestamp):
+        """
+        Actualiza ``state`` con una lectura y devuelve [(severidad, detalle)]
+        de lo anómalo que tenga (vacío si es normal).
+        """
+        findings = []
+        x = float(value)
+
+        # Medidor trabado: alerta al llegar a N, 2N y 4N repeticiones
+        if value and value == state.last_value:
+            state.repeats += 1
+        else:
+            state.repeats = 0
+        run = state.repeats + 1
+        if run >= self.flatline and run % self.flatline == 0 and (run // self.flatline) in (1, 2, 4):
+            findings.append((
+                _grade(run / self.flatline, FLATLINE_SEVERITY),
+                f'stuck at {value} kWh for {run} readings',
+            ))
+
+        if state.readings == 0:
+            state.mean = state.baseline = x
+            state.variance = state.baseline_variance = 0.0
+        else:
+            std = max(math.sqrt(state.variance), MIN_STD)
+            if state.readings >= self.warmup:
+                z = (x - state.mean) / std
+                severity = _grade(abs(z), self.spike_severity)
+                if severity:
+                    kind = 'spike' if z > 0 else 'drop'
+                    findings.append((severity, f'{kind} {x:.3f} kWh ({z:+.1f}σ from {state.mean:.3f} kWh)'))
+                    # Una lectura anómala no debe arrastrar la media
+                    limit = self.z_threshold * std
+                    x = min(max(x, state.mean - limit), state.mean + limit)
+            diff = x - state.mean
+            increment = ALPHA * diff
+            state.mean += increment
+            state.variance = (1 - ALPHA) * (state.variance + diff * increment)
+            diff = x - state.baseline
+            increment = BASELINE_ALPHA * diff
+            state.baseline += increment
+            state.baseline_variance = (1 - BASELINE_ALPHA) * (state.baseline_variance + diff * increment)
+
+            if state.readings >= DRIFT_WARMUP_READINGS:
+                drift = (state.mean - state.baseline) / max(math.sqrt(state.baseline_variance), MIN_STD)
+                severity = _grade(abs(drift), DRIFT_SEVERITY)
+                if severity:
+                    direction = 'up' if drift > 0 else 'down'
+                    findings.append((
+                        severity,
+                        f'drifting {direction}: average {state.mean:.3f} kWh vs baseline {state.baseline:.3f} kWh',
+                    ))
+
+        state.readings += 1
+        state.last_value = value
+        state.last_timestamp = timestamp
+        return findings
+
+    def alert_for(self, state, device_name, findings, timestamp):
+        """La alerta de una lectura con hallazgos, o None durante el enfriamiento."""
+        if not findings:
+            return None
+        if state.last_alert_at is not None and (timestamp - state.last_alert_at).total_seconds() < self.cooldown:
+            return None
+        state.last_alert_at = timestamp
+        severity = max((severity for severity, _ in findings), key=SEVERITY_RANK.__getitem__)
+        return Alert(
+            organization_id=state.organization_id,
+            device_id=state.device_id,
+            alert_type='anomaly',
+            severity=severity,
+            message=f'{device_name}: ' + '; '.join(detail for _, detail in findings),
+            alert_date=timestamp,
+        )
+
+
+def _states(rows):
+    """Estados de los dispositivos del bloque, creando los que falten (sin guardar)."""
+    devices = {device_id: organization_id for _, organization_id, device_id, *_ in rows}
+    states = {state.device_id: state for state in AnomalyState.objects.filter(device_id__in=devices)}
+    for device_id, organization_id in devices.items():
+        if device_id not in states:
+            states[device_id] = AnomalyState(organization_id=organization_id, device_id=device_id)
+    return states
+
+
+def detect_anomalies(batch_size=DEFAULT_BATCH_SIZE, detector=None, dry_run=False):
+    """
+    Puntúa las mediciones nuevas y crea sus alertas ``anomaly``. Devuelve
+    (mediciones procesadas, alertas). Con ``dry_run`` no guarda nada ni
+    avanza la marca de agua (sólo revisa el primer bloque).
+    """
+    detector = detector or Detector()
+    processed, created = 0, []
+    while True:
+        with transaction.atomic():
+            watermark, _ = Watermark.objects.select_for_update().get_or_create(name=WATERMARK_NAME)
+            pending = Measurement.objects.filter(id__gt=watermark.last_id).order_by('id')
+            ids = list(pending.values_list('id', flat=True)[batch_size - 1:batch_size])
+            upper = ids[0] if ids else pending.order_by('-id').values_list('id', flat=True).first()
+            if upper is None:
+                return processed, created
+
+            rows = list(
+                Measurement.objects.filter(id__gt=watermark.last_id, id__lte=upper)
+                .order_by('device_id', 'timestamp', 'id')
+                .values_list('id', 'organization_id', 'device_id', 'device__name', 'consumption_kwh', 'timestamp')
+            )
+            states = _states(rows)
+            alerts = []
+            for _, _, device_id, device_name, value, timestamp in rows:
+                state = states[device_id]
+                if state.last_timestamp is not None and timestamp < state.last_timestamp:
+                    continue
+                alert = detector.alert_for(state, device_name, detector.score(state, value, timestamp), timestamp)
+                if alert is not None:
+                    alerts.append(alert)
+            processed += len(rows)
+            created.extend(alerts)
+            if dry_run:
+                transaction.set_rollback(True)
+                return processed, created
+
+            now = timezone.now()
+            new = [state for state in states.values() if state.pk is None]
+            changed = [state for state in states.values() if state.pk is not None]
+            for state in changed:
+                state.updated_at = now  # bulk_update no aplica auto_now
+            AnomalyState.objects.bulk_create(new, batch_size=500)
+            AnomalyState.objects.bulk_update(
+                changed,
+                ['readings', 'mean', 'variance', 'baseline', 'baseline_variance', 'last_value', 'repeats',
+                 'last_timestamp', 'last_alert_at', 'updated_at'],
+                batch_size=500,
+            )
+            if alerts:
+                Alert.objects.bulk_create(alerts, batch_size=500)
+                touched = {alert.organization_id for alert in alerts}
+                transaction.on_commit(lambda touched=touched: invalidate_organization_blocks(*touched))
+                transaction.on_commit(lambda alerts=alerts: publish_alerts(alerts))
+            watermark.last_id = upper
+            watermark.save(update_fields=['last_id', 'updated_at'])
+
+
+def reset_anomaly_state():
+    """
+    Borra los estados, la marca de agua y las alertas ``anomaly`` ya creadas:
+    la próxima ejecución recorre todo desde cero y las vuelve a generar, sin
+    duplicar (ni volver a publicar) las anteriores.
+    """
+    with transaction.atomic():
+        alerts = Alert.all_objects.filter(alert_type='anomaly')
+        touched = set(alerts.order_by().values_list('organization_id', flat=True).distinct())
+        # DELETE directo (como purge.py): sin cargar las filas ni una señal por alerta
+        alerts._raw_delete(alerts.db)
+        AnomalyState.objects.all().delete()
+        Watermark.objects.filter(name=WATERMARK_NAME).delete()
+        transaction.on_commit(lambda: invalidate_organization_blocks(*touched))
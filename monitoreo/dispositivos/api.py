@@ -0,0 +1,207 @@
+# dispositivos/api.py
+"""
+API JSON de sólo lectura sobre dispositivos, mediciones, alertas, zonas y
+categorías.
+
+Cada recurso declara sus campos públicos como rutas del ORM. Con
+``?fields=a,b`` el cliente elige un subconjunto y la consulta se arma sólo
+con lo necesario: ``select_related`` de las relaciones que esos campos
+recorren y ``only`` de sus columnas. Los listados usan la paginación por
+cursor de ``pagination.py`` y cada respuesta lleva un ETag derivado de
+``updated_at`` de las filas devueltas. Sólo el detalle lleva además
+Last-Modified: en un listado el máximo ``updated_at`` de la página puede
+retroceder cuando una fila sale de ella (un borrado, otro filtro) y un
+cliente con ``If-Modified-Since`` recibiría un 304 con datos viejos.
+"""
+import hashlib
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Alert, Category, Device, Measurement, Zone
+from .pagination import DEVICE_ORDERING, MEASUREMENT_ORDERING
+
+ALERT_ORDERING = ('-alert_date', '-id')
+NAME_ORDERING = ('name', 'id')
+
+
+class ApiError(ValueError):
+    """Parámetro inválido; se responde con 400."""
+
+
+def _integer(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError(f'{value!r} is not an integer')
+
+
+def _datetime(value):
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ApiError(f'{value!r} is not an ISO 8601 datetime')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.get_current_timezone())
+    return parsed
+
+
+def _text(value):
+    return value
+
+
+class Resource:
+    def __init__(self, model, fields, ordering, filters=None, version_fields=('updated_at',)):
+        self.model = model
+        self.fields = fields                  # nombre público -> ruta del ORM
+        self.ordering = ordering
+        self.filters = filters or {}          # parámetro -> (lookup, conversor)
+        self.version_fields = version_fields  # columnas que cambian el ETag
+
+    def parse_fields(self, value):
+        if not value:
+            return list(self.fields)
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ApiError(f'Unknown fields: {", ".join(unknown)}. Available: {", ".join(self.fields)}')
+        return names
+
+    def queryset(self, organization, fields, params=None):
+        """Consulta de la organización con joins y columnas sólo de ``fields``."""
+        paths = [self.fields[name] for name in fields]
+        related = {path.rsplit('__', 1)[0] for path in paths if '__' in path}
+        columns = set(paths) | {name.lstrip('-') for name in self.ordering} | set(self.version_fields)
+
+        queryset = self.model.objects.filter(organization=organization)
+        if related:
+            queryset = queryset.select_related(*related)
+        queryset = queryset.only(*columns)
+
+        for param, (lookup, convert) in self.filters.items():
+            value = (params or {}).get(param)
+            if value not in (None, ''):
+                queryset = queryset.filter(**{lookup: convert(value)})
+        return queryset
+
+    def serialize(self, obj, fields):
+        data = {}
+        for name in fields:
+            value = obj
+            for part in self.fields[name].split('__'):
+                value = getattr(value, part, None)
+                if value is None:
+                    break
+            data[name] = value
+        return data
+
+    def version(self, objects, *extra):
+        """(ETag, Last-Modified) de un conjunto de filas ya leídas."""
+        digest = hashlib.md5(repr(extra).encode(), usedforsecurity=False)
+        last_modified = None
+        for obj in objects:
+            values = [getattr(obj, name) for name in self.version_fields]
+            digest.update(repr((obj.pk, values)).encode())
+            for value in values:
+                if value is not None and (last_modified is None or value > last_modified):
+                    last_modified = value
+        return f'"{digest.hexdigest()}"', last_modified
+
+
+RESOURCES = {
+    'devices': Resource(
+        Device,
+        fields={
+            'id': 'id',
+            'name': 'name',
+            'model': 'model',
+            'power_watts': 'power_watts',
+            'status': 'status',
+            'consumption': 'consumption',
+            'category': 'category_id',
+            'category_name': 'category__name',
+            'zone': 'zone_id',
+            'zone_name': 'zone__name',
+            'last_seen_at': 'last_seen_at',
+            'last_reading_kwh': 'last_reading_kwh',
+            'created_at': 'created_at',
+            'updated_at': 'updated_at',
+        },
+        ordering=DEVICE_ORDERING,
+        filters={
+            'category': ('category_id', _integer),
+            'zone': ('zone_id', _integer),
+            'status': ('status', _text),
+        },
+        # last_seen_at se actualiza con bulk_update, sin tocar updated_at
+        version_fields=('updated_at', 'last_seen_at'),
+    ),
+    'measurements': Resource(
+        Measurement,
+        fields={
+            'id': 'id',
+            'device': 'device_id',
+            'device_name': 'device__name',
+            'zone_name': 'device__zone__name',
+            'consumption_kwh': 'consumption_kwh',
+            'timestamp': 'timestamp',
+            'created_at': 'created_at',
+            'updated_at': 'updated_at',
+        },
+        ordering=MEASUREMENT_ORDERING,
+        filters={
+            'device': ('device_id', _integer),
+            'since': ('timestamp__gte', _datetime),
+            'until': ('timestamp__lte', _datetime),
+        },
+    ),
+    'alerts': Resource(
+        Alert,
+        fields={
+            'id': 'id',
+            'device': 'device_id',
+            'device_name': 'device__name',
+            'alert_type': 'alert_type',
+            'severity': 'severity',
+            'status': 'status',
+            'message': 'message',
+            'alert_date': 'alert_date',
+            'created_at': 'created_at',
+            'updated_at': 'updated_at',
+        },
+        ordering=ALERT_ORDERING,
+        filters={
+            'device': ('device_id', _integer),
+            'severity': ('severity', _text),
+            'status': ('status', _text),
+            'alert_type': ('alert_type', _text),
+            'since': ('alert_date__gte', _datetime),
+        },
+    ),
+    'zones': Resource(
+        Zone,
+        fields={
+            'id': 'id',
+            'name': 'name',
+            'location': 'location',
+            'description': 'description',
+            'max_capacity': 'max_capacity',
+            'created_at': 'created_at',
+            'updated_at': 'updated_at',
+        },
+        ordering=NAME_ORDERING,
+    ),
+    'categories': Resource(
+        Category,
+        fields={
+            'id': 'id',
+            'name': 'name',
+            'description': 'description',
+            'created_at': 'created_at',
+            'updated_at': 'updated_at',
+        },
+        ordering=NAME_ORDERING,
+    ),
+}
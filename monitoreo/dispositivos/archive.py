@@ -0,0 +1,217 @@
+# dispositivos/archive.py
+"""
+Archivo mensual de mediciones antiguas.
+
+Las mediciones anteriores a la ventana de retención
+(``MEASUREMENT_RETENTION_DAYS``) se mueven, mes completo a la vez, a una
+tabla propia ``dispositivos_measurement_YYYYMM`` y se borran de la tabla
+principal, que queda con los datos recientes. Un mes sólo se archiva cuando
+todas sus lecturas ya pasaron por los agregados (marca de agua de
+rollups.py), así que los dashboards no pierden historia.
+
+Cada tabla de archivo se consulta con un modelo no administrado creado en
+tiempo de ejecución, con las mismas relaciones que ``Measurement``; por eso
+filtros como ``device__zone`` funcionan igual. ``read_history`` une archivo
+y tabla principal en orden cronológico para rangos históricos.
+
+Las tablas de archivo no tienen ``deleted_at``: las filas de un dispositivo
+con borrado lógico se ocultan al leer (por el dispositivo) y se eliminan con
+``delete_archived`` cuando purge.py lo borra definitivamente.
+"""
+import heapq
+from datetime import datetime, timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from .caching import invalidate_organization_blocks
+from .models import Device, Measurement, MeasurementArchive, Organization, Watermark
+
+DEFAULT_RETENTION_DAYS = 90
+ROLLUP_WATERMARK = 'measurement_rollups'
+ARCHIVE_COLUMNS = ('id', 'organization_id', 'device_id', 'consumption_kwh', 'timestamp')
+
+_models = {}
+
+
+def table_name(month):
+    return f'{Measurement._meta.db_table}_{month:%Y%m}'
+
+
+def month_start(value):
+    """Inicio (hora local) del mes que contiene ``value``."""
+    if isinstance(value, datetime):
+        value = timezone.localtime(value).date()
+    return timezone.make_aware(datetime(value.year, value.month, 1))
+
+
+def next_month(start):
+    return month_start(start + timedelta(days=32))
+
+
+def archive_model(month):
+    """Modelo no administrado para la tabla de archivo de ``month`` (uno por proceso)."""
+    name = table_name(month)
+    model = _models.get(name)
+    if model is None:
+        class Meta:
+            app_label = 'dispositivos'
+            db_table = name
+            managed = False
+            ordering = ['timestamp']
+            indexes = [models.Index(fields=['device', 'timestamp'], name=f'measurement_{month:%Y%m}_dev_ts')]
+
+        model = type(f'MeasurementArchive{month:%Y%m}', (models.Model,), {
+            '__module__': __name__,
+            'Meta': Meta,
+            'id': models.BigIntegerField(primary_key=True),
+            'organization': models.ForeignKey(
+                Organization, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'),
+            'device': models.ForeignKey(
+                Device, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'),
+            'consumption_kwh': models.DecimalField(max_digits=10, decimal_places=3),
+            'timestamp': models.DateTimeField(),
+        })
+        _models[name] = model
+    return model
+
+
+def _ensure_table(model):
+    if model._meta.db_table in connection.introspection.table_names():
+        return
+    with connection.schema_editor() as editor:
+        editor.create_model(model)
+
+
+def get_retention_days(value=None):
+    if value is None:
+        value = getattr(settings, 'MEASUREMENT_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+    return value
+
+
+def hot_boundary():
+    """Primer instante que sigue en la tabla principal (None si no hay archivo)."""
+    last = MeasurementArchive.objects.order_by('-month').values_list('month', flat=True).first()
+    return next_month(month_start(last)) if last else None
+
+
+def archive_measurements(retention_days=None, now=None, dry_run=False):
+    """
+    Mueve a sus tablas de archivo los meses completos anteriores a la ventana
+    de retención. Devuelve [(mes, filas, estado)] con estado 'archived',
+    'pending_rollups' (quedan lecturas sin agregar) o 'dry_run'.
+    """
+    now = now or timezone.now()
+    cutoff = month_start(now - timedelta(days=get_retention_days(retention_days)))
+    watermark = Watermark.objects.filter(name=ROLLUP_WATERMARK).values_list('last_id', flat=True).first() or 0
+
+    months = Measurement.objects.filter(timestamp__lt=cutoff).dates('timestamp', 'month')
+    results = []
+    for month in months:
+        start = month_start(month)
+        end = next_month(start)
+        rows = Measurement.objects.filter(timestamp__gte=start, timestamp__lt=end)
+        if rows.filter(id__gt=watermark).exists():
+            results.append((month, rows.count(), 'pending_rollups'))
+            continue
+        if dry_run:
+            results.append((month, rows.count(), 'dry_run'))
+            continue
+        results.append((month, _archive_month(month, rows), 'archived'))
+    return results
+
+
+def _archive_month(month, rows):
+    model = archive_model(month)
+    _ensure_table(model)
+    with transaction.atomic():
+        organizations = set(rows.order_by().values_list('organization_id', flat=True).distinct())
+        # INSERT ... SELECT con el SQL que arma el ORM (parámetros ya adaptados)
+        select, params = rows.order_by().values_list(*ARCHIVE_COLUMNS).query.sql_with_params()
+        columns = ', '.join(connection.ops.quote_name(column) for column in ARCHIVE_COLUMNS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) {select}',
+                params,
+            )
+            moved = cursor.rowcount
+        # Borrado directo: sin cargar instancias ni emitir una señal por fila
+        rows._raw_delete(rows.db)
+
+        stats = model.objects.aggregate(first=models.Min('timestamp'), last=models.Max('timestamp'),
+                                        count=models.Count('id'))
+        MeasurementArchive.objects.update_or_create(
+            month=month,
+            defaults={
+                'table_name': model._meta.db_table,
+                'row_count': stats['count'],
+                'first_timestamp': stats['first'],
+                'last_timestamp': stats['last'],
+            },
+        )
+        transaction.on_commit(lambda: invalidate_organization_blocks(*organizations))
+    return moved
+
+
+def archived_models(since=None, until=None):
+    """Modelos de los meses archivados que se superponen con [since, until)."""
+    months = MeasurementArchive.objects.all()
+    if since is not None:
+        months = months.filter(month__gte=month_start(since).date())
+    if until is not None:
+        months = months.filter(month__lt=timezone.localtime(until).date())
+    return [archive_model(month) for month in months.values_list('month', flat=True)]
+
+
+def delete_archived(**filters):
+    """
+    Borra de todas las tablas de archivo las filas que cumplen ``filters``
+    (p. ej. ``device_id__in=ids``) y actualiza sus conteos. Devuelve las filas borradas.
+    """
+    deleted = 0
+    for archive in MeasurementArchive.objects.all():
+        model = archive_model(archive.month)
+        rows = model.objects.filter(**filters)
+        removed = rows._raw_delete(rows.db)
+        if removed:
+            archive.row_count = max(archive.row_count - removed, 0)
+            archive.save(update_fields=['row_count', 'updated_at'])
+            deleted += removed
+    return deleted
+
+
+def read_history(filter_queryset, fields, since=None, until=None, chunk_size=5000):
+    """
+    Filas ``values_list(*fields)`` de [since, until) en orden cronológico,
+    leyendo de las tablas de archivo cuando el rango llega a meses archivados.
+
+    ``filter_queryset`` recibe un queryset base (de ``Measurement`` o de una
+    tabla de archivo) y devuelve el filtrado; ``fields[0]`` debe ser
+    ``'timestamp'``.
+    """
+    def rows(queryset, start=None, end=None):
+        if start is not None:
+            queryset = queryset.filter(timestamp__gte=start)
+        if end is not None:
+            queryset = queryset.filter(timestamp__lt=end)
+        queryset = filter_queryset(queryset).order_by('timestamp', 'id')
+        return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+    boundary = hot_boundary()
+    if boundary is None or (since is not None and since >= boundary):
+        return rows(Measurement.objects.all(), since, until)
+
+    archived_end = boundary if until is None else min(boundary, until)
+    archived = [
+        # Sin deleted_at propio: se excluyen las filas de dispositivos borrados
+        rows(model.objects.filter(device__deleted_at__isnull=True), since, archived_end)
+        for model in archived_models(since, archived_end)
+    ]
+    # Lecturas atrasadas de meses archivados que llegaron después del archivo
+    late = rows(Measurement.objects.all(), since, archived_end)
+    history = heapq.merge(*archived, late, key=lambda row: row[0])
+    if until is not None and until <= boundary:
+        return history
+    return chain(history, rows(Measurement.objects.all(), boundary, until))
@@ -0,0 +1,112 @@
+# dispositivos/caching.py
+"""
+Caché de bloques calculados (estadísticas del dashboard, resumen de alertas)
+por organización.
+
+Cada organización tiene un número de versión guardado en el mismo backend;
+las claves de los bloques lo incluyen, de modo que invalidar todo lo de una
+organización es un solo incremento, sin tener que conocer ni borrar cada
+clave. El backend es cualquiera de ``settings.CACHES`` (local en memoria por
+defecto) elegido con ``DISPOSITIVOS_CACHE_ALIAS``.
+
+Con memoria local cada proceso tiene su propio caché: lo que invalidan los
+comandos de gestión, los trabajos o las señales de otro worker no llega a
+los demás hasta que vence ``DISPOSITIVOS_CACHE_TIMEOUT``. Con varios
+procesos hay que apuntar el alias a un backend compartido (Redis, Memcached,
+base de datos o archivos). Por eso los bloques son valores simples (dicts,
+listas, números), que se serializan sin arrastrar instancias de modelos.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULT_TIMEOUT = 300
+KEY_PREFIX = 'dispositivos'
+
+
+class CacheStats:
+    """Contadores de aciertos/fallos por bloque, locales al proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    def record(self, block, hit):
+        with self._lock:
+            self._counts[block]['hits' if hit else 'misses'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for block, counts in self._counts.items():
+                total = counts['hits'] + counts['misses']
+                result[block] = dict(counts, hit_ratio=round(counts['hits'] / total, 3) if total else 0.0)
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    return caches[getattr(settings, 'DISPOSITIVOS_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'DISPOSITIVOS_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def _version_key(organization_id):
+    return f'{KEY_PREFIX}:version:{organization_id}'
+
+
+def _organization_version(cache, organization_id):
+    version = cache.get(_version_key(organization_id))
+    if version is None:
+        # Si la versión fue desalojada del caché, partir de un valor nuevo
+        # evita volver a leer bloques guardados con una versión anterior
+        cache.add(_version_key(organization_id), time.time_ns(), None)
+        version = cache.get(_version_key(organization_id))
+    return version
+
+
+def cached_block(organization, block, compute):
+    """
+    Devuelve el bloque ``block`` de la organización desde el caché, o lo
+    calcula con ``compute()`` y lo guarda. ``compute()`` debe devolver
+    valores simples, no instancias de modelos.
+    """
+    if organization is None:
+        return compute()
+
+    cache = get_cache()
+    version = _organization_version(cache, organization.pk)
+    key = f'{KEY_PREFIX}:{organization.pk}:{version}:{block}'
+    value = cache.get(key)
+    if value is not None:
+        stats.record(block, hit=True)
+        return value
+
+    stats.record(block, hit=False)
+    value = compute()
+    cache.set(key, value, _timeout())
+    return value
+
+
+def invalidate_organization_blocks(*organization_ids):
+    """Invalida todos los bloques de las organizaciones dadas."""
+    cache = get_cache()
+    for organization_id in set(organization_ids):
+        if organization_id is None:
+            continue
+        try:
+            cache.incr(_version_key(organization_id))
+        except ValueError:
+            # Sin versión guardada todavía: no hay bloques que invalidar
+            pass
@@ -0,0 +1,348 @@
+# dispositivos/columnar.py
+"""
+Almacenamiento columnar compacto de lecturas.
+
+Cada fila de ``Measurement`` guarda organización, fechas de auditoría y
+claves junto a un valor de 3 decimales. Para historia larga, las lecturas de
+un dispositivo en un día se empaquetan en un ``ReadingBlock``:
+
+- ``timestamps``: milisegundos entre lecturas consecutivas (uint32) a partir
+  de ``base_ms``, comprimidos con zlib; con intervalos regulares casi no
+  ocupan espacio;
+- ``values``: consumo en Wh (kWh en punto fijo de 3 decimales, int64),
+  comprimido con zlib.
+
+``pack_measurements`` empaqueta los días completos cuyas lecturas ya pasaron
+por todos los procesos que leen la tabla por id (agregados y detección de
+anomalías, ver ``CONSUMER_WATERMARKS``), también las de meses archivados, y
+opcionalmente borra las filas de la tabla principal. ``read_series``
+devuelve arreglos NumPy combinando bloques con las filas que todavía no se
+empaquetaron; ``read_readings`` hace lo mismo fila a fila (exportación) y
+``rollups.rebuild_rollups`` suma los bloques al recalcular.
+
+Una lectura está en un bloque si su día es anterior al último día
+empaquetado + 1 y su id no supera la marca de agua ``reading_blocks``; todo
+lo demás (días recientes y lecturas atrasadas) se lee de las filas.
+"""
+import heapq
+import zlib
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from .archive import archived_models, read_history
+from .caching import invalidate_organization_blocks
+from .models import Measurement, ReadingBlock, Watermark
+
+ENCODING = 1
+WATERMARK_NAME = 'reading_blocks'
+# Procesos que leen Measurement por id; sólo se empaqueta (y se borra) lo que
+# todos ya procesaron. Una marca que todavía no existe cuenta como 0.
+CONSUMER_WATERMARKS = ('measurement_rollups', 'anomaly_detector')
+DEFAULT_PACK_AFTER_DAYS = 1
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+ONE_MS = timedelta(milliseconds=1)
+ONE_HOUR_MS = 3600 * 1000
+PACK_FIELDS = ('timestamp', 'id', 'device_id', 'organization_id', 'consumption_kwh')
+
+
+# -- Codificación --------------------------------------------------------------
+
+def encode(ms, wh):
+    """(timestamps, values) en binario para lecturas ordenadas por tiempo."""
+    deltas = np.diff(ms).astype('<u4')
+    return zlib.compress(deltas.tobytes()), zlib.compress(np.asarray(wh, dtype='<i8').tobytes())
+
+
+def decode(base_ms, count, timestamps, values):
+    """(epoch en milisegundos int64, consumo en Wh int64) de un bloque."""
+    ms = np.empty(count, dtype=np.int64)
+    ms[0] = base_ms
+    np.cumsum(np.frombuffer(zlib.decompress(timestamps), dtype='<u4'), out=ms[1:])
+    ms[1:] += base_ms
+    return ms, np.frombuffer(zlib.decompress(values), dtype='<i8').astype(np.int64)
+
+
+def decode_block(block):
+    return decode(block.base_ms, block.reading_count, block.timestamps, block.values)
+
+
+# -- Estado --------------------------------------------------------------------
+
+def get_pack_after_days(value=None):
+    if value is None:
+        value = getattr(settings, 'READING_BLOCK_AFTER_DAYS', DEFAULT_PACK_AFTER_DAYS)
+    return value
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time()))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time()))
+
+
+def packed_state():
+    """(límite, marca de agua): primer instante sin empaquetar y último id empaquetado."""
+    last_day = ReadingBlock.objects.aggregate(last=models.Max('day'))['last']
+    if last_day is None:
+        return None, 0
+    watermark = Watermark.objects.filter(name=WATERMARK_NAME).values_list('last_id', flat=True).first() or 0
+    return _day_bounds(last_day)[1], watermark
+
+
+def unpacked_filter(boundary, watermark):
+    """Filas que no están en ningún bloque (``boundary`` y ``watermark`` de ``packed_state``)."""
+    if boundary is None:
+        return Q()
+    return Q(timestamp__gte=boundary) | Q(id__gt=watermark)
+
+
+def consumed_watermark():
+    """Mayor id que ya procesaron todos los ``CONSUMER_WATERMARKS``."""
+    marks = dict(Watermark.objects.filter(name__in=CONSUMER_WATERMARKS).values_list('name', 'last_id'))
+    return min(marks.get(name, 0) for name in CONSUMER_WATERMARKS)
+
+
+# -- Empaquetado ---------------------------------------------------------------
+
+def pack_measurements(after_days=None, now=None, delete_rows=False):
+    """
+    Empaqueta las lecturas de los días completos con al menos ``after_days``
+    días de antigüedad. Con ``delete_rows`` las filas empaquetadas se borran
+    de la tabla principal. Devuelve {'days', 'readings', 'blocks'} (y
+    'deleted' con ``delete_rows``).
+    """
+    now = now or timezone.now()
+    cutoff = _day_bounds(timezone.localdate(now) - timedelta(days=get_pack_after_days(after_days) - 1))[0]
+    boundary, watermark = packed_state()
+    # Sólo lecturas que ya procesaron los agregados y el detector de anomalías
+    target = max(watermark, consumed_watermark())
+    selector = Q(id__lte=target) & unpacked_filter(boundary, watermark)
+
+    days = set()
+    for model in [Measurement, *archived_models()]:
+        days.update(model.objects.filter(selector, timestamp__lt=cutoff).dates('timestamp', 'day'))
+
+    stats = {'days': 0, 'readings': 0, 'blocks': 0}
+    for day in sorted(days):
+        readings, blocks = _pack_day(day, selector)
+        stats['days'] += 1
+        stats['readings'] += readings
+        stats['blocks'] += blocks
+
+    with transaction.atomic():
+        Watermark.objects.update_or_create(name=WATERMARK_NAME, defaults={'last_id': target})
+        if delete_rows:
+            stats['deleted'] = delete_packed_rows()
+    return stats
+
+
+def delete_packed_rows():
+    """Borra de la tabla principal las filas que ya están en bloques."""
+    boundary, watermark = packed_state()
+    if boundary is None:
+        return 0
+    rows = Measurement.objects.filter(timestamp__lt=boundary, id__lte=watermark)
+    organizations = set(rows.order_by().values_list('organization_id', flat=True).distinct())
+    deleted = rows._raw_delete(rows.db)
+    transaction.on_commit(lambda: invalidate_organization_blocks(*organizations))
+    return deleted
+
+
+def _to_ms(value):
+    return (value - EPOCH) // ONE_MS
+
+
+def _pack_day(day, selector):
+    start, end = _day_bounds(day)
+    rows = read_history(lambda queryset: queryset.filter(selector), PACK_FIELDS, start, end)
+    data = np.fromiter(
+        ((_to_ms(timestamp), pk, device, organization, int(value.scaleb(3)))
+         for timestamp, pk, device, organization, value in rows),
+        dtype=np.dtype((np.int64, 5)),
+    )
+    if not data.size:
+        return 0, 0
+
+    data = data[np.lexsort((data[:, 0], data[:, 2]))]
+    devices, first = np.unique(data[:, 2], return_index=True)
+    existing = {
+        block.device_id: block
+        for block in ReadingBlock.objects.filter(day=day, device_id__in=devices.tolist())
+    }
+
+    created, updated = [], []
+    packed = 0
+    now = timezone.now()
+    for device_id, group in zip(devices.tolist(), np.split(data, first[1:])):
+        block = existing.get(device_id)
+        if block is not None:
+            # Reintento tras una ejecución interrumpida: no duplicar lo ya incluido
+            group = group[group[:, 1] > block.last_measurement_id]
+            if not group.size:
+                continue
+            ms, wh = decode_block(block)
+            ms, wh = np.concatenate([ms, group[:, 0]]), np.concatenate([wh, group[:, 4]])
+            order = np.argsort(ms, kind='stable')
+            ms, wh = ms[order], wh[order]
+        else:
+            block = ReadingBlock(organization_id=int(group[0, 3]), device_id=device_id, day=day)
+            ms, wh = group[:, 0], group[:, 4]
+        block.encoding = ENCODING
+        block.reading_count = len(ms)
+        block.base_ms = int(ms[0])
+        block.timestamps, block.values = encode(ms, wh)
+        block.total_kwh = Decimal(int(wh.sum())).scaleb(-3)
+        block.last_measurement_id = max(block.last_measurement_id, int(group[:, 1].max()))
+        block.updated_at = now  # bulk_update no aplica auto_now
+        (updated if block.pk else created).append(block)
+        packed += len(group)
+
+    with transaction.atomic():
+        ReadingBlock.objects.bulk_create(created)
+        ReadingBlock.objects.bulk_update(
+            updated, ['encoding', 'reading_count', 'base_ms', 'timestamps', 'values',
+                      'total_kwh', 'last_measurement_id', 'updated_at'],
+        )
+    return packed, len(created) + len(updated)
+
+
+# -- Lectura -------------------------------------------------------------------
+
+def read_series(filter_queryset, start, end):
+    """
+    (timestamps, kwh) en [start, end): epoch en segundos (int64) y consumo
+    (float64), ordenados. ``filter_queryset`` se aplica a ``ReadingBlock`` y a
+    las mediciones, así que sólo puede filtrar por dispositivo u organización
+    (p. ej. ``lambda qs: qs.filter(device__zone=zone)``).
+    """
+    boundary, watermark = packed_state()
+    parts_ms, parts_wh = [], []
+
+    if boundary is not None and start < boundary:
+        # Como las filas (manager por defecto), sin dispositivos con borrado lógico
+        blocks = filter_queryset(ReadingBlock.objects.filter(device__deleted_at__isnull=True)).filter(
+            day__gte=timezone.localdate(start),
+            day__lte=timezone.localdate(min(end, boundary) - ONE_MS),
+        ).values_list('base_ms', 'reading_count', 'timestamps', 'values')
+        for block in blocks.iterator(chunk_size=500):
+            ms, wh = decode(*block)
+            parts_ms.append(ms)
+            parts_wh.append(wh)
+
+    unpacked = unpacked_filter(boundary, watermark)
+    rows = read_history(lambda queryset: filter_queryset(queryset).filter(unpacked),
+                        ('timestamp', 'consumption_kwh'), start, end)
+    data = np.fromiter(((_to_ms(timestamp), int(value.scaleb(3))) for timestamp, value in rows),
+                       dtype=np.dtype((np.int64, 2)))
+    if data.size:
+        parts_ms.append(data[:, 0])
+        parts_wh.append(data[:, 1])
+
+    if not parts_ms:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    ms, wh = np.concatenate(parts_ms), np.concatenate(parts_wh)
+    mask = (ms >= _to_ms(start)) & (ms < _to_ms(end))
+    ms, wh = ms[mask], wh[mask]
+    order = np.argsort(ms, kind='stable')
+    return ms[order] // 1000, wh[order] / 1000
+
+
+def _from_ms(ms):
+    return EPOCH + timedelta(milliseconds=int(ms))
+
+
+def read_packed(filter_queryset, fields, since=None, until=None):
+    """
+    Lecturas empaquetadas de [since, until) como tuplas ``fields``, en orden
+    cronológico (un día de bloques a la vez). ``'timestamp'`` y
+    ``'consumption_kwh'`` salen del bloque, ``'id'`` es None (los bloques no
+    guardan ids) y el resto se lee del bloque (``device__name``,
+    ``organization_id``...). ``filter_queryset`` recibe un queryset de
+    ``ReadingBlock``, así que sólo puede filtrar por dispositivo u organización.
+    """
+    boundary, _ = packed_state()
+    if boundary is None or (since is not None and since >= boundary):
+        return
+    end = boundary if until is None else min(until, boundary)
+    meta = [field for field in fields if field not in ('timestamp', 'consumption_kwh', 'id')]
+    blocks = filter_queryset(ReadingBlock.objects.filter(device__deleted_at__isnull=True)).filter(
+        day__lte=timezone.localdate(end - ONE_MS))
+    if since is not None:
+        blocks = blocks.filter(day__gte=timezone.localdate(since))
+    low = _to_ms(since) if since is not None else None
+    high = _to_ms(end)
+
+    for day in blocks.order_by('day').values_list('day', flat=True).distinct():
+        rows = []
+        for *values, base_ms, count, timestamps, readings in blocks.filter(day=day).values_list(
+                *meta, 'base_ms', 'reading_count', 'timestamps', 'values').iterator(chunk_size=500):
+            row = dict(zip(meta, values))
+            ms, wh = decode(base_ms, count, timestamps, readings)
+            keep = ms < high if low is None else (ms >= low) & (ms < high)
+            for reading_ms, reading_wh in zip(ms[keep].tolist(), wh[keep].tolist()):
+                rows.append((reading_ms, reading_wh, row))
+        rows.sort(key=lambda item: item[0])
+        for reading_ms, reading_wh, row in rows:
+            values = {'timestamp': _from_ms(reading_ms), 'consumption_kwh': Decimal(reading_wh).scaleb(-3), 'id': None}
+            yield tuple(values[field] if field in values else row[field] for field in fields)
+
+
+def read_readings(filter_queryset, fields, since=None, until=None, chunk_size=5000):
+    """
+    Toda la historia de [since, until) fila a fila: ``read_history`` (tabla
+    principal y archivo) para lo no empaquetado más ``read_packed`` para los
+    bloques, mezclados en orden cronológico. Mismo contrato de
+    ``filter_queryset`` que ``read_packed``; ``fields[0]`` debe ser ``'timestamp'``.
+    """
+    boundary, watermark = packed_state()
+    unpacked = unpacked_filter(boundary, watermark)
+    rows = read_history(lambda queryset: filter_queryset(queryset).filter(unpacked),
+                        fields, since, until, chunk_size)
+    if boundary is None:
+        return rows
+    return heapq.merge(read_packed(filter_queryset, fields, since, until), rows, key=lambda row: row[0])
+
+
+def hourly_totals(ms, wh):
+    """
+    Agrupa lecturas ordenadas de un bloque por hora local: [(inicio de la
+    hora, total kWh, mínimo, máximo, lecturas)] con Decimal de 3 decimales,
+    igual que ``TruncHour`` sobre las filas.
+    """
+    if not len(ms):
+        return []
+    offsets = {timezone.localtime(_from_ms(ms[0])).utcoffset(), timezone.localtime(_from_ms(ms[-1])).utcoffset()}
+    if len(offsets) == 1:
+        offset = int(offsets.pop().total_seconds() * 1000)
+        hours = (ms + offset) // ONE_HOUR_MS * ONE_HOUR_MS - offset
+    else:
+        # Cambio de horario dentro del bloque: hora local lectura a lectura
+        hours = np.array([
+            _to_ms(timezone.localtime(_from_ms(value)).replace(minute=0, second=0, microsecond=0))
+            for value in ms.tolist()
+        ], dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, hours[1:] != hours[:-1]])
+    counts = np.diff(np.r_[starts, len(ms)])
+    return [
+        (_from_ms(hour), Decimal(int(total)).scaleb(-3), Decimal(int(low)).scaleb(-3),
+         Decimal(int(high)).scaleb(-3), int(count))
+        for hour, total, low, high, count in zip(
+            hours[starts].tolist(), np.add.reduceat(wh, starts).tolist(),
+            np.minimum.reduceat(wh, starts).tolist(), np.maximum.reduceat(wh, starts).tolist(), counts.tolist(),
+        )
+    ]
+
+
+def storage_bytes():
+    """(bytes de los bloques, lecturas empaquetadas) para comparar con la tabla de filas."""
+    totals = ReadingBlock.objects.aggregate(
+        timestamps=Sum(Length('timestamps')), values=Sum(Length('values')), readings=Sum('reading_count'),
+    )
+    return (totals['timestamps'] or 0) + (totals['values'] or 0), totals['readings'] or 0
@@ -0,0 +1,123 @@
+# dispositivos/events.py
+"""
+Pub/sub en proceso para el feed en vivo del dashboard (server-sent events).
+
+Cada conexión SSE se suscribe a su organización con una cola asyncio propia.
+El código síncrono (ingesta, barrido de dispositivos, señales) publica con
+``publish_measurements``/``publish_alerts``; los eventos se entregan a cada cola en su
+event loop con ``call_soon_threadsafe``, así que publicar nunca bloquea ni
+consulta la base cuando no hay suscriptores.
+"""
+import asyncio
+import json
+import threading
+
+from .zoneload import tracker as zone_load
+
+DEFAULT_QUEUE_SIZE = 256
+# Máximo de lecturas enviadas por evento ``measurements``
+MAX_READINGS_PER_EVENT = 100
+
+
+class Subscription:
+    def __init__(self, organization_id, maxsize=DEFAULT_QUEUE_SIZE):
+        self.organization_id = organization_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def push(self, event):
+        """Encola el evento; si el cliente no alcanza a leer se descarta el más antiguo."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}   # organization_id -> set(Subscription)
+
+    def subscribe(self, organization_id):
+        subscription = Subscription(organization_id)
+        with self._lock:
+            self._subscribers.setdefault(organization_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.organization_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.organization_id]
+
+    def has_subscribers(self, organization_id):
+        return bool(self._subscribers.get(organization_id))
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, organization_id, event_type, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(organization_id, ()))
+        event = (event_type, data)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, event)
+            except RuntimeError:
+                # El event loop de la conexión ya se cerró
+                self.unsubscribe(subscription)
+
+
+broker = Broker()
+
+
+def format_event(event_type, data):
+    """Serializa un evento en el formato de text/event-stream."""
+    payload = json.dumps(data, separators=(',', ':'), default=str)
+    return f'event: {event_type}\ndata: {payload}\n\n'
+
+
+def publish_measurements(measurements):
+    """Publica un lote de lecturas y la carga de zona resultante por organización."""
+    by_organization = {}
+    for measurement in measurements:
+        if broker.has_subscribers(measurement.organization_id):
+            by_organization.setdefault(measurement.organization_id, []).append(measurement)
+
+    for organization_id, items in by_organization.items():
+        broker.publish(organization_id, 'measurements', {
+            'count': len(items),
+            'readings': [
+                {
+                    'device': m.device_id,
+                    'consumption_kwh': str(m.consumption_kwh),
+                    'timestamp': m.timestamp.isoformat(),
+                }
+                for m in items[-MAX_READINGS_PER_EVENT:]
+            ],
+        })
+        publish_zone_load(organization_id)
+
+
+def publish_zone_load(organization_id):
+    if broker.has_subscribers(organization_id):
+        broker.publish(organization_id, 'zone_load', {'zones': zone_load.snapshot(organization_id)})
+
+
+def publish_alerts(alerts):
+    for alert in alerts:
+        if broker.has_subscribers(alert.organization_id):
+            broker.publish(alert.organization_id, 'alert', {
+                'device': alert.device_id,
+                'alert_type': alert.alert_type,
+                'severity': alert.severity,
+                'message': alert.message,
+                'alert_date': alert.alert_date.isoformat(),
+            })
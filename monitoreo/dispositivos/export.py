@@ -0,0 +1,101 @@
+# dispositivos/export.py
+"""Exportación de mediciones en streaming (CSV o NDJSON, opcionalmente gzip)."""
+import csv
+import io
+import json
+import zlib
+
+from .columnar import read_readings
+
+DEFAULT_CHUNK_SIZE = 2000
+# Tamaño aproximado de cada bloque enviado al cliente
+FLUSH_BYTES = 64 * 1024
+
+EXPORT_FIELDS = (
+    ('timestamp', 'timestamp'),
+    ('device_id', 'device_id'),
+    ('device', 'device__name'),
+    ('zone', 'device__zone__name'),
+    ('category', 'device__category__name'),
+    ('consumption_kwh', 'consumption_kwh'),
+)
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_rows(measurements, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Tuplas de valores en orden cronológico. Con values_list + iterator no se
+    construyen instancias del modelo ni se guarda el resultado completo en
+    memoria: las filas se leen de la base en bloques de ``chunk_size``.
+    """
+    return (
+        measurements.order_by('timestamp', 'id')
+        .values_list(*(lookup for _, lookup in EXPORT_FIELDS))
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def export_history(filter_queryset, since=None, until=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Como ``export_rows`` pero incluyendo los meses archivados y las lecturas
+    empaquetadas del rango. ``filter_queryset`` se aplica también a
+    ``ReadingBlock``: sólo puede filtrar por dispositivo u organización.
+    """
+    return read_readings(filter_queryset, [lookup for _, lookup in EXPORT_FIELDS],
+                         since=since, until=until, chunk_size=chunk_size)
+
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in EXPORT_FIELDS])
+    for row in rows:
+        writer.writerow((row[0].isoformat(),) + row[1:])
+        if buffer.tell() >= FLUSH_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_lines(rows):
+    names = [name for name, _ in EXPORT_FIELDS]
+    parts = []
+    size = 0
+    for row in rows:
+        record = dict(zip(names, row))
+        record['timestamp'] = row[0].isoformat()
+        record['consumption_kwh'] = str(record['consumption_kwh'])
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        parts.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield ''.join(parts)
+            parts, size = [], 0
+    yield ''.join(parts)
+
+
+def _gzip(chunks):
+    """Comprime al vuelo; cada bloque se envía apenas está comprimido."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> formato gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_measurements(measurements, fmt='csv', compress=False, chunk_size=DEFAULT_CHUNK_SIZE, rows=None):
+    """
+    Generador de bytes con las mediciones en el formato pedido. ``rows``
+    reemplaza la lectura de ``measurements`` (p. ej. con ``export_history``).
+    """
+    if rows is None:
+        rows = export_rows(measurements, chunk_size=chunk_size)
+    lines = _ndjson_lines(rows) if fmt == 'ndjson' else _csv_lines(rows)
+    chunks = (text.encode('utf-8') for text in lines if text)
+    return _gzip(chunks) if compress else chunks
@@ -0,0 +1,358 @@
+# dispositivos/forecasting.py
+"""
+Pronóstico de consumo por dispositivo y por zona.
+
+El modelo es liviano: un perfil estacional (semanal cuando hay al menos dos
+semanas de historia en cada hora, diario si no) más un nivel con suavizado
+exponencial sobre la serie desestacionalizada. La entrada son los kWh por
+hora de los agregados (``DeviceRollup``/``ZoneRollup``), que equivalen al kW
+promedio de cada hora.
+
+Todo se calcula sobre matrices (una fila por dispositivo o zona): el perfil
+con un producto por una matriz one-hot de horas de la semana y el suavizado
+recorriendo las horas una vez para todas las filas y todos los ``alpha``
+candidatos a la vez. Los parámetros se guardan en ``ForecastState`` y en
+cada consulta sólo se incorporan las horas nuevas (reajuste incremental).
+
+Sólo se ajustan horas ya agregadas: ``build_rollups`` corre por cron, así
+que el ajuste llega hasta la última hora agregada de la organización (sin
+incluirla, puede estar incompleta), no hasta ahora. Una hora sin agregar
+contaría como 0 kWh y el reajuste incremental ya no volvería sobre ella.
+
+Las consultas de la API no guardan (``persist=False``): parten del estado
+guardado por el trabajo ``forecast_zones`` y ajustan en memoria.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Device, DeviceRollup, ForecastState, Zone, ZoneRollup
+from .zoneload import load_status
+
+WEEK_HOURS = 168
+HORIZON_HOURS = 24
+DEFAULT_HISTORY_DAYS = 28
+ALPHAS = np.array([0.05, 0.1, 0.2, 0.3, 0.5, 0.7])
+VARIANCE_DECAY = 0.05
+WEEKLY_MIN_COUNT = 2
+# Banda superior ~p95 de una normal
+UPPER_Z = 1.645
+# Estado de un dueño sin horas agregadas con consumo
+NO_DATA = 'no_data'
+# El 1/1/1970 fue jueves: desplazamiento para que la hora 0 de la semana sea lunes 00:00
+EPOCH_WEEK_OFFSET = 72
+
+SOURCES = {
+    'device': (DeviceRollup, 'device_id'),
+    'zone': (ZoneRollup, 'zone_id'),
+}
+
+
+def get_history_days():
+    return getattr(settings, 'FORECAST_HISTORY_DAYS', DEFAULT_HISTORY_DAYS)
+
+
+def _hour(value):
+    return int(value.timestamp()) // 3600
+
+
+def _datetime(hour):
+    return datetime.fromtimestamp(hour * 3600, tz=dt_timezone.utc)
+
+
+def _slots(first_hour, count):
+    """Hora de la semana (hora local) de ``count`` horas desde ``first_hour``."""
+    offset = int(timezone.localtime(_datetime(first_hour)).utcoffset().total_seconds()) // 3600
+    return (first_hour + offset + EPOCH_WEEK_OFFSET + np.arange(count)) % WEEK_HOURS
+
+
+def rolled_up_until(organization_id):
+    """
+    Inicio de la última hora agregada de la organización (None si no hay
+    agregados). Esa hora puede estar incompleta; las anteriores no.
+    """
+    latest = ZoneRollup.objects.filter(zone=OuterRef('pk'), period='hour').order_by('-bucket_start')
+    # Una búsqueda por índice (zone, period, bucket_start) por zona
+    starts = Zone.all_objects.filter(organization_id=organization_id).annotate(
+        latest=Subquery(latest.values('bucket_start')[:1]),
+    ).values_list('latest', flat=True)
+    return max((start for start in starts if start is not None), default=None)
+
+
+def load_hourly(kind, owner_ids, first_hour, last_hour):
+    """Matriz (dueños x horas) de kWh por hora en [first_hour, last_hour)."""
+    model, field = SOURCES[kind]
+    rows = model.objects.filter(
+        **{f'{field}__in': owner_ids},
+        period='hour',
+        bucket_start__gte=_datetime(first_hour),
+        bucket_start__lt=_datetime(last_hour),
+    ).values_list(field, 'bucket_start', 'total_kwh')
+    data = np.fromiter(
+        ((owner, _hour(start), float(total)) for owner, start, total in rows.iterator(chunk_size=5000)),
+        dtype=np.dtype((np.float64, 3)),
+    )
+    matrix = np.zeros((len(owner_ids), last_hour - first_hour))
+    if data.size:
+        index = {owner: n for n, owner in enumerate(owner_ids)}
+        owners = np.array([index[int(owner)] for owner in data[:, 0]])
+        np.add.at(matrix, (owners, data[:, 1].astype(np.int64) - first_hour), data[:, 2])
+    return matrix
+
+
+def seasonal_profile(sums, counts):
+    """(perfil centrado por hora de la semana, filas con perfil semanal)."""
+    weekly = (counts >= WEEKLY_MIN_COUNT).all(axis=1)
+    week_mean = sums / np.maximum(counts, 1)
+    day_mean = sums.reshape(-1, 7, 24).sum(axis=1) / np.maximum(counts.reshape(-1, 7, 24).sum(axis=1), 1)
+    profile = np.where(weekly[:, None], week_mean, np.tile(day_mean, 7))
+    return profile - profile.mean(axis=1, keepdims=True), weekly
+
+
+def _smooth(values, active, seasonal, level, variance, alphas):
+    """
+    Suavizado exponencial del nivel para todas las filas (y columnas de
+    ``alphas``) a la vez. Devuelve (nivel, varianza, suma de errores²).
+    """
+    sse = np.zeros_like(level)
+    for t in range(values.shape[1]):
+        on = active[:, t:t + 1]
+        x = values[:, t:t + 1] - seasonal[:, t:t + 1]
+        fresh = on & np.isnan(level)
+        level = np.where(fresh, x, level)
+        error = x - level
+        seen = on & ~fresh
+        sse += np.where(seen, error ** 2, 0)
+        variance = np.where(seen, (1 - VARIANCE_DECAY) * variance + VARIANCE_DECAY * error ** 2, variance)
+        level = np.where(on, level + alphas * error, level)
+    return level, variance, sse
+
+
+def _fit(kind, owner_ids, first_hour, last_hour):
+    """Ajuste completo; devuelve los arreglos de parámetros por dueño."""
+    matrix = load_hourly(kind, owner_ids, first_hour, last_hour)
+    # Cada fila cuenta desde su primera hora con consumo (dispositivos nuevos)
+    active = np.maximum.accumulate(matrix > 0, axis=1)
+    slots = _slots(first_hour, matrix.shape[1])
+    onehot = np.eye(WEEK_HOURS)[slots]
+    sums = (matrix * active) @ onehot
+    counts = active.astype(np.float64) @ onehot
+    seasonal, weekly = seasonal_profile(sums, counts)
+
+    rows = len(owner_ids)
+    candidates = np.broadcast_to(ALPHAS, (rows, len(ALPHAS)))
+    level, variance, sse = _smooth(
+        matrix, active, seasonal[:, slots],
+        np.full((rows, len(ALPHAS)), np.nan), np.zeros((rows, len(ALPHAS))), candidates,
+    )
+    best = np.argmin(np.where(np.isnan(level), np.inf, sse), axis=1)
+    pick = np.arange(rows)
+    return {
+        'alpha': ALPHAS[best], 'level': level[pick, best], 'variance': variance[pick, best],
+        'sums': sums, 'counts': counts, 'weekly': weekly,
+    }
+
+
+def _update(kind, states, last_hour):
+    """Incorpora las horas nuevas de cada estado con su ``alpha`` ya elegido."""
+    owner_ids = [_owner_id(kind, state) for state in states]
+    starts = np.array([_hour(state.fitted_until) for state in states])
+    first_hour = int(starts.min())
+    matrix = load_hourly(kind, owner_ids, first_hour, last_hour)
+    hours = first_hour + np.arange(matrix.shape[1])
+    active = hours[None, :] >= starts[:, None]
+    slots = _slots(first_hour, matrix.shape[1])
+    onehot = np.eye(WEEK_HOURS)[slots]
+
+    sums = np.array([state.profile_sum for state in states], dtype=np.float64)
+    counts = np.array([state.profile_count for state in states], dtype=np.float64)
+    seasonal, _ = seasonal_profile(sums, counts)
+    level = np.array([[np.nan if state.level is None else state.level] for state in states])
+    variance = np.array([[state.variance] for state in states])
+    alphas = np.array([[state.alpha] for state in states])
+    level, variance, _ = _smooth(matrix, active, seasonal[:, slots], level, variance, alphas)
+
+    sums += (matrix * active) @ onehot
+    counts += active.astype(np.float64) @ onehot
+    _, weekly = seasonal_profile(sums, counts)
+    return {
+        'alpha': alphas[:, 0], 'level': level[:, 0], 'variance': variance[:, 0],
+        'sums': sums, 'counts': counts, 'weekly': weekly,
+    }
+
+
+def _owner_id(kind, state):
+    return state.device_id if kind == 'device' else state.zone_id
+
+
+def _apply(state, params, n, fitted_until):
+    level = params['level'][n]
+    state.alpha = float(params['alpha'][n])
+    state.level = None if np.isnan(level) else float(level)
+    state.variance = float(params['variance'][n])
+    state.profile_sum = [round(value, 6) for value in params['sums'][n].tolist()]
+    state.profile_count = params['counts'][n].astype(int).tolist()
+    state.seasonality = 'weekly' if params['weekly'][n] else 'daily'
+    state.fitted_until = fitted_until
+
+
+def refresh(kind, owners, now=None, refit=False, persist=True):
+    """
+    Estados de pronóstico al día para ``owners`` (dispositivos o zonas de una
+    misma organización): ajuste completo para los nuevos, los vencidos o con
+    ``refit``; incremental para el resto, hasta la última hora agregada.
+    Con ``persist`` se guardan (sin agregados todavía nunca se guardan).
+    Devuelve {id: ForecastState}.
+    """
+    owners = list(owners)
+    if not owners:
+        return {}
+    last_hour = _hour(now or timezone.now())
+    rolled = rolled_up_until(owners[0].organization_id)
+    if rolled is None:
+        persist = False
+    else:
+        last_hour = min(last_hour, _hour(rolled))
+    history_start = last_hour - get_history_days() * 24
+    field = 'device_id' if kind == 'device' else 'zone_id'
+    existing = {
+        getattr(state, field): state
+        for state in ForecastState.objects.filter(**{f'{field}__in': [owner.pk for owner in owners]})
+    }
+
+    full, incremental = [], []
+    for owner in owners:
+        state = existing.get(owner.pk)
+        if state is None:
+            state = ForecastState(organization_id=owner.organization_id, **{field: owner.pk})
+            existing[owner.pk] = state
+        if refit or state.pk is None or _hour(state.fitted_until) < history_start:
+            full.append(state)
+        elif _hour(state.fitted_until) < last_hour:
+            incremental.append(state)
+
+    fitted_until = _datetime(last_hour)
+    changed = []
+    if full:
+        params = _fit(kind, [_owner_id(kind, state) for state in full], history_start, last_hour)
+        for n, state in enumerate(full):
+            _apply(state, params, n, fitted_until)
+        changed.extend(full)
+    if incremental:
+        params = _update(kind, incremental, last_hour)
+        for n, state in enumerate(incremental):
+            _apply(state, params, n, fitted_until)
+        changed.extend(incremental)
+
+    if changed and persist:
+        now_value = timezone.now()
+        for state in changed:
+            state.updated_at = now_value  # bulk_update no aplica auto_now
+        with transaction.atomic():
+            ForecastState.objects.bulk_create([state for state in changed if state.pk is None])
+            ForecastState.objects.bulk_update(
+                [state for state in changed if state.pk is not None],
+                ['fitted_until', 'seasonality', 'alpha', 'level', 'variance',
+                 'profile_sum', 'profile_count', 'updated_at'],
+            )
+    return {owner.pk: existing[owner.pk] for owner in owners}
+
+
+def predict(state, hours=HORIZON_HOURS):
+    """(inicio de cada hora, kW pronosticado, banda superior ~p95) desde ``fitted_until``."""
+    first_hour = _hour(state.fitted_until)
+    sums = np.array([state.profile_sum], dtype=np.float64)
+    counts = np.array([state.profile_count], dtype=np.float64)
+    seasonal, _ = seasonal_profile(sums, counts)
+    level = state.level or 0.0
+    predicted = np.maximum(level + seasonal[0, _slots(first_hour, hours)], 0)
+    upper = predicted + UPPER_Z * np.sqrt(state.variance)
+    return [_datetime(first_hour + n) for n in range(hours)], predicted, upper
+
+
+def _round(value, digits=3):
+    return round(float(value), digits)
+
+
+def _no_data(state, limit_kw):
+    """Resumen sin lecturas agregadas: valores nulos, distinguible de un pronóstico de 0 kW."""
+    summary = {
+        'fitted_until': state.fitted_until.isoformat(),
+        'seasonality': None,
+        'alpha': None,
+        'peak_kw': None,
+        'peak_at': None,
+        'peak_upper_kw': None,
+    }
+    if limit_kw:
+        summary.update({'peak_utilization': None, 'hours_over_limit': None, 'hours_at_risk': None})
+    summary.update({'status': NO_DATA, 'hours': []})
+    return summary
+
+
+def _summary(state, limit_kw, hours):
+    # Sin nivel ajustado no hubo ninguna hora con consumo en la historia
+    if state.level is None:
+        return _no_data(state, limit_kw)
+    starts, predicted, upper = predict(state, hours)
+    summary = {
+        'fitted_until': state.fitted_until.isoformat(),
+        'seasonality': state.seasonality,
+        'alpha': state.alpha,
+        'peak_kw': _round(predicted.max()),
+        'peak_at': starts[int(predicted.argmax())].isoformat(),
+        'peak_upper_kw': _round(upper.max()),
+    }
+    if limit_kw:
+        summary.update({
+            'peak_utilization': _round(predicted.max() / limit_kw, 4),
+            'hours_over_limit': int((predicted > limit_kw).sum()),
+            'hours_at_risk': int((upper > limit_kw).sum()),
+            'status': load_status(predicted.max() / limit_kw),
+        })
+    summary['hours'] = [
+        {'hour': start.isoformat(), 'predicted_kw': _round(value), 'upper_kw': _round(high)}
+        for start, value, high in zip(starts, predicted, upper)
+    ]
+    return summary
+
+
+def zone_forecast(zone, hours=HORIZON_HOURS, now=None, persist=True):
+    """Pronóstico de las próximas ``hours`` horas de la zona frente a ``max_capacity``."""
+    state = refresh('zone', [zone], now=now, persist=persist)[zone.pk]
+    capacity = float(zone.max_capacity or 0)
+    return {'zone': zone.id, 'name': zone.name, 'max_capacity_kw': capacity,
+            **_summary(state, capacity, hours)}
+
+
+def device_forecast(device, hours=HORIZON_HOURS, now=None, persist=True):
+    """Pronóstico del dispositivo frente a su potencia nominal."""
+    state = refresh('device', [device], now=now, persist=persist)[device.pk]
+    rated = device.power_watts / 1000 if device.power_watts else 0
+    return {'device': device.id, 'name': device.name, 'power_kw': rated,
+            **_summary(state, rated, hours)}
+
+
+def score_organization(organization_id, hours=HORIZON_HOURS, now=None, refit=False):
+    """
+    Pronostica todas las zonas de una organización en un solo ajuste
+    vectorizado. Devuelve una fila por zona, sin el detalle por hora.
+    """
+    zones = list(Zone.objects.filter(organization_id=organization_id).order_by('name'))
+    states = refresh('zone', zones, now=now, refit=refit)
+    results = []
+    for zone in zones:
+        summary = _summary(states[zone.pk], float(zone.max_capacity or 0), hours)
+        summary.pop('hours')
+        results.append({'organization': organization_id, 'zone': zone.id, 'name': zone.name,
+                        'max_capacity_kw': float(zone.max_capacity or 0), **summary})
+    return results
+
+
+def refresh_devices(organization_id, now=None, refit=False):
+    """Reajusta los estados de todos los dispositivos de una organización."""
+    return refresh('device', Device.objects.filter(organization_id=organization_id), now=now, refit=refit)
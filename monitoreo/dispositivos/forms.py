@@ -1,5 +1,5 @@
 from django import forms
-from .models import Device, Category, Zone, Organization
+from .models import Device, Category, Zone
 
 class DeviceForm(forms.ModelForm):
     class Meta:
@@ -15,11 +15,9 @@ class DeviceForm(forms.ModelForm):
             self.fields['category'].queryset = Category.objects.filter(organization=organization)
             self.fields['zone'].queryset = Zone.objects.filter(organization=organization)
         else:
-            # Temporal: usar la primera organización
-            first_org = Organization.objects.first()
-            if first_org:
-                self.fields['category'].queryset = Category.objects.filter(organization=first_org)
-                self.fields['zone'].queryset = Zone.objects.filter(organization=first_org)
+            # Sin organización no se ofrece ninguna categoría ni zona
+            self.fields['category'].queryset = Category.objects.none()
+            self.fields['zone'].queryset = Zone.objects.none()
     
     # Validación personalizada
     def clean_power_watts(self):
@@ -41,15 +39,77 @@ class DeviceFilterForm(forms.Form):
         required=False,
         empty_label="All Categories"
     )
+    zone = forms.ModelChoiceField(
+        queryset=Zone.objects.none(),
+        required=False,
+        empty_label="All Zones"
+    )
     
     def __init__(self, *args, **kwargs):
         organization = kwargs.pop('organization', None)
         super().__init__(*args, **kwargs)
         
+        # Sin organización los selectores quedan vacíos (querysets .none())
         if organization:
             self.fields['category'].queryset = Category.objects.filter(organization=organization)
-        else:
-            # Temporal: usar la primera organización
-            first_org = Organization.objects.first()
-            if first_org:
-                self.fields['category'].queryset = Category.objects.filter(organization=first_org)
\ No newline at end of file
+            self.fields['zone'].queryset = Zone.objects.filter(organization=organization)
+
+    def filter_queryset(self, devices):
+        if not self.is_valid():
+            return devices
+        if self.cleaned_data.get('category'):
+            devices = devices.filter(category=self.cleaned_data['category'])
+        if self.cleaned_data.get('zone'):
+            devices = devices.filter(zone=self.cleaned_data['zone'])
+        return devices
+
+
+# Filtros del listado de mediciones
+class MeasurementFilterForm(DeviceFilterForm):
+    device = forms.ModelChoiceField(
+        queryset=Device.objects.none(),
+        required=False,
+        empty_label="All Devices"
+    )
+    since = forms.DateTimeField(required=False)
+    until = forms.DateTimeField(required=False)
+    
+    def __init__(self, *args, **kwargs):
+        organization = kwargs.get('organization')
+        super().__init__(*args, **kwargs)
+        
+        if organization:
+            self.fields['device'].queryset = Device.objects.filter(
+                organization=organization
+            ).select_related('zone').order_by('name')
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        since, until = cleaned_data.get('since'), cleaned_data.get('until')
+        if since and until and since >= until:
+            raise forms.ValidationError("'since' must be earlier than 'until'")
+        return cleaned_data
+    
+    def filter_devices(self, queryset):
+        """Sólo los filtros por dispositivo, zona y categoría (sirve también para ``ReadingBlock``)."""
+        if not self.is_valid():
+            return queryset
+        data = self.cleaned_data
+        if data.get('device'):
+            queryset = queryset.filter(device=data['device'])
+        if data.get('zone'):
+            queryset = queryset.filter(device__zone=data['zone'])
+        if data.get('category'):
+            queryset = queryset.filter(device__category=data['category'])
+        return queryset
+    
+    def filter_queryset(self, measurements):
+        if not self.is_valid():
+            return measurements
+        data = self.cleaned_data
+        measurements = self.filter_devices(measurements)
+        if data.get('since'):
+            measurements = measurements.filter(timestamp__gte=data['since'])
+        if data.get('until'):
+            measurements = measurements.filter(timestamp__lt=data['until'])
+        return measurements
\ No newline at end of file
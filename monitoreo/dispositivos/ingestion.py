@@ -0,0 +1,210 @@
+# dispositivos/ingestion.py
+"""Ingesta masiva de mediciones enviadas por los gateways."""
+import csv
+import io
+import json
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .caching import invalidate_organization_blocks
+from .events import publish_alerts, publish_measurements
+from .models import Device, Measurement
+from .presence import touch_last_seen
+from .rules import engine as rule_engine
+from .zoneload import tracker as zone_load
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_MAX_ROWS = 50000
+
+# Límites del campo consumption_kwh (max_digits=10, decimal_places=3)
+KWH_QUANTUM = Decimal('0.001')
+KWH_MAX = Decimal('9999999.999')
+
+
+# Tipos aceptados: ninguno es "simple" para CORS, así que un formulario de
+# otro sitio no puede enviar un lote con la sesión del usuario
+CONTENT_TYPES = ('application/json', 'text/csv')
+
+
+class PayloadError(ValueError):
+    """El cuerpo de la petición no se puede interpretar como lote de lecturas."""
+
+
+class UnsupportedContentType(PayloadError):
+    """El cuerpo no viene como JSON ni CSV."""
+
+
+class IngestionResult:
+    def __init__(self):
+        self.received = 0
+        self.created = 0
+        self.rejected = []
+        self.elapsed = 0.0
+        self.measurements = []
+        self.alerts = []
+
+    def reject(self, row_number, error):
+        self.rejected.append({'row': row_number, 'error': error})
+
+    @property
+    def rows_per_second(self):
+        if not self.elapsed:
+            return 0.0
+        return self.created / self.elapsed
+
+    def as_dict(self):
+        return {
+            'received': self.received,
+            'created': self.created,
+            'rejected_count': len(self.rejected),
+            'rejected': self.rejected,
+            'alerts_created': len(self.alerts),
+            'elapsed_seconds': round(self.elapsed, 4),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def get_chunk_size(value=None):
+    """Tamaño de lote: parámetro explícito o MEASUREMENT_INGEST_CHUNK_SIZE."""
+    if value in (None, ''):
+        value = getattr(settings, 'MEASUREMENT_INGEST_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise PayloadError('chunk_size must be an integer')
+    if value <= 0:
+        raise PayloadError('chunk_size must be greater than zero')
+    return value
+
+
+def parse_payload(body, content_type):
+    """Convierte un cuerpo JSON o CSV (según ``CONTENT_TYPES``) en una lista de diccionarios."""
+    if content_type not in CONTENT_TYPES:
+        raise UnsupportedContentType(f'Content-Type must be one of: {", ".join(CONTENT_TYPES)}')
+    if content_type == 'text/csv':
+        try:
+            text = body.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise PayloadError('CSV payload must be UTF-8 encoded')
+        try:
+            return list(csv.DictReader(io.StringIO(text)))
+        except csv.Error as exc:
+            raise PayloadError(f'Invalid CSV payload: {exc}')
+
+    try:
+        data = json.loads(body or b'null')
+    except (ValueError, UnicodeDecodeError):
+        raise PayloadError('Invalid JSON payload')
+    if isinstance(data, dict):
+        data = data.get('readings')
+    if not isinstance(data, list):
+        raise PayloadError('Expected a list of readings or {"readings": [...]}')
+    return data
+
+
+def _clean_row(row):
+    """Valida una lectura y devuelve (device_id, consumo, timestamp)."""
+    if not isinstance(row, dict):
+        raise ValueError('reading must be an object')
+
+    try:
+        device_id = int(row.get('device'))
+    except (TypeError, ValueError):
+        raise ValueError('device must be an integer id')
+
+    try:
+        consumption = Decimal(str(row.get('consumption_kwh'))).quantize(KWH_QUANTUM)
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError('consumption_kwh must be a number')
+    if not consumption.is_finite() or consumption < 0:
+        raise ValueError('consumption_kwh cannot be negative')
+    if consumption > KWH_MAX:
+        raise ValueError('consumption_kwh is out of range')
+
+    raw_timestamp = row.get('timestamp')
+    if raw_timestamp in (None, ''):
+        timestamp = timezone.now()
+    else:
+        try:
+            timestamp = parse_datetime(str(raw_timestamp))
+        except ValueError:
+            timestamp = None
+        if timestamp is None:
+            raise ValueError('timestamp must be an ISO 8601 datetime')
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp, timezone.get_current_timezone())
+
+    return device_id, consumption, timestamp
+
+
+def ingest_measurements(rows, chunk_size=None, organization=None, evaluate_rules=True):
+    """
+    Valida un lote de lecturas y lo inserta con bulk_create.
+
+    Los dispositivos se resuelven a su organización con una sola consulta y
+    todas las inserciones ocurren dentro de una única transacción, en bloques
+    de ``chunk_size`` filas. Las filas inválidas se reportan en el resultado
+    sin abortar el resto del lote. La última lectura de cada dispositivo queda
+    en ``Device.last_seen_at``. Las lecturas aceptadas pasan por el motor
+    de reglas (``rules.engine``) y las alertas se guardan en la misma transacción.
+    """
+    chunk_size = get_chunk_size(chunk_size)
+    max_rows = getattr(settings, 'MEASUREMENT_INGEST_MAX_ROWS', DEFAULT_MAX_ROWS)
+    result = IngestionResult()
+    result.received = len(rows)
+    if result.received > max_rows:
+        raise PayloadError(f'Too many readings in one batch (max {max_rows})')
+
+    started = time.perf_counter()
+
+    cleaned = []
+    for row_number, row in enumerate(rows, start=1):
+        try:
+            cleaned.append((row_number,) + _clean_row(row))
+        except ValueError as exc:
+            result.reject(row_number, str(exc))
+
+    # Dispositivo -> organización en una sola consulta
+    devices = Device.objects.filter(id__in={item[1] for item in cleaned})
+    if organization is not None:
+        devices = devices.filter(organization=organization)
+    owners = dict(devices.values_list('id', 'organization_id'))
+
+    measurements = []
+    for row_number, device_id, consumption, timestamp in cleaned:
+        organization_id = owners.get(device_id)
+        if organization_id is None:
+            result.reject(row_number, f'device {device_id} does not exist')
+            continue
+        measurements.append(Measurement(
+            organization_id=organization_id,
+            device_id=device_id,
+            consumption_kwh=consumption,
+            timestamp=timestamp,
+        ))
+
+    with transaction.atomic():
+        for start in range(0, len(measurements), chunk_size):
+            Measurement.objects.bulk_create(measurements[start:start + chunk_size])
+        touch_last_seen(measurements)
+        # Reglas de alertas evaluadas sobre el lote recién insertado
+        if evaluate_rules:
+            result.alerts = rule_engine.process(measurements)
+        # bulk_create no emite post_save: invalidar los bloques cacheados a mano
+        touched = {measurement.organization_id for measurement in measurements}
+        transaction.on_commit(lambda: invalidate_organization_blocks(*touched))
+        transaction.on_commit(lambda: zone_load.add_measurements(measurements))
+        # Feed en vivo (SSE) de las organizaciones con dashboards abiertos
+        transaction.on_commit(lambda: publish_measurements(measurements))
+        transaction.on_commit(lambda: publish_alerts(result.alerts))
+
+    result.rejected.sort(key=lambda item: item['row'])
+    result.created = len(measurements)
+    result.measurements = measurements
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,178 @@
+# dispositivos/instrumentation.py
+"""
+Instrumentación opcional de rendimiento por vista.
+
+``InstrumentationMiddleware`` (activo sólo con ``PERFORMANCE_INSTRUMENTATION =
+True``) registra por nombre de URL la cantidad de consultas SQL, el tiempo en
+SQL, el tiempo de renderizado de templates y el tiempo total de respuesta.
+Las muestras se guardan en memoria (las últimas ``PERFORMANCE_SAMPLE_SIZE``
+por vista) y ``metrics_snapshot`` las resume en percentiles. Las peticiones
+que superan el presupuesto de ``PERFORMANCE_BUDGETS`` se registran en el
+logger ``dispositivos.performance``.
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('dispositivos.performance')
+
+DEFAULT_SAMPLE_SIZE = 1000
+DEFAULT_BUDGET = {'queries': 25, 'sql_ms': 200, 'total_ms': 500}
+METRICS = ('queries', 'sql_ms', 'template_ms', 'total_ms')
+PERCENTILES = (50, 95, 99)
+
+# Mediciones de la petición en curso (una por hilo o tarea async)
+_current = contextvars.ContextVar('dispositivos_request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'sql_ms', 'template_ms')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: se invoca por cada consulta ejecutada
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_ms += (time.perf_counter() - started) * 1000
+
+
+def _instrument_templates():
+    """Envuelve Template.render del backend de Django para sumar el tiempo de renderizado."""
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, '_instrumented', False):
+        return
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return original(self, context, request)
+        started = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            metrics.template_ms += (time.perf_counter() - started) * 1000
+
+    render._instrumented = True
+    Template.render = render
+
+
+def _percentile(ordered, p):
+    if not ordered:
+        return None
+    k = (len(ordered) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+class MetricsStore:
+    def __init__(self, sample_size=DEFAULT_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.samples = defaultdict(lambda: deque(maxlen=self.sample_size))
+            self.requests = defaultdict(int)
+            self.over_budget = defaultdict(int)
+
+    def record(self, name, sample, over_budget=False):
+        with self._lock:
+            self.samples[name].append(sample)
+            self.requests[name] += 1
+            if over_budget:
+                self.over_budget[name] += 1
+
+    def snapshot(self):
+        """Percentiles por vista sobre las muestras retenidas."""
+        with self._lock:
+            items = {name: list(samples) for name, samples in self.samples.items()}
+            requests = dict(self.requests)
+            over_budget = dict(self.over_budget)
+        result = {}
+        for name, samples in sorted(items.items()):
+            view = {'requests': requests[name], 'over_budget': over_budget.get(name, 0)}
+            for index, metric in enumerate(METRICS):
+                ordered = sorted(sample[index] for sample in samples)
+                view[metric] = {f'p{p}': round(_percentile(ordered, p), 3) for p in PERCENTILES}
+                view[metric]['max'] = round(ordered[-1], 3)
+            result[name] = view
+        return result
+
+
+store = MetricsStore(getattr(settings, 'PERFORMANCE_SAMPLE_SIZE', DEFAULT_SAMPLE_SIZE))
+
+
+def _wrap_connections(metrics):
+    """Aplica el execute_wrapper a todas las conexiones configuradas."""
+    stack = ExitStack()
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(metrics))
+    return stack
+
+
+def get_budget(name):
+    budgets = getattr(settings, 'PERFORMANCE_BUDGETS', {})
+    budget = dict(DEFAULT_BUDGET)
+    budget.update(budgets.get('default', {}))
+    budget.update(budgets.get(name, {}))
+    return budget
+
+
+def metrics_snapshot():
+    return store.snapshot()
+
+
+class InstrumentationMiddleware:
+    """Mide cada petición; se desactiva solo si PERFORMANCE_INSTRUMENTATION es False."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFORMANCE_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        _instrument_templates()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with _wrap_connections(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        name = (match.url_name if match else None) or 'unresolved'
+        budget = get_budget(name)
+        sample = (metrics.queries, metrics.sql_ms, metrics.template_ms, total_ms)
+        offenders = {
+            metric: value for metric, value in zip(METRICS, sample)
+            if metric in budget and value > budget[metric]
+        }
+        store.record(name, sample, over_budget=bool(offenders))
+        if offenders:
+            logger.warning(
+                'Over budget: %s %s (%s) queries=%d sql=%.1fms templates=%.1fms total=%.1fms',
+                request.method, request.path, name, *sample,
+            )
+        return response
+
@@ -0,0 +1,206 @@
+# dispositivos/jobs.py
+"""
+Trabajos por lotes repartidos en procesos.
+
+Un trabajo de ``JOBS`` es una función que procesa un fragmento (``shard``):
+una organización (``{'organization': id}``) o un rango de ids de
+dispositivos (``{'first_id': a, 'last_id': b}``). ``run_job`` reparte los
+fragmentos en un ``ProcessPoolExecutor``; cada proceso abre su propia
+conexión a la base (la del proceso padre se cierra antes de crear el pool).
+
+El avance queda en ``JobRun``/``JobShard``: cada fragmento se marca al
+terminar, con su duración y resultado. Si una ejecución se interrumpe, otra
+con ``resume`` (``--resume``) y las mismas opciones procesa sólo los
+fragmentos pendientes o fallidos. Sin ``resume`` cada ejecución empieza de
+cero con las organizaciones y dispositivos actuales: la corrida nocturna no
+debe quedarse con los fragmentos de una noche anterior.
+
+SQLite admite un solo escritor: si dos procesos escriben a la vez, uno puede
+recibir "database is locked". Como los trabajos son idempotentes por
+fragmento, ese fragmento se reintenta (``JOB_LOCK_RETRIES`` veces, con
+espera creciente) antes de marcarlo como fallido.
+"""
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from django.conf import settings
+from django.db import OperationalError, connection, connections
+from django.utils import timezone
+
+from .models import Device, JobRun, JobShard, Organization
+
+SHARD_MODES = ('organization', 'devices')
+DEFAULT_SHARDS_PER_WORKER = 4
+DEFAULT_LOCK_RETRIES = 5
+LOCK_RETRY_SECONDS = 0.5
+
+
+class JobError(ValueError):
+    pass
+
+
+# -- Fragmentos ----------------------------------------------------------------
+
+def organization_shards():
+    return [
+        (f'organization:{organization_id}', {'organization': organization_id})
+        for organization_id in Organization.objects.order_by('id').values_list('id', flat=True)
+    ]
+
+
+def device_shards(count):
+    """``count`` rangos contiguos de ids de dispositivos con cantidades parecidas."""
+    ids = np.fromiter(Device.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+    return [
+        (f'devices:{part[0]}-{part[-1]}', {'first_id': int(part[0]), 'last_id': int(part[-1])})
+        for part in np.array_split(ids, min(count, len(ids))) if len(part)
+    ]
+
+
+def filter_shard(queryset, shard, organization_field='organization_id', id_field='id'):
+    """Restringe ``queryset`` al fragmento (por organización o por rango de ids)."""
+    if 'organization' in shard:
+        return queryset.filter(**{organization_field: shard['organization']})
+    return queryset.filter(**{f'{id_field}__gte': shard['first_id'], f'{id_field}__lte': shard['last_id']})
+
+
+def _organization(shard):
+    if 'organization' not in shard:
+        raise JobError('This job can only be sharded by organization')
+    return shard['organization']
+
+
+# -- Trabajos ------------------------------------------------------------------
+
+def forecast_zones_job(shard, refit=False, devices=False, hours=None):
+    from .forecasting import HORIZON_HOURS, refresh, score_organization
+
+    organization_id = _organization(shard)
+    if devices:
+        refresh('device', Device.objects.filter(organization_id=organization_id), refit=refit)
+    return score_organization(organization_id, hours=hours or HORIZON_HOURS, refit=refit)
+
+
+def forecast_devices_job(shard, refit=False):
+    from .forecasting import refresh
+
+    states = refresh('device', filter_shard(Device.objects.all(), shard), refit=refit)
+    return {'devices': len(states)}
+
+
+def sweep_offline_job(shard, dry_run=False):
+    from .presence import sweep_offline_devices
+
+    alerts = sweep_offline_devices(organization=_organization(shard), dry_run=dry_run)
+    return {'alerts': len(alerts)}
+
+
+def backfill_last_seen_job(shard):
+    from .presence import backfill_last_seen
+
+    return {'devices': backfill_last_seen(organization=_organization(shard))}
+
+
+def monthly_reports_job(shard, full=False):
+    from .reports import refresh_reports
+
+    return {'months': [f'{month:%Y-%m}' for month in refresh_reports(_organization(shard), full=full)]}
+
+
+# nombre -> (función, modos de fragmentación admitidos, opciones admitidas)
+JOBS = {
+    'forecast_zones': (forecast_zones_job, ('organization',), ('refit', 'devices', 'hours')),
+    'forecast_devices': (forecast_devices_job, SHARD_MODES, ('refit',)),
+    'sweep_offline': (sweep_offline_job, ('organization',), ('dry_run',)),
+    'backfill_last_seen': (backfill_last_seen_job, ('organization',), ()),
+    'monthly_reports': (monthly_reports_job, ('organization',), ('full',)),
+}
+
+
+# -- Ejecución -----------------------------------------------------------------
+
+def _init_worker():
+    # Conexión propia por proceso: nunca reutilizar la heredada del padre
+    connections.close_all()
+
+
+def _locked(exc):
+    return connection.vendor == 'sqlite' and 'locked' in str(exc)
+
+
+def _run_shard(name, shard, options):
+    retries = getattr(settings, 'JOB_LOCK_RETRIES', DEFAULT_LOCK_RETRIES)
+    started = time.perf_counter()
+    for attempt in range(retries + 1):
+        try:
+            result = JOBS[name][0](shard, **options)
+            break
+        except OperationalError as exc:
+            # La transacción del fragmento ya se revirtió: se puede repetir
+            if attempt == retries or not _locked(exc):
+                raise
+            time.sleep(LOCK_RETRY_SECONDS * (attempt + 1))
+    return (time.perf_counter() - started) * 1000, result
+
+
+def _resumable(name, shard_by, options):
+    run = JobRun.objects.filter(job=name).first()
+    if run is not None and run.status != 'completed' and run.shard_by == shard_by and run.options == options:
+        return run
+    return None
+
+
+def run_job(name, shard_by='organization', workers=None, shards=None, options=None, resume=False,
+            progress=None):
+    """
+    Ejecuta el trabajo ``name`` y devuelve su ``JobRun``. Con ``resume``
+    retoma la última ejecución incompleta con las mismas opciones (si no hay,
+    empieza una nueva). ``progress(shard)`` se llama cada vez que un
+    fragmento termina.
+    """
+    if name not in JOBS:
+        raise JobError(f'Unknown job {name!r}. Available: {", ".join(JOBS)}')
+    _, modes, allowed = JOBS[name]
+    if shard_by not in modes:
+        raise JobError(f'{name} supports sharding by: {", ".join(modes)}')
+    options = options or {}
+    unknown = set(options) - set(allowed)
+    if unknown:
+        raise JobError(f'Unknown options for {name}: {", ".join(sorted(unknown))}')
+    workers = max(1, workers or os.cpu_count() or 1)
+
+    run = _resumable(name, shard_by, options) if resume else None
+    if run is None:
+        specs = organization_shards() if shard_by == 'organization' else device_shards(
+            shards or workers * DEFAULT_SHARDS_PER_WORKER)
+        run = JobRun.objects.create(job=name, shard_by=shard_by, options=options, workers=workers)
+        JobShard.objects.bulk_create(JobShard(run=run, key=key, spec=spec) for key, spec in specs)
+    else:
+        run.status = 'running'
+        run.workers = workers
+        run.save(update_fields=['status', 'workers', 'updated_at'])
+
+    pending = list(run.shards.exclude(status='done'))
+    if pending:
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=_init_worker) as pool:
+            futures = {pool.submit(_run_shard, name, shard.spec, options): shard for shard in pending}
+            for future in as_completed(futures):
+                shard = futures[future]
+                try:
+                    shard.elapsed_ms, shard.result = future.result()
+                    shard.status, shard.error = 'done', ''
+                except Exception:
+                    shard.status, shard.error = 'failed', traceback.format_exc()
+                # Punto de control: el fragmento queda registrado apenas termina
+                shard.save(update_fields=['status', 'elapsed_ms', 'result', 'error', 'updated_at'])
+                if progress is not None:
+                    progress(shard)
+
+    run.status = 'failed' if run.shards.exclude(status='done').exists() else 'completed'
+    run.finished_at = timezone.now()
+    run.save(update_fields=['status', 'finished_at', 'updated_at'])
+    return run
@@ -0,0 +1,216 @@
+# dispositivos/loadgen.py
+"""Generador de datos sintéticos a gran escala para pruebas de carga."""
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .caching import invalidate_organization_blocks
+from .models import Alert, Category, Device, Measurement, Organization, Zone
+from .presence import backfill_last_seen
+from .search import index as search_index
+
+# Dominio de correo que identifica a las organizaciones generadas
+EMAIL_DOMAIN = 'load.ecoenergy.test'
+
+CATEGORY_NAMES = ['Solar Panels', 'Wind Turbines', 'Battery Storage', 'Smart Meters', 'HVAC', 'Lighting']
+DEVICE_MODELS = ['SP-300W', 'SP-400W', 'WG-5KW', 'BP-Tesla-100', 'SM-Advanced', 'HV-200', 'LT-50']
+ALERT_MESSAGES = {
+    'high_consumption': 'Consumption above expected profile',
+    'device_offline': 'Device stopped reporting',
+    'zone_limit_exceeded': 'Zone load above max capacity',
+}
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def has_generated():
+    return Organization.all_objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').exists()
+
+
+def clear_generated():
+    """Elimina las organizaciones creadas por el generador (y todo lo que cuelga de ellas)."""
+    organizations = Organization.all_objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+    with transaction.atomic():
+        # Las mediciones primero, con un DELETE directo (como purge.py): la
+        # cascada no tiene que recorrer millones de filas
+        measurements = Measurement.all_objects.filter(organization__in=organizations)
+        deleted = measurements._raw_delete(measurements.db)
+        count, _ = organizations.delete()
+    return deleted + count
+
+
+def _create_catalogue(rng, organizations, zones, devices):
+    """Crea organizaciones, categorías, zonas y dispositivos con bulk_create."""
+    orgs = Organization.objects.bulk_create(
+        Organization(name=f'Load Org {n}', email=f'org{n}@{EMAIL_DOMAIN}')
+        for n in range(1, organizations + 1)
+    )
+
+    catalogue = []
+    for org in orgs:
+        categories = Category.objects.bulk_create(
+            Category(organization=org, name=name, description='Generated category')
+            for name in CATEGORY_NAMES
+        )
+        org_zones = Zone.objects.bulk_create(
+            Zone(
+                organization=org,
+                name=f'Zone {z}',
+                location=f'Site {z // 10}',
+                max_capacity=Decimal(rng.randrange(50, 1000)),
+                description='Generated zone',
+            )
+            for z in range(1, zones + 1)
+        )
+        catalogue.extend(Device.objects.bulk_create(
+            Device(
+                organization=org,
+                name=f'Device {d}',
+                model=rng.choice(DEVICE_MODELS),
+                power_watts=rng.randrange(50, 5000),
+                category=categories[d % len(categories)],
+                zone=org_zones[d % len(org_zones)],
+                status=rng.choice(['active', 'active', 'active', 'inactive', 'maintenance']),
+                consumption=rng.randrange(0, 500),
+            )
+            for d in range(1, devices + 1)
+        ))
+    return orgs, catalogue
+
+
+def _readings(rng, devices, start, days, interval, alert_rate, alerts):
+    """
+    Genera filas de medición en orden cronológico (todas las de un instante
+    antes del siguiente), ya adaptadas para la base de datos. Las alertas se
+    acumulan en ``alerts`` a medida que salen.
+    """
+    steps = int(days * 86400 // interval)
+    profiles = [
+        (device, device.power_watts / 1000 * interval / 3600, rng.uniform(0, 2 * math.pi))
+        for device in devices
+    ]
+    alert_types = list(ALERT_MESSAGES)
+    severities = [choice for choice, _ in Alert.SEVERITY_CHOICES]
+    adapt_datetime = connection.ops.adapt_datetimefield_value
+    created = adapt_datetime(timezone.now())
+
+    for step in range(steps):
+        timestamp = start + timedelta(seconds=step * interval)
+        db_timestamp = adapt_datetime(timestamp)
+        hour_angle = 2 * math.pi * (timestamp.hour * 3600 + timestamp.minute * 60) / 86400
+        for device, base_kwh, phase in profiles:
+            # Perfil diario sinusoidal + ruido, en milésimas de kWh
+            factor = 0.6 + 0.4 * math.sin(hour_angle + phase) + rng.gauss(0, 0.05)
+            milli = max(0, int(base_kwh * factor * 1000))
+            yield (
+                device.organization_id,
+                device.id,
+                Decimal(milli).scaleb(-3),
+                db_timestamp,
+                created,
+                created,
+            )
+            if alert_rate and rng.random() < alert_rate:
+                alert_type = rng.choice(alert_types)
+                alerts.append(Alert(
+                    organization_id=device.organization_id,
+                    device_id=device.id,
+                    alert_type=alert_type,
+                    severity=rng.choice(severities),
+                    message=ALERT_MESSAGES[alert_type],
+                    alert_date=timestamp,
+                ))
+
+
+def _midnight(value):
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return timezone.localtime(value).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _measurement_insert_sql():
+    """
+    INSERT parametrizado sobre la tabla de Measurement.
+
+    Para decenas de millones de filas, construir instancias del modelo y
+    preparar cada valor en bulk_create domina el tiempo total; executemany con
+    una sentencia preparada evita ese costo y mantiene la memoria acotada.
+    """
+    quote = connection.ops.quote_name
+    columns = [
+        Measurement._meta.get_field(name).column
+        for name in ('organization', 'device', 'consumption_kwh', 'timestamp', 'created_at', 'updated_at')
+    ]
+    placeholders = ', '.join(['%s'] * len(columns))
+    return (
+        f'INSERT INTO {quote(Measurement._meta.db_table)} '
+        f'({", ".join(quote(column) for column in columns)}) VALUES ({placeholders})'
+    )
+
+
+def generate(organizations=1, zones=10, devices=100, days=30, interval=900,
+             alert_rate=0.001, seed=42, chunk_size=5000, progress=None, start=None):
+    """
+    Genera un conjunto de datos reproducible.
+
+    Las mediciones se producen de forma perezosa y se insertan en bloques de
+    ``chunk_size`` filas, por lo que la memoria usada no depende del total.
+    ``start`` (fecha o datetime) fija el primer día; por omisión es ``days``
+    días antes de hoy, y entonces dos ejecuciones en días distintos no dan
+    las mismas filas. Devuelve un diccionario con conteos y tiempos.
+    """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    with transaction.atomic():
+        orgs, device_objs = _create_catalogue(rng, organizations, zones, devices)
+
+    # Inicio alineado a medianoche para que el perfil diario sea idéntico entre ejecuciones
+    start = _midnight(start if start is not None else timezone.now() - timedelta(days=days))
+    expected = int(days * 86400 // interval) * len(device_objs)
+    insert_sql = _measurement_insert_sql()
+    alerts = []
+    measurements = 0
+    alert_count = 0
+    for chunk in _chunks(_readings(rng, device_objs, start, days, interval, alert_rate, alerts), chunk_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(insert_sql, chunk)
+            if alerts:
+                Alert.objects.bulk_create(alerts)
+        measurements += len(chunk)
+        alert_count += len(alerts)
+        alerts.clear()
+        if progress:
+            progress(measurements, expected, time.perf_counter() - started)
+
+    # El INSERT directo no pasa por la ingesta ni por las señales: completar
+    # last_seen_at e invalidar cachés e índice de búsqueda aparte
+    for org in orgs:
+        backfill_last_seen(organization=org)
+        search_index.forget_organization(org.id)
+    invalidate_organization_blocks(*(org.id for org in orgs))
+
+    elapsed = time.perf_counter() - started
+    return {
+        'organizations': len(orgs),
+        'devices': len(device_objs),
+        'measurements': measurements,
+        'alerts': alert_count,
+        'elapsed_seconds': round(elapsed, 2),
+        'rows_per_second': round(measurements / elapsed, 1) if elapsed else 0.0,
+    }
@@ -0,0 +1,32 @@
+# dispositivos/management/commands/archive_measurements.py
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from dispositivos.archive import archive_measurements, get_retention_days
+
+
+class Command(BaseCommand):
+    help = 'Move measurements older than the retention window into monthly archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int,
+                            help='Days kept in the main table (default: MEASUREMENT_RETENTION_DAYS)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='List the months that would be archived without moving rows')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='Run VACUUM afterwards to return freed pages to the OS (SQLite)')
+
+    def handle(self, *args, **options):
+        retention_days = get_retention_days(options['retention_days'])
+        results = archive_measurements(retention_days=retention_days, dry_run=options['dry_run'])
+        moved = 0
+        for month, rows, state in results:
+            self.stdout.write(f'{month:%Y-%m}: {rows} measurements ({state})')
+            if state == 'archived':
+                moved += rows
+        if options['vacuum'] and moved and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved} measurements older than {retention_days} days'
+        ))
@@ -0,0 +1,12 @@
+# dispositivos/management/commands/backfill_last_seen.py
+from django.core.management.base import BaseCommand
+
+from dispositivos.presence import backfill_last_seen
+
+
+class Command(BaseCommand):
+    help = 'Recompute Device.last_seen_at/last_reading_kwh from stored measurements'
+
+    def handle(self, *args, **options):
+        updated = backfill_last_seen()
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} devices'))
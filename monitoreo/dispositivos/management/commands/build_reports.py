@@ -0,0 +1,27 @@
+# dispositivos/management/commands/build_reports.py
+from django.core.management.base import BaseCommand
+
+from dispositivos.models import Organization
+from dispositivos.reports import refresh_reports
+
+
+class Command(BaseCommand):
+    help = 'Precompute monthly consumption reports, regenerating only months with new or late data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int,
+                            help='Only this organization id (default: all)')
+        parser.add_argument('--full', action='store_true',
+                            help='Regenerate every month instead of only the changed ones')
+
+    def handle(self, *args, **options):
+        organizations = Organization.objects.order_by('id')
+        if options['organization']:
+            organizations = organizations.filter(id=options['organization'])
+        total = 0
+        for organization in organizations:
+            months = refresh_reports(organization.id, full=options['full'])
+            total += len(months)
+            if months:
+                self.stdout.write(f'{organization.name}: ' + ', '.join(f'{month:%Y-%m}' for month in months))
+        self.stdout.write(self.style.SUCCESS(f'Regenerated {total} monthly reports'))
@@ -0,0 +1,22 @@
+# dispositivos/management/commands/build_rollups.py
+from django.core.management.base import BaseCommand
+
+from dispositivos.rollups import DEFAULT_BATCH_SIZE, rebuild_rollups, update_rollups
+
+
+class Command(BaseCommand):
+    help = 'Update hourly/daily consumption rollups with measurements newer than the stored watermark'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Measurements aggregated per transaction')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Delete all rollups and recompute them from scratch')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            self.stdout.write('Rebuilding rollups from scratch...')
+            processed = rebuild_rollups(batch_size=options['batch_size'])
+        else:
+            processed = update_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} measurements'))
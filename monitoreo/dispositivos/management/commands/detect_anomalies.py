@@ -0,0 +1,27 @@
+# dispositivos/management/commands/detect_anomalies.py
+from django.core.management.base import BaseCommand
+
+from dispositivos.anomalies import DEFAULT_BATCH_SIZE, detect_anomalies, reset_anomaly_state
+
+
+class Command(BaseCommand):
+    help = 'Score measurements newer than the stored watermark against per-device statistics and create anomaly alerts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Measurements scored per transaction')
+        parser.add_argument('--reset', action='store_true',
+                            help='Delete existing anomaly alerts, forget all per-device statistics and rescore every measurement')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Score the next batch and list anomalies without saving anything')
+
+    def handle(self, *args, **options):
+        if options['reset'] and not options['dry_run']:
+            self.stdout.write('Resetting anomaly statistics...')
+            reset_anomaly_state()
+        processed, alerts = detect_anomalies(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        for alert in alerts:
+            self.stdout.write(f'[{alert.severity}] {alert.message}')
+        verb = 'Found' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} measurements. {verb} {len(alerts)} anomaly alerts'))
@@ -0,0 +1,51 @@
+# dispositivos/management/commands/forecast_zones.py
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dispositivos.forecasting import HORIZON_HOURS
+from dispositivos.jobs import run_job
+
+
+class Command(BaseCommand):
+    help = 'Forecast next-day load of every zone against its max capacity, one organization per worker process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Worker processes (default: CPU count)')
+        parser.add_argument('--hours', type=int, default=HORIZON_HOURS,
+                            help='Forecast horizon in hours (default: %(default)s)')
+        parser.add_argument('--refit', action='store_true',
+                            help='Fit from scratch instead of updating the stored parameters')
+        parser.add_argument('--devices', action='store_true',
+                            help='Also refresh the per-device forecast parameters')
+        parser.add_argument('--resume', action='store_true',
+                            help='Resume the last interrupted run with the same options instead of starting over')
+
+    def handle(self, *args, **options):
+        job_options = {name: True for name in ('refit', 'devices') if options[name]}
+        job_options['hours'] = options['hours']
+        run = run_job('forecast_zones', workers=options['workers'], options=job_options,
+                      resume=options['resume'])
+        zones_scored = 0
+        at_risk = 0
+        for shard in run.shards.all():
+            if shard.status != 'done':
+                self.stderr.write(f'{shard.key} FAILED\n{shard.error}')
+                continue
+            zones_scored += len(shard.result)
+            self.stdout.write(f'Organization {shard.spec["organization"]}: '
+                              f'{len(shard.result)} zones in {shard.elapsed_ms:.0f} ms')
+            for zone in shard.result:
+                if zone.get('hours_at_risk'):
+                    at_risk += 1
+                    self.stdout.write(
+                        f'  [{zone["status"]}] {zone["name"]}: peak {zone["peak_kw"]} kW '
+                        f'(upper {zone["peak_upper_kw"]} kW) of {zone["max_capacity_kw"]} kW '
+                        f'at {zone["peak_at"]}'
+                    )
+        if run.status != 'completed':
+            raise CommandError('Some organizations failed; rerun with --resume to retry them')
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {zones_scored} zones; {at_risk} may exceed capacity in the next {options["hours"]} hours'
+        ))
@@ -0,0 +1,61 @@
+# dispositivos/management/commands/generate_load_data.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dispositivos import loadgen
+
+
+class Command(BaseCommand):
+    help = 'Generate a large, reproducible synthetic dataset for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizations', type=int, default=1)
+        parser.add_argument('--zones', type=int, default=10, help='Zones per organization')
+        parser.add_argument('--devices', type=int, default=100, help='Devices per organization')
+        parser.add_argument('--days', type=float, default=30, help='Days of history')
+        parser.add_argument('--interval', type=int, default=900, help='Seconds between readings')
+        parser.add_argument('--alert-rate', type=float, default=0.001,
+                            help='Probability of an alert per reading')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--start', type=date.fromisoformat,
+                            help='First day (YYYY-MM-DD); defaults to --days before today')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk_create')
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete previously generated organizations first')
+
+    def handle(self, *args, **options):
+        if options['interval'] <= 0 or options['chunk_size'] <= 0:
+            raise CommandError('--interval and --chunk-size must be greater than zero')
+
+        if loadgen.has_generated():
+            if not options['clear']:
+                raise CommandError('Generated data already exists; use --clear to replace it')
+            self.stdout.write('Deleting previously generated data...')
+            loadgen.clear_generated()
+
+        report_every = max(1, 200000 // options['chunk_size'])
+        chunks = 0
+
+        def progress(done, expected, elapsed):
+            nonlocal chunks
+            chunks += 1
+            if chunks % report_every == 0 or done == expected:
+                self.stdout.write(f'  {done}/{expected} measurements ({done / elapsed:.0f} rows/s)')
+
+        stats = loadgen.generate(
+            organizations=options['organizations'],
+            zones=options['zones'],
+            devices=options['devices'],
+            days=options['days'],
+            interval=options['interval'],
+            alert_rate=options['alert_rate'],
+            seed=options['seed'],
+            chunk_size=options['chunk_size'],
+            progress=progress,
+            start=options['start'],
+        )
+
+        self.stdout.write(self.style.SUCCESS('\n=== LOAD DATA GENERATED ==='))
+        for key, value in stats.items():
+            self.stdout.write(f'{key}: {value}')
@@ -0,0 +1,28 @@
+# dispositivos/management/commands/pack_measurements.py
+from django.core.management.base import BaseCommand
+
+from dispositivos.columnar import get_pack_after_days, pack_measurements, storage_bytes
+
+
+class Command(BaseCommand):
+    help = 'Pack complete days of measurements into compact per-device binary blocks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--after-days', type=int,
+                            help='Only pack days at least this old (default: READING_BLOCK_AFTER_DAYS)')
+        parser.add_argument('--delete-rows', action='store_true',
+                            help='Delete packed rows from the measurement table')
+
+    def handle(self, *args, **options):
+        stats = pack_measurements(
+            after_days=get_pack_after_days(options['after_days']),
+            delete_rows=options['delete_rows'],
+        )
+        if 'deleted' in stats:
+            self.stdout.write(f'Deleted {stats["deleted"]} packed rows from the measurement table')
+        size, readings = storage_bytes()
+        per_reading = size / readings if readings else 0
+        self.stdout.write(f'Block storage: {size} bytes for {readings} readings ({per_reading:.2f} bytes/reading)')
+        self.stdout.write(self.style.SUCCESS(
+            f'Packed {stats["readings"]} measurements from {stats["days"]} days into {stats["blocks"]} blocks'
+        ))
@@ -0,0 +1,26 @@
+# dispositivos/management/commands/purge_deleted.py
+from django.core.management.base import BaseCommand
+
+from dispositivos.purge import DEFAULT_BATCH_SIZE, get_purge_after, purge_deleted
+
+
+class Command(BaseCommand):
+    help = 'Permanently delete soft-deleted rows older than the configured interval'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help='Minimum age of the soft delete (default: SOFT_DELETE_PURGE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count the rows that would be deleted without deleting them')
+
+    def handle(self, *args, **options):
+        counts = purge_deleted(
+            purge_after=get_purge_after(options['days']),
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        for name, rows in counts.items():
+            self.stdout.write(f'{name}: {rows}')
+        verb = 'Would purge' if options['dry_run'] else 'Purged'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {sum(counts.values())} soft-deleted rows'))
@@ -0,0 +1,59 @@
+# dispositivos/management/commands/run_job.py
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dispositivos.jobs import JOBS, SHARD_MODES, JobError, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run a batch job sharded by organization or device-id range across worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('job', choices=sorted(JOBS))
+        parser.add_argument('--shard-by', choices=SHARD_MODES, default='organization')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Worker processes (default: CPU count)')
+        parser.add_argument('--shards', type=int,
+                            help='Number of device-id ranges (default: 4 per worker)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Resume the last interrupted run with the same options instead of starting over')
+        parser.add_argument('--refit', action='store_true', help='Forecast jobs: fit from scratch')
+        parser.add_argument('--devices', action='store_true', help='forecast_zones: also refresh device forecasts')
+        parser.add_argument('--dry-run', action='store_true', help='sweep_offline: do not create alerts')
+        parser.add_argument('--full', action='store_true', help='monthly_reports: regenerate every month')
+        parser.add_argument('--hours', type=int, help='forecast_zones: forecast horizon in hours')
+
+    def handle(self, *args, **options):
+        allowed = JOBS[options['job']][2]
+        job_options = {name: options[name] for name in allowed if options[name]}
+        try:
+            run = run_job(
+                options['job'],
+                shard_by=options['shard_by'],
+                workers=options['workers'],
+                shards=options['shards'],
+                options=job_options,
+                resume=options['resume'],
+                progress=self._report,
+            )
+        except JobError as exc:
+            raise CommandError(exc)
+
+        shards = list(run.shards.all())
+        done = [shard for shard in shards if shard.status == 'done']
+        total_ms = sum(shard.elapsed_ms or 0 for shard in done)
+        slowest = max(done, key=lambda shard: shard.elapsed_ms, default=None)
+        summary = f'{run.job} #{run.pk}: {len(done)}/{len(shards)} shards, {total_ms:.0f} ms of work'
+        if slowest is not None:
+            summary += f', slowest {slowest.key} ({slowest.elapsed_ms:.0f} ms)'
+        if run.status == 'completed':
+            self.stdout.write(self.style.SUCCESS(summary))
+        else:
+            raise CommandError(f'{summary}; rerun with --resume to retry the failed shards')
+
+    def _report(self, shard):
+        if shard.status == 'done':
+            self.stdout.write(f'{shard.key:<24} {shard.elapsed_ms:>9.0f} ms')
+        else:
+            self.stderr.write(f'{shard.key:<24} FAILED\n{shard.error}')
@@ -6,7 +6,7 @@ from datetime import datetime, timedelta
 import random
 from decimal import Decimal
 
-from dispositivos.models import Organization, Category, Zone, Device, Measurement, Alert
+from dispositivos.models import Organization, Membership, Category, Zone, Device, Measurement, Alert
 
 
 class Command(BaseCommand):
@@ -34,6 +34,9 @@ class Command(BaseCommand):
         )
         self.stdout.write(f'Organization: {org.name}')
         
+        # Vincular el usuario demo a la organización
+        Membership.objects.get_or_create(user=user, defaults={'organization': org})
+        
         # Crear categorías
         categories_data = [
             {'name': 'Solar Panels', 'description': 'Solar energy devices'},
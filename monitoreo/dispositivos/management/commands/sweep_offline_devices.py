@@ -0,0 +1,24 @@
+# dispositivos/management/commands/sweep_offline_devices.py
+from django.core.management.base import BaseCommand
+
+from dispositivos.presence import get_offline_after, sweep_offline_devices
+
+
+class Command(BaseCommand):
+    help = 'Create device_offline alerts for active devices silent longer than the configured interval'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int,
+                            help='Silence threshold (default: DEVICE_OFFLINE_AFTER_MINUTES)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='List offline devices without creating alerts')
+
+    def handle(self, *args, **options):
+        alerts = sweep_offline_devices(
+            offline_after=get_offline_after(options['minutes']),
+            dry_run=options['dry_run'],
+        )
+        for alert in alerts:
+            self.stdout.write(f'[{alert.severity}] {alert.message}')
+        verb = 'Found' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(alerts)} device_offline alerts'))
@@ -0,0 +1,113 @@
+# dispositivos/middleware.py
+"""Resolución de la organización del usuario una sola vez por request."""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import Membership, Organization
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL = 300
+
+# Clave usada para usuarios anónimos (organización por defecto de la demo)
+DEFAULT_KEY = None
+
+
+class LRUCache:
+    """Caché LRU en memoria del proceso, con expiración por tiempo y thread-safe."""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        """Elimina las entradas cuyo valor cumple ``predicate``."""
+        with self._lock:
+            for key in [key for key, (value, _) in self._data.items() if predicate(value)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+organization_cache = LRUCache(
+    maxsize=getattr(settings, 'ORGANIZATION_CACHE_SIZE', DEFAULT_CACHE_SIZE),
+    ttl=getattr(settings, 'ORGANIZATION_CACHE_TTL', DEFAULT_CACHE_TTL),
+)
+
+# Marca para distinguir "sin organización" de "no está en caché"
+_MISSING = object()
+
+
+def resolve_organization(user):
+    """
+    Organización del usuario: la de su membresía. Un usuario autenticado sin
+    membresía no tiene organización (None): nunca ve datos de otra. Sólo el
+    visitante anónimo de la demo recibe la primera organización.
+    """
+    key = user.pk if user is not None and user.is_authenticated else DEFAULT_KEY
+    organization = organization_cache.get(key, _MISSING)
+    if organization is not _MISSING:
+        return organization
+
+    if key is DEFAULT_KEY:
+        organization = Organization.objects.first()
+    else:
+        membership = Membership.objects.select_related('organization').filter(user_id=key).first()
+        organization = membership.organization if membership else None
+
+    organization_cache.set(key, organization)
+    return organization
+
+
+def invalidate_organization(organization_id=None, user_id=None):
+    """Invalida entradas del caché por organización y/o por usuario."""
+    if user_id is not None:
+        organization_cache.delete(user_id)
+    if organization_id is not None:
+        # Entradas de esa organización, y las vacías que ahora podrían resolverse
+        organization_cache.delete_where(lambda org: org is None or org.pk == organization_id)
+    # La organización por defecto puede cambiar cuando se crea o borra cualquiera
+    organization_cache.delete(DEFAULT_KEY)
+
+
+class OrganizationMiddleware:
+    """Expone ``request.organization`` para vistas, formularios y admin."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.organization = resolve_organization(getattr(request, 'user', None))
+        return self.get_response(request)
@@ -0,0 +1,87 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispositivos', '0004_passwordresettoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Watermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='alert',
+            name='severity',
+            field=models.CharField(choices=[('grave', 'Grave'), ('alta', 'Alta'), ('media', 'Media')], max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='zone',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterUniqueTogether(
+            name='category',
+            unique_together={('name', 'organization')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='zone',
+            unique_together={('name', 'organization')},
+        ),
+        migrations.CreateModel(
+            name='DeviceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('total_kwh', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('min_kwh', models.DecimalField(decimal_places=3, max_digits=10)),
+                ('max_kwh', models.DecimalField(decimal_places=3, max_digits=10)),
+                ('reading_count', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='dispositivos.device')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='device_rollups', to='dispositivos.organization')),
+            ],
+            options={
+                'ordering': ['-bucket_start'],
+                'unique_together': {('device', 'period', 'bucket_start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ZoneRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('total_kwh', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('min_kwh', models.DecimalField(decimal_places=3, max_digits=10)),
+                ('max_kwh', models.DecimalField(decimal_places=3, max_digits=10)),
+                ('reading_count', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='zone_rollups', to='dispositivos.organization')),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='dispositivos.zone')),
+            ],
+            options={
+                'ordering': ['-bucket_start'],
+                'unique_together': {('zone', 'period', 'bucket_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispositivos', '0005_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['organization', 'severity', 'alert_date'], name='alert_org_sev_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['organization', '-alert_date'], name='alert_org_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['device', '-alert_date'], name='alert_device_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['organization', '-timestamp'], name='measurement_org_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['device', '-timestamp'], name='measurement_device_ts_idx'),
+        ),
+    ]
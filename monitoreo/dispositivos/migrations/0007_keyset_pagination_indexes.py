@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispositivos', '0006_measurement_alert_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='measurement',
+            name='measurement_org_ts_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='measurement',
+            name='measurement_device_ts_idx',
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['organization', 'name'], name='device_org_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['organization', '-timestamp', '-id'], name='measurement_org_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['device', '-timestamp', '-id'], name='measurement_device_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:36
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_last_seen(apps, schema_editor):
+    Device = apps.get_model('dispositivos', 'Device')
+    Measurement = apps.get_model('dispositivos', 'Measurement')
+    latest = Measurement.objects.filter(device=OuterRef('pk')).order_by('-timestamp', '-id')
+    Device.objects.update(
+        last_seen_at=Subquery(latest.values('timestamp')[:1]),
+        last_reading_kwh=Subquery(latest.values('consumption_kwh')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispositivos', '0008_membership'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='last_reading_kwh',
+            field=models.DecimalField(blank=True, decimal_places=3, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['status', 'last_seen_at'], name='device_status_seen_idx'),
+        ),
+        migrations.RunPython(backfill_last_seen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispositivos', '0010_measurement_archive'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='alert',
+            name='alert_org_sev_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='alert',
+            name='alert_org_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='alert',
+            name='alert_device_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='device',
+            name='device_org_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='device',
+            name='device_status_seen_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='measurement',
+            name='measurement_org_ts_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='measurement',
+            name='measurement_device_ts_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='category',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='device',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='zone',
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['organization', 'severity', 'alert_date'], name='alert_org_sev_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['organization', '-alert_date'], name='alert_org_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['device', '-alert_date'], name='alert_device_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['organization', 'name'], name='category_live_org_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['organization', 'name'], name='device_org_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['status', 'last_seen_at'], name='device_status_seen_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['organization', '-timestamp', '-id'], name='measurement_org_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['device', '-timestamp', '-id'], name='measurement_device_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='zone',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['organization', 'name'], name='zone_live_org_name_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='category',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('name', 'organization'), name='category_live_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='device',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('name', 'zone'), name='device_live_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='zone',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('name', 'organization'), name='zone_live_name_uniq'),
+        ),
+    ]
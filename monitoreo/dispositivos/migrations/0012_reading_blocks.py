@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispositivos', '0011_soft_delete_live_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('encoding', models.PositiveSmallIntegerField(default=1)),
+                ('reading_count', models.PositiveIntegerField()),
+                ('base_ms', models.BigIntegerField(help_text='Epoch milliseconds of the first reading')),
+                ('timestamps', models.BinaryField(help_text='Millisecond deltas between readings')),
+                ('values', models.BinaryField(help_text='Readings in Wh (kWh with 3 fixed decimals)')),
+                ('total_kwh', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('last_measurement_id', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reading_blocks', to='dispositivos.device')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reading_blocks', to='dispositivos.organization')),
+            ],
+            options={
+                'ordering': ['day'],
+                'unique_together': {('device', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispositivos', '0012_reading_blocks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForecastState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fitted_until', models.DateTimeField(help_text='First hour not yet included in the fit')),
+                ('seasonality', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly')], default='daily', max_length=6)),
+                ('alpha', models.FloatField()),
+                ('level', models.FloatField(blank=True, help_text='Smoothed deseasonalized load in kW', null=True)),
+                ('variance', models.FloatField(default=0)),
+                ('profile_sum', models.JSONField(default=list)),
+                ('profile_count', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('device', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='forecast_states', to='dispositivos.device')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecast_states', to='dispositivos.organization')),
+                ('zone', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='forecast_states', to='dispositivos.zone')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('device__isnull', False)), fields=('device',), name='forecast_device_uniq'), models.UniqueConstraint(condition=models.Q(('zone__isnull', False)), fields=('zone',), name='forecast_zone_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispositivos', '0014_job_runs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alert',
+            name='alert_type',
+            field=models.CharField(choices=[('high_consumption', 'High Consumption'), ('device_offline', 'Device Offline'), ('zone_limit_exceeded', 'Zone Limit Exceeded'), ('anomaly', 'Anomaly')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='AnomalyState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('readings', models.PositiveIntegerField(default=0)),
+                ('mean', models.FloatField(default=0)),
+                ('variance', models.FloatField(default=0)),
+                ('baseline', models.FloatField(default=0)),
+                ('baseline_variance', models.FloatField(default=0)),
+                ('last_value', models.DecimalField(blank=True, decimal_places=3, max_digits=10, null=True)),
+                ('repeats', models.PositiveIntegerField(default=0, help_text='Consecutive identical readings')),
+                ('last_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('last_alert_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('device', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='anomaly_state', to='dispositivos.device')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomaly_states', to='dispositivos.organization')),
+            ],
+        ),
+    ]
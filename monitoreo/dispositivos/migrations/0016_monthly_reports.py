@@ -0,0 +1,52 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispositivos', '0015_anomaly_detection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('total_kwh', models.DecimalField(decimal_places=3, default=0, max_digits=16)),
+                ('reading_count', models.PositiveBigIntegerField(default=0)),
+                ('device_count', models.PositiveIntegerField(default=0)),
+                ('alert_count', models.PositiveIntegerField(default=0)),
+                ('zones', models.JSONField(default=list)),
+                ('categories', models.JSONField(default=list)),
+                ('top_devices', models.JSONField(default=list)),
+                ('alerts_by_type', models.JSONField(default=dict)),
+                ('source_until', models.DateTimeField(help_text='Rollups and alerts changed up to this instant are included')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['organization', 'updated_at'], name='alert_org_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='devicerollup',
+            index=models.Index(fields=['organization', 'period', 'updated_at'], name='device_rollup_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='monthlyreport',
+            name='organization',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_reports', to='dispositivos.organization'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlyreport',
+            unique_together={('organization', 'month')},
+        ),
+    ]
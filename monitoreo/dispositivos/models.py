@@ -1,8 +1,31 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from django.utils import timezone
 from django.contrib.auth.models import User
 import uuid
 
+# Filas vivas (sin borrado lógico); condición de los índices parciales
+LIVE = Q(deleted_at__isnull=True)
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    def soft_delete(self):
+        """Marca las filas como borradas con un solo UPDATE."""
+        now = timezone.now()
+        return self.update(deleted_at=now, updated_at=now)
+
+
+class LiveManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    """Manager por defecto: excluye las filas con ``deleted_at``."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(LIVE)
+
+
+# Los modelos con borrado lógico exponen ``objects`` (sólo filas vivas) y
+# ``all_objects`` (todas, para purgas y auditoría). Los accesos por clave
+# foránea (``device.zone``) usan el manager base y siguen resolviendo filas
+# borradas.
 # Organization model - required by evaluation
 class Organization(models.Model):
     name = models.CharField(max_length=200)
@@ -11,9 +34,22 @@ class Organization(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
     
+    objects = LiveManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+    
     def __str__(self):
         return self.name
 
+# Vínculo usuario -> organización (un usuario pertenece a una organización)
+class Membership(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='membership')
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='memberships')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username} @ {self.organization.name}"
+
 class Category(models.Model):
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='categories')
     name = models.CharField(max_length=100)
@@ -22,12 +58,22 @@ class Category(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
     
+    objects = LiveManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+    
     def __str__(self):
         return self.name
     
     class Meta:
         verbose_name_plural = "Categories"
-        unique_together = ['name', 'organization']
+        # El nombre sólo se reserva entre filas vivas
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'organization'], condition=LIVE,
+                                    name='category_live_name_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['organization', 'name'], condition=LIVE, name='category_live_org_name_idx'),
+        ]
 
 
 class Zone(models.Model):
@@ -40,11 +86,20 @@ class Zone(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
     
+    objects = LiveManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.name} - {self.location}"
     
     class Meta:
-        unique_together = ['name', 'organization']
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'organization'], condition=LIVE,
+                                    name='zone_live_name_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['organization', 'name'], condition=LIVE, name='zone_live_org_name_idx'),
+        ]
 
 class Device(models.Model):
     STATUS_CHOICES = [
@@ -61,15 +116,38 @@ class Device(models.Model):
     zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='devices')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     consumption = models.IntegerField(help_text="Current consumption in watts")
+    # Última lectura recibida (desnormalizada en la ingesta, ver presence.py)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    last_reading_kwh = models.DecimalField(max_digits=10, decimal_places=3, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
     
+    objects = LiveManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.name} ({self.model}) - {self.zone.name}"
     
+    def soft_delete(self):
+        """Borrado lógico del dispositivo junto con sus mediciones y alertas."""
+        now = timezone.now()
+        with transaction.atomic():
+            self.measurements.update(deleted_at=now, updated_at=now)
+            self.alerts.update(deleted_at=now, updated_at=now)
+            self.deleted_at = now
+            self.save(update_fields=['deleted_at', 'updated_at'])
+    
     class Meta:
-        unique_together = ['name', 'zone']
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'zone'], condition=LIVE, name='device_live_name_uniq'),
+        ]
+        # Listado paginado por (name, id) dentro de la organización; los
+        # índices cubren sólo filas vivas, que es lo que consulta el manager
+        indexes = [
+            models.Index(fields=['organization', 'name'], condition=LIVE, name='device_org_name_idx'),
+            models.Index(fields=['status', 'last_seen_at'], condition=LIVE, name='device_status_seen_idx'),
+        ]
 
 class Measurement(models.Model):
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='measurements')
@@ -80,18 +158,28 @@ class Measurement(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
     
+    objects = LiveManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.device.name} - {self.consumption_kwh} kWh"
     
     class Meta:
         verbose_name_plural = "Measurements"
         ordering = ['-timestamp']
+        # Listados por organización o dispositivo, siempre por fecha descendente;
+        # el id desempata el orden para la paginación por cursor
+        indexes = [
+            models.Index(fields=['organization', '-timestamp', '-id'], condition=LIVE, name='measurement_org_ts_idx'),
+            models.Index(fields=['device', '-timestamp', '-id'], condition=LIVE, name='measurement_device_ts_idx'),
+        ]
 
 class Alert(models.Model):
     TYPE_CHOICES = [
         ('high_consumption', 'High Consumption'),
         ('device_offline', 'Device Offline'),
         ('zone_limit_exceeded', 'Zone Limit Exceeded'),
+        ('anomaly', 'Anomaly'),
     ]
     
     SEVERITY_CHOICES = [
@@ -118,11 +206,23 @@ class Alert(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
     
+    objects = LiveManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+    
     def __str__(self):
         return f"Alert {self.severity} - {self.device.name}"
     
     class Meta:
         ordering = ['-alert_date']
+        # Resúmenes semanales por organización/severidad y alertas por dispositivo
+        indexes = [
+            models.Index(fields=['organization', 'severity', 'alert_date'], condition=LIVE,
+                         name='alert_org_sev_date_idx'),
+            models.Index(fields=['organization', '-alert_date'], condition=LIVE, name='alert_org_date_idx'),
+            models.Index(fields=['device', '-alert_date'], condition=LIVE, name='alert_device_date_idx'),
+            # Alertas cambiadas desde el último cálculo de informes (reports.py)
+            models.Index(fields=['organization', 'updated_at'], name='alert_org_updated_idx'),
+        ]
 
 class PasswordResetToken(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -139,4 +239,238 @@ class PasswordResetToken(models.Model):
         return f"Code {self.code} for {self.user.email} - {'Used' if self.used else 'Active'}"
     
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+# Agregados de consumo por intervalo (hora/día) calculados desde Measurement
+class DeviceRollup(models.Model):
+    PERIOD_CHOICES = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ]
+
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='device_rollups')
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='rollups')
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket_start = models.DateTimeField()
+    total_kwh = models.DecimalField(max_digits=14, decimal_places=3)
+    min_kwh = models.DecimalField(max_digits=10, decimal_places=3)
+    max_kwh = models.DecimalField(max_digits=10, decimal_places=3)
+    reading_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.device_id} {self.period} {self.bucket_start:%Y-%m-%d %H:%M} - {self.total_kwh} kWh"
+
+    class Meta:
+        ordering = ['-bucket_start']
+        unique_together = ['device', 'period', 'bucket_start']
+        # Agregados cambiados desde el último cálculo de informes (reports.py)
+        indexes = [
+            models.Index(fields=['organization', 'period', 'updated_at'], name='device_rollup_updated_idx'),
+        ]
+
+
+class ZoneRollup(models.Model):
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='zone_rollups')
+    zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='rollups')
+    period = models.CharField(max_length=4, choices=DeviceRollup.PERIOD_CHOICES)
+    bucket_start = models.DateTimeField()
+    total_kwh = models.DecimalField(max_digits=14, decimal_places=3)
+    min_kwh = models.DecimalField(max_digits=10, decimal_places=3)
+    max_kwh = models.DecimalField(max_digits=10, decimal_places=3)
+    reading_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.zone_id} {self.period} {self.bucket_start:%Y-%m-%d %H:%M} - {self.total_kwh} kWh"
+
+    class Meta:
+        ordering = ['-bucket_start']
+        unique_together = ['zone', 'period', 'bucket_start']
+
+
+# Mes de mediciones movido a su propia tabla de archivo (ver archive.py)
+class MeasurementArchive(models.Model):
+    month = models.DateField(unique=True, help_text="First day of the archived month")
+    table_name = models.CharField(max_length=63)
+    row_count = models.PositiveIntegerField(default=0)
+    first_timestamp = models.DateTimeField(null=True, blank=True)
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.table_name} ({self.row_count} rows)"
+
+    class Meta:
+        ordering = ['month']
+
+
+# Lecturas de un dispositivo en un día, empaquetadas en binario (ver columnar.py)
+class ReadingBlock(models.Model):
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='reading_blocks')
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='reading_blocks')
+    day = models.DateField()
+    encoding = models.PositiveSmallIntegerField(default=1)
+    reading_count = models.PositiveIntegerField()
+    base_ms = models.BigIntegerField(help_text="Epoch milliseconds of the first reading")
+    timestamps = models.BinaryField(help_text="Millisecond deltas between readings")
+    values = models.BinaryField(help_text="Readings in Wh (kWh with 3 fixed decimals)")
+    total_kwh = models.DecimalField(max_digits=14, decimal_places=3)
+    # Mayor id de Measurement incluido; las lecturas con id menor no se vuelven a sumar
+    last_measurement_id = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.device_id} {self.day} ({self.reading_count} readings)"
+
+    class Meta:
+        ordering = ['day']
+        unique_together = ['device', 'day']
+
+
+# Parámetros ajustados del pronóstico de consumo de un dispositivo o zona (ver forecasting.py)
+class ForecastState(models.Model):
+    SEASONALITY_CHOICES = [
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+    ]
+
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='forecast_states')
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, null=True, blank=True, related_name='forecast_states')
+    zone = models.ForeignKey(Zone, on_delete=models.CASCADE, null=True, blank=True, related_name='forecast_states')
+    fitted_until = models.DateTimeField(help_text="First hour not yet included in the fit")
+    seasonality = models.CharField(max_length=6, choices=SEASONALITY_CHOICES, default='daily')
+    alpha = models.FloatField()
+    level = models.FloatField(null=True, blank=True, help_text="Smoothed deseasonalized load in kW")
+    variance = models.FloatField(default=0)
+    # Suma y cantidad de kWh por hora de la semana (168 posiciones, lunes 00:00 primero)
+    profile_sum = models.JSONField(default=list)
+    profile_count = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        owner = f"device {self.device_id}" if self.device_id else f"zone {self.zone_id}"
+        return f"Forecast {owner} @ {self.fitted_until:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['device'], condition=Q(device__isnull=False),
+                                    name='forecast_device_uniq'),
+            models.UniqueConstraint(fields=['zone'], condition=Q(zone__isnull=False),
+                                    name='forecast_zone_uniq'),
+        ]
+
+
+# Estadísticas en línea de las lecturas de un dispositivo (ver anomalies.py)
+class AnomalyState(models.Model):
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='anomaly_states')
+    device = models.OneToOneField(Device, on_delete=models.CASCADE, related_name='anomaly_state')
+    readings = models.PositiveIntegerField(default=0)
+    mean = models.FloatField(default=0)
+    variance = models.FloatField(default=0)
+    # Media y varianza lentas: la distancia de ``mean`` a ``baseline`` mide la deriva
+    baseline = models.FloatField(default=0)
+    baseline_variance = models.FloatField(default=0)
+    last_value = models.DecimalField(max_digits=10, decimal_places=3, null=True, blank=True)
+    repeats = models.PositiveIntegerField(default=0, help_text="Consecutive identical readings")
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    last_alert_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Anomaly state {self.device_id} ({self.readings} readings)"
+
+
+# Resumen mensual precalculado de una organización (ver reports.py)
+class MonthlyReport(models.Model):
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='monthly_reports')
+    month = models.DateField(help_text="First day of the month")
+    total_kwh = models.DecimalField(max_digits=16, decimal_places=3, default=0)
+    reading_count = models.PositiveBigIntegerField(default=0)
+    device_count = models.PositiveIntegerField(default=0)
+    alert_count = models.PositiveIntegerField(default=0)
+    # [{'id', 'name', 'kwh', 'share'}] ordenados por consumo
+    zones = models.JSONField(default=list)
+    categories = models.JSONField(default=list)
+    top_devices = models.JSONField(default=list)
+    alerts_by_type = models.JSONField(default=dict)
+    source_until = models.DateTimeField(help_text="Rollups and alerts changed up to this instant are included")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.organization_id} {self.month:%Y-%m} - {self.total_kwh} kWh"
+
+    class Meta:
+        ordering = ['-month']
+        unique_together = ['organization', 'month']
+
+
+# Ejecución de un trabajo por lotes repartido en fragmentos (ver jobs.py)
+class JobRun(models.Model):
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    job = models.CharField(max_length=50)
+    shard_by = models.CharField(max_length=20)
+    options = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    workers = models.PositiveSmallIntegerField(default=1)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.job} #{self.pk} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['job', '-created_at'], name='jobrun_job_created_idx'),
+        ]
+
+
+# Fragmento de una ejecución; se guarda al terminar, así una ejecución interrumpida se retoma
+class JobShard(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    run = models.ForeignKey(JobRun, on_delete=models.CASCADE, related_name='shards')
+    key = models.CharField(max_length=50)
+    spec = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    elapsed_ms = models.FloatField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.run_id}:{self.key} ({self.status})"
+
+    class Meta:
+        ordering = ['id']
+        unique_together = ['run', 'key']
+
+
+# Última medición procesada por un proceso incremental
+class Watermark(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
@@ -0,0 +1,116 @@
+# dispositivos/pagination.py
+"""Paginación por cursor (keyset) para listados grandes."""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Órdenes estables usados por los listados; el último campo siempre es único
+MEASUREMENT_ORDERING = ('-timestamp', '-id')
+DEVICE_ORDERING = ('name', 'id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, page_size):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.page_size = page_size
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def get_page_size(value, default=DEFAULT_PAGE_SIZE):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, count):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Malformed cursor')
+    if not isinstance(values, list) or len(values) != count:
+        raise InvalidCursor('Malformed cursor')
+    return values
+
+
+def _field_name(ordering_item):
+    return ordering_item.lstrip('-')
+
+
+def _after(model, ordering, values):
+    """
+    Condición "fila posterior al cursor" para un orden compuesto:
+    (a > x) OR (a = x AND b > y) OR ...
+    """
+    condition = Q()
+    equal = {}
+    for item, value in zip(ordering, values):
+        name = _field_name(item)
+        value = model._meta.get_field(name).to_python(value)
+        lookup = 'lt' if item.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+
+    # Cota redundante sobre el primer campo: permite que el motor use el
+    # índice como rango en vez de recorrerlo desde el inicio filtrando el OR
+    first = ordering[0]
+    first_name = _field_name(first)
+    bound = 'lte' if first.startswith('-') else 'gte'
+    return Q(**{f'{first_name}__{bound}': equal[first_name]}) & condition
+
+
+def _serialize(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def keyset_paginate(queryset, ordering, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Devuelve una página de ``queryset`` ordenada por ``ordering`` empezando
+    después de ``cursor``. A diferencia de OFFSET, el costo de una página
+    profunda es el mismo que el de la primera: la base de datos salta
+    directamente a la posición del cursor usando el índice.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(cursor, len(ordering))
+        try:
+            queryset = queryset.filter(_after(queryset.model, ordering, values))
+        except (ValidationError, TypeError) as exc:
+            raise InvalidCursor('Malformed cursor') from exc
+
+    # Se pide una fila extra para saber si existe una página siguiente
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor([_serialize(getattr(last, _field_name(item))) for item in ordering])
+    return KeysetPage(items, next_cursor, page_size)
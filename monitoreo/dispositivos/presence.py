@@ -0,0 +1,137 @@
+# dispositivos/presence.py
+"""
+Última lectura por dispositivo y detección de equipos sin reportar.
+
+``Device.last_seen_at``/``last_reading_kwh`` se mantienen desnormalizados al
+ingerir, así que detectar un equipo desconectado es un filtro sobre la tabla
+de dispositivos y no un ``MAX(timestamp)`` sobre las mediciones de cada uno.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery
+from django.utils import timezone
+
+from .caching import invalidate_organization_blocks
+from .events import publish_alerts
+from .models import Alert, Device, Measurement
+
+DEFAULT_OFFLINE_MINUTES = 30
+
+# Múltiplos del umbral de silencio a partir de los cuales sube la severidad
+OFFLINE_SEVERITY = (
+    (4, 'grave'),
+    (2, 'alta'),
+    (1, 'media'),
+)
+
+
+def get_offline_after(minutes=None):
+    if minutes is None:
+        minutes = getattr(settings, 'DEVICE_OFFLINE_AFTER_MINUTES', DEFAULT_OFFLINE_MINUTES)
+    return timedelta(minutes=minutes)
+
+
+def touch_last_seen(measurements):
+    """
+    Avanza last_seen_at/last_reading_kwh con las lecturas de un lote. Las
+    lecturas atrasadas no retroceden la marca. Los dispositivos que vuelven a
+    reportar resuelven su alerta ``device_offline`` activa.
+    """
+    latest = {}
+    for measurement in measurements:
+        current = latest.get(measurement.device_id)
+        if current is None or measurement.timestamp >= current.timestamp:
+            latest[measurement.device_id] = measurement
+    if not latest:
+        return 0
+
+    changed = []
+    for device in Device.objects.filter(id__in=latest).only('id', 'last_seen_at', 'last_reading_kwh'):
+        reading = latest[device.id]
+        if device.last_seen_at is None or reading.timestamp >= device.last_seen_at:
+            device.last_seen_at = reading.timestamp
+            device.last_reading_kwh = reading.consumption_kwh
+            changed.append(device)
+    # bulk_update no toca updated_at ni emite señales
+    Device.objects.bulk_update(changed, ['last_seen_at', 'last_reading_kwh'], batch_size=500)
+    if changed:
+        Alert.objects.filter(
+            device_id__in=[device.id for device in changed],
+            alert_type='device_offline',
+            status='active',
+        ).update(status='resolved', updated_at=timezone.now())
+    return len(changed)
+
+
+def backfill_last_seen(organization=None):
+    """Recalcula la última lectura de cada dispositivo con un único UPDATE."""
+    latest = Measurement.objects.filter(device=OuterRef('pk')).order_by('-timestamp', '-id')
+    devices = Device.objects.all()
+    if organization is not None:
+        devices = devices.filter(organization=organization)
+    return devices.update(
+        last_seen_at=Subquery(latest.values('timestamp')[:1]),
+        last_reading_kwh=Subquery(latest.values('consumption_kwh')[:1]),
+    )
+
+
+def offline_severity(silence, offline_after):
+    ratio = silence / offline_after
+    for multiple, severity in OFFLINE_SEVERITY:
+        if ratio >= multiple:
+            return severity
+    return 'media'
+
+
+def offline_devices(offline_after=None, now=None, organization=None):
+    """
+    Dispositivos activos sin lecturas desde hace más de ``offline_after`` que
+    todavía no tienen una alerta ``device_offline`` activa posterior a su
+    última lectura.
+    """
+    offline_after = offline_after or get_offline_after()
+    now = now or timezone.now()
+    already_flagged = Alert.objects.filter(
+        device=OuterRef('pk'),
+        alert_type='device_offline',
+        status='active',
+        alert_date__gte=OuterRef('last_seen_at'),
+    )
+    devices = Device.objects.filter(
+        status='active',
+        last_seen_at__lt=now - offline_after,
+    ).exclude(Exists(already_flagged))
+    if organization is not None:
+        devices = devices.filter(organization=organization)
+    return devices
+
+
+def sweep_offline_devices(offline_after=None, now=None, organization=None, dry_run=False):
+    """
+    Crea una alerta ``device_offline`` por cada dispositivo silencioso: una
+    consulta para encontrarlos y un bulk_create para las alertas.
+    """
+    offline_after = offline_after or get_offline_after()
+    now = now or timezone.now()
+    rows = offline_devices(offline_after, now, organization).values_list(
+        'id', 'organization_id', 'name', 'last_seen_at')
+    alerts = [
+        Alert(
+            organization_id=organization_id,
+            device_id=device_id,
+            alert_type='device_offline',
+            severity=offline_severity(now - last_seen_at, offline_after),
+            message=f'{name} has not reported since {timezone.localtime(last_seen_at):%Y-%m-%d %H:%M}',
+            alert_date=now,
+        )
+        for device_id, organization_id, name, last_seen_at in rows
+    ]
+    if alerts and not dry_run:
+        with transaction.atomic():
+            Alert.objects.bulk_create(alerts, batch_size=500)
+            touched = {alert.organization_id for alert in alerts}
+            transaction.on_commit(lambda: invalidate_organization_blocks(*touched))
+            transaction.on_commit(lambda: publish_alerts(alerts))
+    return alerts
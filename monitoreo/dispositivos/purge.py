@@ -0,0 +1,82 @@
+# dispositivos/purge.py
+"""
+Borrado definitivo de filas con borrado lógico (``deleted_at``) antiguas.
+
+Las mediciones y alertas, que no tienen dependientes, se eliminan por lotes
+de ids con un DELETE directo (sin cargar instancias). El resto se borra con
+``QuerySet.delete()`` para que las cascadas y señales (zoneload, reglas)
+sigan funcionando. Se procesa de hijos a padres, así un dispositivo purgado
+ya no arrastra sus mediciones a la colección de la cascada.
+
+Al purgar dispositivos u organizaciones se borran también sus filas en las
+tablas de archivo mensuales (archive.py), que no tienen clave foránea; los
+``ReadingBlock`` y agregados caen con la cascada.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .archive import delete_archived
+from .caching import invalidate_organization_blocks
+from .models import Alert, Category, Device, Measurement, Organization, Zone
+
+DEFAULT_PURGE_AFTER_DAYS = 30
+DEFAULT_BATCH_SIZE = 5000
+
+# (modelo, borrado directo)
+PURGE_ORDER = (
+    (Measurement, True),
+    (Alert, True),
+    (Device, False),
+    (Zone, False),
+    (Category, False),
+    (Organization, False),
+)
+
+
+def get_purge_after(days=None):
+    if days is None:
+        days = getattr(settings, 'SOFT_DELETE_PURGE_AFTER_DAYS', DEFAULT_PURGE_AFTER_DAYS)
+    return timedelta(days=days)
+
+
+def _organization_field(model):
+    return 'id' if model is Organization else 'organization_id'
+
+
+def purge_deleted(purge_after=None, now=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """
+    Elimina las filas borradas lógicamente hace más de ``purge_after``.
+    Devuelve {nombre del modelo: filas} (las que se borrarían con ``dry_run``).
+    """
+    cutoff = (now or timezone.now()) - (purge_after or get_purge_after())
+    counts = {}
+    for model, raw in PURGE_ORDER:
+        expired = model.all_objects.filter(deleted_at__lt=cutoff)
+        if dry_run:
+            counts[model.__name__] = expired.count()
+            continue
+        counts[model.__name__] = _purge_model(expired, model, raw, batch_size)
+    return counts
+
+
+def _purge_model(expired, model, raw, batch_size):
+    field = _organization_field(model)
+    purged = 0
+    while True:
+        batch = list(expired.order_by('pk').values_list('pk', field)[:batch_size])
+        if not batch:
+            return purged
+        rows = model.all_objects.filter(pk__in=[pk for pk, _ in batch])
+        organizations = {organization_id for _, organization_id in batch}
+        with transaction.atomic():
+            if model in (Device, Organization):
+                delete_archived(**{f'{model._meta.model_name}_id__in': [pk for pk, _ in batch]})
+            if raw:
+                rows._raw_delete(rows.db)
+            else:
+                rows.delete()
+            transaction.on_commit(lambda: invalidate_organization_blocks(*organizations))
+        purged += len(batch)
@@ -0,0 +1,194 @@
+# dispositivos/reports.py
+"""
+Informes mensuales de consumo por organización.
+
+Calcular un mes en vivo desde ``Measurement`` y ``Alert`` es lento, así que
+cada mes queda resumido en un ``MonthlyReport``: totales por zona y por
+categoría, los dispositivos de mayor consumo y las alertas por tipo. Los
+totales salen de los agregados diarios (``DeviceRollup``), que ya incluyen
+los meses archivados o empaquetados.
+
+``refresh_reports`` sólo recalcula los meses tocados desde el último
+cálculo: los que tienen agregados diarios o alertas con ``updated_at``
+posterior a ``source_until``. Una lectura atrasada que entra en un mes
+viejo actualiza su agregado diario y con eso marca el mes.
+
+Los informes son un registro histórico: incluyen las alertas con borrado
+lógico y cada dispositivo se cuenta en su zona y categoría al momento del
+cálculo. El borrado lógico de un dispositivo quita sus agregados
+(``rollups.forget_device``): un mes ya guardado lo conserva, pero deja de
+incluirlo si se vuelve a calcular. ``render_csv`` y la plantilla HTML sólo leen el
+registro guardado.
+"""
+import csv
+import io
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .archive import month_start, next_month
+from .models import Alert, Device, DeviceRollup, MonthlyReport
+
+DEFAULT_TOP_DEVICES = 10
+# Margen para no perder filas confirmadas por transacciones que empezaron
+# antes del cálculo anterior
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+ALERT_TYPE_LABELS = dict(Alert.TYPE_CHOICES)
+
+
+def get_top_devices(value=None):
+    if value is None:
+        value = getattr(settings, 'REPORT_TOP_DEVICES', DEFAULT_TOP_DEVICES)
+    return value
+
+
+# -- Cálculo -------------------------------------------------------------------
+
+def dirty_months(organization_id, since=None):
+    """Meses (fecha del día 1) con agregados diarios o alertas cambiados desde ``since``."""
+    rollups = DeviceRollup.objects.filter(organization_id=organization_id, period='day')
+    alerts = Alert.all_objects.filter(organization_id=organization_id)
+    if since is not None:
+        rollups = rollups.filter(updated_at__gte=since - REFRESH_OVERLAP)
+        alerts = alerts.filter(updated_at__gte=since - REFRESH_OVERLAP)
+    months = set()
+    for queryset, field in ((rollups, 'bucket_start'), (alerts, 'alert_date')):
+        months.update(
+            timezone.localtime(month).date()
+            for month in queryset.annotate(month=TruncMonth(field)).order_by()
+            .values_list('month', flat=True).distinct()
+        )
+    return sorted(months)
+
+
+def _ranked(totals, names, grand_total, limit=None):
+    rows = sorted(totals.items(), key=lambda item: (-item[1], item[0] or 0))[:limit]
+    return [
+        {
+            'id': key,
+            'name': names.get(key, ''),
+            'kwh': float(kwh),
+            'share': round(float(kwh / grand_total * 100), 1) if grand_total else 0.0,
+        }
+        for key, kwh in rows
+    ]
+
+
+def summarize_month(organization_id, month, top_devices=None):
+    """Valores de ``MonthlyReport`` para un mes, con tres consultas."""
+    start = month_start(month)
+    end = next_month(start)
+
+    per_device = {
+        row['device_id']: row
+        for row in DeviceRollup.objects.filter(
+            organization_id=organization_id, period='day', bucket_start__gte=start, bucket_start__lt=end,
+        ).values('device_id').annotate(kwh=Sum('total_kwh'), readings=Sum('reading_count')).order_by()
+    }
+    devices = {
+        device_id: (name, zone_id, zone_name, category_id, category_name)
+        for device_id, name, zone_id, zone_name, category_id, category_name in Device.all_objects.filter(
+            id__in=per_device,
+        ).values_list('id', 'name', 'zone_id', 'zone__name', 'category_id', 'category__name')
+    }
+
+    total = Decimal(0)
+    readings = 0
+    device_kwh = {}
+    zone_kwh, category_kwh = defaultdict(Decimal), defaultdict(Decimal)
+    zone_names, category_names, device_names = {}, {}, {}
+    for device_id, row in per_device.items():
+        name, zone_id, zone_name, category_id, category_name = devices.get(device_id, ('', None, '', None, ''))
+        total += row['kwh']
+        readings += row['readings']
+        device_kwh[device_id] = row['kwh']
+        device_names[device_id] = name
+        zone_kwh[zone_id] += row['kwh']
+        zone_names[zone_id] = zone_name or ''
+        category_kwh[category_id] += row['kwh']
+        category_names[category_id] = category_name or ''
+
+    top = _ranked(device_kwh, device_names, total, get_top_devices(top_devices))
+    for entry in top:
+        _, _, zone_name, _, category_name = devices.get(entry['id'], ('', None, '', None, ''))
+        entry.update(zone=zone_name or '', category=category_name or '')
+
+    alerts = {
+        row['alert_type']: row['count']
+        for row in Alert.all_objects.filter(
+            organization_id=organization_id, alert_date__gte=start, alert_date__lt=end,
+        ).values('alert_type').annotate(count=Count('id')).order_by('alert_type')
+    }
+    return {
+        'total_kwh': total,
+        'reading_count': readings,
+        'device_count': len(per_device),
+        'alert_count': sum(alerts.values()),
+        'zones': _ranked(zone_kwh, zone_names, total),
+        'categories': _ranked(category_kwh, category_names, total),
+        'top_devices': top,
+        'alerts_by_type': alerts,
+    }
+
+
+def refresh_reports(organization_id, full=False, top_devices=None):
+    """
+    Recalcula los informes de los meses tocados desde el último cálculo (o
+    todos con ``full``) y devuelve la lista de meses regenerados. Los meses
+    que se quedaron sin agregados ni alertas se borran.
+
+    Las lecturas van fuera de la transacción y la escritura en un bloque
+    corto que empieza escribiendo: en SQLite una transacción que lee y luego
+    escribe falla con "database is locked" si otro proceso escribe a la vez.
+    """
+    started = timezone.now()
+    reports = MonthlyReport.objects.filter(organization_id=organization_id)
+    since = None if full else reports.aggregate(last=Max('source_until'))['last']
+    summaries = {month: summarize_month(organization_id, month, top_devices)
+                 for month in dirty_months(organization_id, since)}
+    kept = [month for month, values in summaries.items() if values['device_count'] or values['alert_count']]
+
+    with transaction.atomic():
+        stale = reports if full else reports.filter(month__in=summaries)
+        stale.delete()
+        MonthlyReport.objects.bulk_create(
+            MonthlyReport(organization_id=organization_id, month=month, source_until=started, **summaries[month])
+            for month in kept
+        )
+    return kept
+
+
+# -- Presentación --------------------------------------------------------------
+
+def report_context(report):
+    """Contexto de la plantilla HTML: sólo lee el registro guardado."""
+    return {
+        'report': report,
+        'alerts': [
+            {'type': alert_type, 'label': ALERT_TYPE_LABELS.get(alert_type, alert_type), 'count': count}
+            for alert_type, count in sorted(report.alerts_by_type.items(), key=lambda item: -item[1])
+        ],
+    }
+
+
+def render_csv(report):
+    """Informe en CSV: una sección por bloque (zonas, categorías, dispositivos, alertas)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['section', 'id', 'name', 'kwh', 'share_pct'])
+    writer.writerow(['total', report.organization_id, f'{report.month:%Y-%m}', report.total_kwh, 100])
+    for section in ('zones', 'categories', 'top_devices'):
+        for entry in getattr(report, section):
+            writer.writerow([section, entry['id'], entry['name'], f"{entry['kwh']:.3f}", entry['share']])
+    writer.writerow([])
+    writer.writerow(['section', 'alert_type', 'label', 'count'])
+    for alert_type, count in sorted(report.alerts_by_type.items()):
+        writer.writerow(['alerts', alert_type, ALERT_TYPE_LABELS.get(alert_type, alert_type), count])
+    return buffer.getvalue()
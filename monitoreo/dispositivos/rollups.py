@@ -0,0 +1,289 @@
+# dispositivos/rollups.py
+"""Agregados horarios y diarios de consumo por dispositivo y por zona."""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .archive import archived_models
+from .caching import invalidate_organization_blocks
+from .columnar import decode, hourly_totals, packed_state, unpacked_filter
+from .models import DeviceRollup, Measurement, ReadingBlock, Watermark, ZoneRollup
+
+WATERMARK_NAME = 'measurement_rollups'
+DEFAULT_BATCH_SIZE = 50000
+# Las tablas de archivo y los ReadingBlock no tienen deleted_at: se filtran por el dispositivo
+LIVE_DEVICE = Q(device__deleted_at__isnull=True)
+
+
+class _Bucket:
+    __slots__ = ('organization_id', 'total', 'minimum', 'maximum', 'count')
+
+    def __init__(self, organization_id):
+        self.organization_id = organization_id
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+        self.count = 0
+
+    def add(self, total, minimum, maximum, count):
+        self.total += total
+        self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+        self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+        self.count += count
+
+
+def _day_start(hour_start):
+    return timezone.localtime(hour_start).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _new_buckets():
+    return {
+        'device': defaultdict(dict),
+        'zone': defaultdict(dict),
+    }
+
+
+def _add_hour(buckets, organization_id, device_id, zone_id, hour, *values):
+    """Suma una hora de un dispositivo a sus buckets horarios y diarios, de dispositivo y de zona."""
+    for period, start in (('hour', hour), ('day', _day_start(hour))):
+        for level, owner_id in (('device', device_id), ('zone', zone_id)):
+            key = (owner_id, start)
+            bucket = buckets[level][period].get(key)
+            if bucket is None:
+                bucket = buckets[level][period][key] = _Bucket(organization_id)
+            bucket.add(*values)
+
+
+def _aggregate_range(first_id, last_id, source=Measurement, selector=Q()):
+    """
+    Agrupa las mediciones con id en (first_id, last_id] por dispositivo y hora
+    con una sola consulta, y deriva en memoria los agregados diarios y por zona.
+    ``source`` puede ser también una tabla de archivo (archive.py).
+    """
+    rows = (
+        source.objects.filter(selector, id__gt=first_id, id__lte=last_id)
+        .annotate(hour=TruncHour('timestamp'))
+        .order_by()
+        .values('organization_id', 'device_id', 'device__zone_id', 'hour')
+        .annotate(
+            total=Sum('consumption_kwh'),
+            minimum=Min('consumption_kwh'),
+            maximum=Max('consumption_kwh'),
+            count=Count('id'),
+        )
+    )
+
+    buckets = _new_buckets()
+    for row in rows:
+        _add_hour(buckets, row['organization_id'], row['device_id'], row['device__zone_id'], row['hour'],
+                  row['total'], row['minimum'], row['maximum'], row['count'])
+    return buckets
+
+
+def _aggregate_blocks(blocks):
+    """Como ``_aggregate_range`` pero desde lecturas empaquetadas (columnar.py)."""
+    buckets = _new_buckets()
+    for organization_id, device_id, zone_id, base_ms, count, timestamps, values in blocks:
+        ms, wh = decode(base_ms, count, timestamps, values)
+        for hour, *totals in hourly_totals(ms, wh):
+            _add_hour(buckets, organization_id, device_id, zone_id, hour, *totals)
+    return buckets
+
+
+def _merge(model, owner_field, period, buckets):
+    """Suma los buckets nuevos a las filas existentes (o las crea)."""
+    if not buckets:
+        return 0
+
+    owner_ids = {owner_id for owner_id, _ in buckets}
+    starts = {start for _, start in buckets}
+    existing = {
+        (getattr(rollup, f'{owner_field}_id'), rollup.bucket_start): rollup
+        for rollup in model.objects.filter(
+            period=period,
+            bucket_start__in=starts,
+            **{f'{owner_field}_id__in': owner_ids},
+        )
+    }
+
+    now = timezone.now()
+    to_create, to_update = [], []
+    for key, bucket in buckets.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            to_create.append(model(
+                organization_id=bucket.organization_id,
+                period=period,
+                bucket_start=key[1],
+                total_kwh=bucket.total,
+                min_kwh=bucket.minimum,
+                max_kwh=bucket.maximum,
+                reading_count=bucket.count,
+                **{f'{owner_field}_id': key[0]},
+            ))
+        else:
+            rollup.total_kwh += bucket.total
+            rollup.min_kwh = min(rollup.min_kwh, bucket.minimum)
+            rollup.max_kwh = max(rollup.max_kwh, bucket.maximum)
+            rollup.reading_count += bucket.count
+            rollup.updated_at = now
+            to_update.append(rollup)
+
+    model.objects.bulk_create(to_create, batch_size=1000)
+    model.objects.bulk_update(
+        to_update,
+        ['total_kwh', 'min_kwh', 'max_kwh', 'reading_count', 'updated_at'],
+        batch_size=1000,
+    )
+    return len(to_create) + len(to_update)
+
+
+def update_rollups(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Procesa solo las mediciones con id mayor a la marca de agua guardada.
+
+    Cada bloque de ``batch_size`` mediciones se agrega y se confirma junto con
+    el avance de la marca de agua, de modo que una ejecución interrumpida
+    continúa donde quedó sin contar dos veces ninguna lectura.
+    Devuelve la cantidad de mediciones procesadas.
+    """
+    processed = 0
+    while True:
+        with transaction.atomic():
+            watermark, _ = Watermark.objects.select_for_update().get_or_create(name=WATERMARK_NAME)
+            pending = Measurement.objects.filter(id__gt=watermark.last_id).order_by('id')
+            ids = list(pending.values_list('id', flat=True)[batch_size - 1:batch_size])
+            upper = ids[0] if ids else pending.order_by('-id').values_list('id', flat=True).first()
+            if upper is None:
+                return processed
+
+            buckets = _aggregate_range(watermark.last_id, upper)
+            _merge_all(buckets)
+
+            processed += sum(bucket.count for bucket in buckets['device']['hour'].values())
+            touched = {bucket.organization_id for bucket in buckets['zone']['day'].values()}
+            transaction.on_commit(lambda touched=touched: invalidate_organization_blocks(*touched))
+            watermark.last_id = upper
+            watermark.save(update_fields=['last_id', 'updated_at'])
+
+
+def _merge_all(buckets):
+    for period in ('hour', 'day'):
+        _merge(DeviceRollup, 'device', period, buckets['device'][period])
+        _merge(ZoneRollup, 'zone', period, buckets['zone'][period])
+
+
+def _replay(source, batch_size, selector, advance_watermark=False):
+    """Agrega todas las filas de ``source`` que cumplen ``selector``, por bloques de ids."""
+    processed = 0
+    ids = source.objects.order_by('id').values_list('id', flat=True)
+    last_id = 0
+    while True:
+        chunk = list(ids.filter(id__gt=last_id)[batch_size - 1:batch_size])
+        upper = chunk[0] if chunk else ids.filter(id__gt=last_id).order_by('-id').first()
+        if upper is None:
+            return processed
+        with transaction.atomic():
+            buckets = _aggregate_range(last_id, upper, source=source, selector=selector)
+            _merge_all(buckets)
+            if advance_watermark:
+                Watermark.objects.update_or_create(name=WATERMARK_NAME, defaults={'last_id': upper})
+        processed += sum(bucket.count for bucket in buckets['device']['hour'].values())
+        last_id = upper
+
+
+def rebuild_rollups(batch_size=DEFAULT_BATCH_SIZE, block_batch_size=500):
+    """
+    Borra los agregados y los recalcula desde cero: lecturas empaquetadas
+    (``ReadingBlock``), meses movidos a tablas de archivo y tabla principal.
+    Las filas que ya están en un bloque se cuentan sólo desde el bloque. Como
+    en las lecturas, se omiten los dispositivos con borrado lógico.
+    """
+    with transaction.atomic():
+        DeviceRollup.objects.all().delete()
+        ZoneRollup.objects.all().delete()
+        Watermark.objects.filter(name=WATERMARK_NAME).delete()
+
+    boundary, packed_id = packed_state()
+    unpacked = unpacked_filter(boundary, packed_id) & LIVE_DEVICE
+
+    processed = 0
+    blocks = ReadingBlock.objects.filter(LIVE_DEVICE).order_by('id').values_list(
+        'id', 'organization_id', 'device_id', 'device__zone_id', 'base_ms', 'reading_count', 'timestamps', 'values')
+    last_id = 0
+    while True:
+        batch = list(blocks.filter(id__gt=last_id)[:block_batch_size])
+        if not batch:
+            break
+        with transaction.atomic():
+            buckets = _aggregate_blocks(row[1:] for row in batch)
+            _merge_all(buckets)
+        processed += sum(bucket.count for bucket in buckets['device']['hour'].values())
+        last_id = batch[-1][0]
+
+    for model in archived_models():
+        processed += _replay(model, batch_size, unpacked)
+    # La tabla principal avanza la marca de agua: update_rollups sigue desde ahí
+    processed += _replay(Measurement, batch_size, unpacked, advance_watermark=True)
+    return processed + update_rollups(batch_size=batch_size)
+
+
+def forget_device(device):
+    """
+    Quita de los agregados un dispositivo con borrado lógico.
+
+    La marca de agua sólo avanza por id, así que ``update_rollups`` nunca
+    resta lecturas ya sumadas: se borran las filas del dispositivo y las de
+    su zona en el mismo rango se recalculan desde los dispositivos vivos de
+    la zona, igual que lo haría ``rebuild_rollups``.
+    """
+    rollups = DeviceRollup.objects.filter(device=device)
+    spans = list(rollups.order_by().values('period').annotate(first=Min('bucket_start'), last=Max('bucket_start')))
+    if not spans:
+        return 0
+
+    with transaction.atomic():
+        removed = rollups._raw_delete(rollups.db)
+        for span in spans:
+            window = Q(period=span['period'], bucket_start__gte=span['first'], bucket_start__lte=span['last'])
+            ZoneRollup.objects.filter(window, zone_id=device.zone_id).delete()
+            rows = (
+                DeviceRollup.objects.filter(window, device__zone_id=device.zone_id, device__deleted_at__isnull=True)
+                .order_by()
+                .values('organization_id', 'bucket_start')
+                .annotate(total=Sum('total_kwh'), minimum=Min('min_kwh'), maximum=Max('max_kwh'),
+                          count=Sum('reading_count'))
+            )
+            ZoneRollup.objects.bulk_create([
+                ZoneRollup(organization_id=row['organization_id'], zone_id=device.zone_id, period=span['period'],
+                           bucket_start=row['bucket_start'], total_kwh=row['total'], min_kwh=row['minimum'],
+                           max_kwh=row['maximum'], reading_count=row['count'])
+                for row in rows
+            ], batch_size=1000)
+        transaction.on_commit(lambda: invalidate_organization_blocks(device.organization_id))
+    return removed
+
+
+def device_daily_consumption(device, days=14):
+    """Consumo diario de un dispositivo leído desde los agregados."""
+    since = _day_start(timezone.now() - timedelta(days=days - 1))
+    return DeviceRollup.objects.filter(
+        device=device, period='day', bucket_start__gte=since
+    ).order_by('-bucket_start')
+
+
+def zone_consumption(organization, days=7):
+    """Consumo total por zona en los últimos ``days`` días leído desde los agregados."""
+    since = _day_start(timezone.now() - timedelta(days=days - 1))
+    rows = (
+        ZoneRollup.objects.filter(organization=organization, period='day', bucket_start__gte=since,
+                                  zone__deleted_at__isnull=True)
+        .order_by('zone__name')
+        .values('zone__name')
+        .annotate(total=Sum('total_kwh'))
+    )
+    return {row['zone__name']: row['total'] for row in rows}
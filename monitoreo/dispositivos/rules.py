@@ -0,0 +1,257 @@
+# dispositivos/rules.py
+"""
+Motor de reglas de alertas evaluado en el momento de la ingesta.
+
+Mantiene en memoria, por dispositivo y por zona, una ventana deslizante de
+lecturas con su suma acumulada: cada lectura nueva entra a la ventana y las
+que quedan fuera se descuentan, así que evaluar una lectura cuesta O(1)
+amortizado sin volver a consultar la base (más una copia por lote de cada
+ventana que el lote toca, ver abajo).
+
+Reglas:
+
+- ``high_consumption``: potencia promedio del dispositivo en la ventana
+  (kWh acumulados / horas de la ventana) frente a ``Device.power_watts``.
+- ``zone_limit_exceeded``: potencia promedio agregada de la zona frente a
+  ``Zone.max_capacity`` (kW).
+
+Las alertas se deduplican por (dispositivo, tipo) —o por zona en el caso de
+``zone_limit_exceeded``— durante un período de enfriamiento, considerando
+también las alertas activas ya guardadas.
+
+Cada lote se evalúa sobre copias de las ventanas que toca; las lecturas y
+las alertas emitidas pasan al estado compartido recién en
+``transaction.on_commit``, así una ingesta revertida no deja lecturas en las
+ventanas ni enfriamientos de alertas que nunca se guardaron.
+"""
+import bisect
+import threading
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Alert, Device
+
+DEFAULT_WINDOW_SECONDS = 3600
+DEFAULT_COOLDOWN_SECONDS = 3600
+
+# Razón carga/límite a partir de la cual se asigna cada severidad
+SEVERITY_THRESHOLDS = (
+    (1.5, 'grave'),
+    (1.25, 'alta'),
+    (1.0, 'media'),
+)
+
+
+def severity_for(ratio):
+    for threshold, severity in SEVERITY_THRESHOLDS:
+        if ratio >= threshold:
+            return severity
+    return None
+
+
+class RollingWindow:
+    """Suma de kWh de las lecturas dentro de los últimos ``seconds`` segundos."""
+
+    __slots__ = ('seconds', 'readings', 'total', 'latest')
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.readings = deque()
+        self.total = 0.0
+        self.latest = None
+
+    def copy(self):
+        window = RollingWindow(self.seconds)
+        window.readings = deque(self.readings)
+        window.total = self.total
+        window.latest = self.latest
+        return window
+
+    def add(self, epoch, kwh):
+        if self.latest is not None and epoch <= self.latest - self.seconds:
+            # Lectura atrasada que ya no cae dentro de la ventana
+            return
+        if self.latest is None or epoch >= self.latest:
+            self.readings.append((epoch, kwh))
+            self.latest = epoch
+        else:
+            # Atrasada pero dentro de la ventana: en orden, para que expire a tiempo
+            bisect.insort(self.readings, (epoch, kwh))
+        self.total += kwh
+        self.expire(self.latest)
+
+    def expire(self, now):
+        """Descuenta las lecturas que quedaron fuera de la ventana que termina en ``now``."""
+        cutoff = now - self.seconds
+        while self.readings and self.readings[0][0] <= cutoff:
+            self.total -= self.readings.popleft()[1]
+
+    def average_kw(self):
+        return self.total / (self.seconds / 3600)
+
+
+class RuleEngine:
+    def __init__(self, window_seconds=None, cooldown_seconds=None):
+        self.window_seconds = window_seconds or getattr(
+            settings, 'ALERT_RULE_WINDOW_SECONDS', DEFAULT_WINDOW_SECONDS)
+        self.cooldown = timedelta(seconds=cooldown_seconds or getattr(
+            settings, 'ALERT_RULE_COOLDOWN_SECONDS', DEFAULT_COOLDOWN_SECONDS))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.devices = {}        # device_id -> (organization_id, zone_id, rated_kw, name)
+        self.zones = {}          # zone_id -> (capacity_kw, name)
+        self.device_windows = {}
+        self.zone_windows = {}
+        self.last_alert = {}     # (device_id, alert_type) -> alert_date
+
+    def forget_device(self, device_id):
+        """Descarta metadatos cacheados de un dispositivo (p. ej. tras editarlo)."""
+        with self._lock:
+            self.devices.pop(device_id, None)
+
+    def forget_zone(self, zone_id):
+        with self._lock:
+            self.zones.pop(zone_id, None)
+
+    def _load_metadata(self, device_ids):
+        """
+        Carga con una consulta los dispositivos (y sus zonas) aún no conocidos.
+        Un dispositivo conocido cuya zona se descartó (``forget_zone``) se
+        recarga también, así la zona vuelve con su capacidad actual.
+        """
+        missing = [
+            device_id for device_id in device_ids
+            if device_id not in self.devices or self.devices[device_id][1] not in self.zones
+        ]
+        if not missing:
+            return
+        new_zones = set()
+        rows = Device.objects.filter(id__in=missing).values_list(
+            'id', 'organization_id', 'zone_id', 'power_watts', 'name',
+            'zone__max_capacity', 'zone__name',
+        )
+        for device_id, organization_id, zone_id, watts, name, capacity, zone_name in rows:
+            self.devices[device_id] = (organization_id, zone_id, (watts or 0) / 1000, name)
+            if zone_id not in self.zones:
+                self.zones[zone_id] = (float(capacity or 0), zone_name)
+                new_zones.add(zone_id)
+
+        # Alertas activas recientes: evitan duplicar las que ya existen en la base
+        since = timezone.now() - self.cooldown
+        recent = Alert.objects.filter(
+            Q(device_id__in=missing, alert_type='high_consumption')
+            | Q(device__zone_id__in=new_zones, alert_type='zone_limit_exceeded'),
+            status='active',
+            alert_date__gte=since,
+        ).order_by().values_list('device_id', 'device__zone_id', 'alert_type', 'alert_date')
+        for device_id, zone_id, alert_type, alert_date in recent:
+            key = (device_id if alert_type == 'high_consumption' else ('zone', zone_id), alert_type)
+            if key not in self.last_alert or self.last_alert[key] < alert_date:
+                self.last_alert[key] = alert_date
+
+    def _should_alert(self, alerted, device_id, alert_type, when):
+        """Decide el enfriamiento con las alertas de la base, las ya aplicadas y las del lote (``alerted``)."""
+        key = (device_id, alert_type)
+        last = alerted.get(key, self.last_alert.get(key))
+        if last is not None and abs(when - last) < self.cooldown:
+            return False
+        alerted[key] = when
+        return True
+
+    @staticmethod
+    def _window(windows, staged, key, seconds):
+        """Copia de trabajo de la ventana ``key`` para el lote en curso."""
+        window = staged.get(key)
+        if window is None:
+            live = windows.get(key)
+            window = staged[key] = live.copy() if live is not None else RollingWindow(seconds)
+        return window
+
+    def evaluate(self, measurements):
+        """
+        Evalúa las lecturas dadas y devuelve las alertas (sin guardar) que
+        corresponden. Las ventanas y enfriamientos compartidos se actualizan
+        cuando confirma la transacción en curso (de inmediato si no hay una).
+        """
+        alerts = []
+        accepted = []           # (device_id, zone_id, epoch, kwh)
+        alerted = {}            # (clave, tipo) -> alert_date de las alertas del lote
+        device_windows, zone_windows = {}, {}
+        with self._lock:
+            self._load_metadata({m.device_id for m in measurements})
+            for measurement in sorted(measurements, key=lambda m: m.timestamp):
+                device = self.devices.get(measurement.device_id)
+                if device is None:
+                    continue
+                organization_id, zone_id, rated_kw, name = device
+                epoch = measurement.timestamp.timestamp()
+                kwh = float(measurement.consumption_kwh)
+                accepted.append((measurement.device_id, zone_id, epoch, kwh))
+
+                window = self._window(self.device_windows, device_windows, measurement.device_id,
+                                      self.window_seconds)
+                window.add(epoch, kwh)
+                zone_window = self._window(self.zone_windows, zone_windows, zone_id, self.window_seconds)
+                zone_window.add(epoch, kwh)
+
+                if rated_kw:
+                    load = window.average_kw()
+                    severity = severity_for(load / rated_kw)
+                    if severity and self._should_alert(
+                            alerted, measurement.device_id, 'high_consumption', measurement.timestamp):
+                        alerts.append(Alert(
+                            organization_id=organization_id,
+                            device_id=measurement.device_id,
+                            alert_type='high_consumption',
+                            severity=severity,
+                            message=f'{name}: average load {load:.2f} kW over rated {rated_kw:.2f} kW',
+                            alert_date=measurement.timestamp,
+                        ))
+
+                capacity_kw, zone_name = self.zones.get(zone_id, (0, ''))
+                if capacity_kw:
+                    load = zone_window.average_kw()
+                    severity = severity_for(load / capacity_kw)
+                    # La alerta de zona se asocia al dispositivo cuya lectura la disparó
+                    if severity and self._should_alert(
+                            alerted, ('zone', zone_id), 'zone_limit_exceeded', measurement.timestamp):
+                        alerts.append(Alert(
+                            organization_id=organization_id,
+                            device_id=measurement.device_id,
+                            alert_type='zone_limit_exceeded',
+                            severity=severity,
+                            message=f'Zone {zone_name}: load {load:.2f} kW over capacity {capacity_kw:.2f} kW',
+                            alert_date=measurement.timestamp,
+                        ))
+        transaction.on_commit(lambda: self._apply(accepted, alerted))
+        return alerts
+
+    def _apply(self, accepted, alerted):
+        """Pasa al estado compartido las lecturas y alertas de un lote confirmado."""
+        with self._lock:
+            for device_id, zone_id, epoch, kwh in accepted:
+                for windows, key in ((self.device_windows, device_id), (self.zone_windows, zone_id)):
+                    window = windows.get(key)
+                    if window is None:
+                        window = windows[key] = RollingWindow(self.window_seconds)
+                    window.add(epoch, kwh)
+            for key, when in alerted.items():
+                if key not in self.last_alert or self.last_alert[key] < when:
+                    self.last_alert[key] = when
+
+    def process(self, measurements):
+        """Evalúa las lecturas y guarda las alertas resultantes con bulk_create."""
+        alerts = self.evaluate(measurements)
+        if alerts:
+            Alert.objects.bulk_create(alerts, batch_size=500)
+        return alerts
+
+
+engine = RuleEngine()
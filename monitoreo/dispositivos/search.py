@@ -0,0 +1,342 @@
+# dispositivos/search.py
+"""
+Índice invertido en memoria para buscar dispositivos.
+
+Por organización se guarda, para cada término (nombre, modelo, zona,
+categoría y estado del dispositivo, en minúsculas y sin tildes), el
+conjunto de ids que lo contienen, más un vocabulario ordenado para resolver
+prefijos con ``bisect``: "sol pan" encuentra "Solar Panels". Todos los
+términos de la consulta deben coincidir.
+
+El índice de una organización se carga completo la primera vez que se
+busca y se mantiene por señales al guardar/eliminar un dispositivo (un
+cambio de nombre de zona o categoría descarta la organización, que se
+recarga en la siguiente búsqueda). Los cambios hechos en otros procesos no
+llegan por señales: cada búsqueda compara una versión barata de la
+organización (cantidad de dispositivos y último ``updated_at`` de
+dispositivos, zonas y categorías, en una consulta) y recarga si cambió.
+Como zoneload.py, además se reconcilia cada
+``DEVICE_SEARCH_RECONCILE_SECONDS`` para recoger ``QuerySet.update`` que
+no tocan ``updated_at``.
+
+Las búsquedas devuelven una página ordenada como ``DEVICE_ORDERING`` y los
+conteos por categoría, zona y estado; cada faceta se cuenta aplicando los
+demás filtros pero no el propio, así siempre muestra las alternativas.
+"""
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Count, Max, OuterRef, Subquery
+
+from .models import Category, Device, Organization, Zone
+from .pagination import DEFAULT_PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor
+
+DEFAULT_RECONCILE_SECONDS = 300
+STATUS_LABELS = dict(Device.STATUS_CHOICES)
+FACETS = ('category', 'zone', 'status')
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Términos de ``text`` en minúsculas y sin tildes."""
+    text = unicodedata.normalize('NFKD', str(text or '')).encode('ascii', 'ignore').decode()
+    return _TOKEN.findall(text.lower())
+
+
+class _Doc:
+    __slots__ = ('name', 'model', 'category', 'zone', 'status', 'power_watts', 'terms')
+
+    def __init__(self, name, model, category, zone, status, power_watts, terms):
+        self.name = name
+        self.model = model
+        self.category = category
+        self.zone = zone
+        self.status = status
+        self.power_watts = power_watts
+        self.terms = terms
+
+
+class _OrganizationIndex:
+    def __init__(self, zone_names, category_names):
+        self.zone_names = zone_names
+        self.category_names = category_names
+        self.docs = {}        # device_id -> _Doc
+        self.postings = {}    # término -> {device_id}
+        self.vocabulary = []  # términos ordenados (búsqueda por prefijo)
+        self.ordered = []     # (nombre, id) ordenados como DEVICE_ORDERING
+        # faceta -> valor -> {device_id}; los conteos son intersecciones de conjuntos
+        self.facets = {facet: defaultdict(set) for facet in FACETS}
+
+    def add(self, device_id, name, model, category_id, zone_id, status, power_watts):
+        self.remove(device_id)
+        terms = frozenset(
+            tokenize(name) + tokenize(model) + tokenize(STATUS_LABELS.get(status, status))
+            + tokenize(self.zone_names.get(zone_id)) + tokenize(self.category_names.get(category_id))
+            + tokenize(status)
+        )
+        doc = self.docs[device_id] = _Doc(name, model, category_id, zone_id, status, power_watts, terms)
+        bisect.insort(self.ordered, (name, device_id))
+        for facet in FACETS:
+            self.facets[facet][getattr(doc, facet)].add(device_id)
+        for term in terms:
+            ids = self.postings.get(term)
+            if ids is None:
+                ids = self.postings[term] = set()
+                bisect.insort(self.vocabulary, term)
+            ids.add(device_id)
+
+    def remove(self, device_id):
+        doc = self.docs.pop(device_id, None)
+        if doc is None:
+            return
+        del self.ordered[bisect.bisect_left(self.ordered, (doc.name, device_id))]
+        for facet in FACETS:
+            ids = self.facets[facet][getattr(doc, facet)]
+            ids.discard(device_id)
+            if not ids:
+                del self.facets[facet][getattr(doc, facet)]
+        for term in doc.terms:
+            ids = self.postings[term]
+            ids.discard(device_id)
+            if not ids:
+                del self.postings[term]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, term)]
+
+    def prefixed(self, prefix):
+        """Ids con algún término que empieza con ``prefix``."""
+        matches = set()
+        position = bisect.bisect_left(self.vocabulary, prefix)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(prefix):
+            matches |= self.postings[self.vocabulary[position]]
+            position += 1
+        return matches
+
+    def match(self, query):
+        tokens = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not tokens:
+            return self.docs.keys()
+        # Los prefijos más largos suelen ser los más selectivos
+        matches = self.prefixed(tokens[0])
+        for token in tokens[1:]:
+            if not matches:
+                break
+            matches &= self.prefixed(token)
+        return matches
+
+    def facet_name(self, facet, key):
+        if facet == 'category':
+            return self.category_names.get(key, '')
+        if facet == 'zone':
+            return self.zone_names.get(key, '')
+        return STATUS_LABELS.get(key, key)
+
+    def describe(self, device_id):
+        doc = self.docs[device_id]
+        return {
+            'id': device_id,
+            'name': doc.name,
+            'model': doc.model,
+            'category': self.category_names.get(doc.category, ''),
+            'zone': self.zone_names.get(doc.zone, ''),
+            'status': doc.status,
+            'power_watts': doc.power_watts,
+        }
+
+    def page(self, hits, after, size):
+        """Los primeros ``size`` (nombre, id) de ``hits`` posteriores a ``after``."""
+        if len(hits) * 8 < len(self.ordered):
+            # Pocos resultados: ordenarlos es más barato que recorrer todo
+            rows = sorted((self.docs[device_id].name, device_id) for device_id in hits)
+            start = bisect.bisect_right(rows, after) if after else 0
+            return rows[start:start + size]
+        rows = []
+        start = bisect.bisect_right(self.ordered, after) if after else 0
+        for row in self.ordered[start:]:
+            if row[1] in hits:
+                rows.append(row)
+                if len(rows) == size:
+                    break
+        return rows
+
+
+def _latest(model, field='updated_at'):
+    return Subquery(
+        model.all_objects.filter(organization_id=OuterRef('pk')).order_by()
+        .values('organization_id').annotate(value=Max(field)).values('value')
+    )
+
+
+def organization_version(organization_id):
+    """
+    Versión de los datos indexados de la organización, en una consulta: el
+    conteo detecta altas y borrados definitivos; ``updated_at``, ediciones y
+    borrados lógicos.
+    """
+    return Organization.all_objects.filter(pk=organization_id).annotate(
+        device_count=Subquery(
+            Device.all_objects.filter(organization_id=OuterRef('pk')).order_by()
+            .values('organization_id').annotate(value=Count('id')).values('value')
+        ),
+        devices_updated=_latest(Device),
+        zones_updated=_latest(Zone),
+        categories_updated=_latest(Category),
+    ).values_list('device_count', 'devices_updated', 'zones_updated', 'categories_updated').first()
+
+
+class SearchResult:
+    def __init__(self, items, facets, next_cursor, count):
+        self.items = items
+        self.facets = facets
+        self.next_cursor = next_cursor
+        self.count = count
+
+
+class DeviceSearchIndex:
+    def __init__(self, reconcile_seconds=None):
+        self.reconcile_seconds = reconcile_seconds or getattr(
+            settings, 'DEVICE_SEARCH_RECONCILE_SECONDS', DEFAULT_RECONCILE_SECONDS)
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.organizations = {}  # organization_id -> _OrganizationIndex
+            self.loaded = {}         # organization_id -> monotonic de la última reconciliación
+            self.versions = {}       # organization_id -> organization_version al cargar
+
+    # -- Carga y reconciliación -------------------------------------------------
+
+    def reconcile(self, organization_id, version=None):
+        """
+        Reconstruye el índice de la organización desde la base (3 consultas).
+        Las consultas corren sin el lock; sólo el reemplazo del índice lo toma.
+        """
+        if version is None:
+            version = organization_version(organization_id)
+        index = _OrganizationIndex(
+            dict(Zone.objects.filter(organization_id=organization_id).values_list('id', 'name')),
+            dict(Category.objects.filter(organization_id=organization_id).values_list('id', 'name')),
+        )
+        for row in Device.objects.filter(organization_id=organization_id).values_list(
+                'id', 'name', 'model', 'category_id', 'zone_id', 'status', 'power_watts'):
+            index.add(*row)
+        with self._lock:
+            self.organizations[organization_id] = index
+            self.loaded[organization_id] = time.monotonic()
+            self.versions[organization_id] = version
+        return index
+
+    def _index(self, organization_id):
+        # La versión se consulta fuera del lock: las búsquedas de distintas
+        # organizaciones no esperan las consultas de las demás
+        version = organization_version(organization_id)
+        with self._lock:
+            index = self.organizations.get(organization_id)
+            loaded_at = self.loaded.get(organization_id)
+            current = (index is not None and version == self.versions.get(organization_id)
+                       and time.monotonic() - loaded_at <= self.reconcile_seconds)
+        if current:
+            return index
+        return self.reconcile(organization_id, version)
+
+    def _seen(self, organization_id, device, count_delta=0):
+        """
+        Ajusta la versión guardada con un cambio ya aplicado al índice por
+        señal, para que la próxima búsqueda no recargue por un cambio propio.
+        """
+        version = self.versions.get(organization_id)
+        if version is None:
+            return
+        count, devices_updated, zones_updated, categories_updated = version
+        updated_at = device.updated_at
+        if updated_at is not None and (devices_updated is None or updated_at > devices_updated):
+            devices_updated = updated_at
+        self.versions[organization_id] = (
+            (count or 0) + count_delta, devices_updated, zones_updated, categories_updated)
+
+    # -- Actualizaciones incrementales -----------------------------------------
+
+    def device_changed(self, device, created=False):
+        with self._lock:
+            index = self.organizations.get(device.organization_id)
+            if index is None:
+                return
+            if device.deleted_at is not None:
+                index.remove(device.pk)
+            else:
+                index.add(device.pk, device.name, device.model, device.category_id, device.zone_id, device.status,
+                          device.power_watts)
+            self._seen(device.organization_id, device, 1 if created else 0)
+
+    def device_removed(self, device):
+        with self._lock:
+            index = self.organizations.get(device.organization_id)
+            if index is not None:
+                index.remove(device.pk)
+                self._seen(device.organization_id, device, -1)
+
+    def forget_organization(self, organization_id):
+        """Descarta el índice (p. ej. al renombrar una zona); se recarga al buscar."""
+        with self._lock:
+            self.organizations.pop(organization_id, None)
+            self.loaded.pop(organization_id, None)
+            self.versions.pop(organization_id, None)
+
+    # -- Búsqueda ----------------------------------------------------------------
+
+    def search(self, organization_id, query='', category=None, zone=None, status=None,
+               cursor=None, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Una página de dispositivos que coinciden con ``query`` y los filtros,
+        ordenada por (nombre, id) y continuando después de ``cursor`` (mismo
+        formato que ``keyset_paginate`` con ``DEVICE_ORDERING``), más las
+        facetas y el total de coincidencias.
+        """
+        after = None
+        if cursor:
+            after = decode_cursor(cursor, 2)
+            if not isinstance(after[0], str) or not isinstance(after[1], int):
+                raise InvalidCursor('Malformed cursor')
+            after = tuple(after)
+
+        filters = {'category': category, 'zone': zone, 'status': status}
+        index = self._index(organization_id)
+        with self._lock:
+            matches = index.match(query)
+            selected = {
+                facet: index.facets[facet].get(value, set())
+                for facet, value in filters.items() if value is not None
+            }
+            hits = set(matches)
+            for ids in selected.values():
+                hits &= ids
+
+            facets = {}
+            for facet in FACETS:
+                # Cada faceta se cuenta con los demás filtros, no con el propio
+                base = hits if facet not in selected else set(matches).intersection(
+                    *[ids for other, ids in selected.items() if other != facet])
+                counts = [
+                    (key, len(base & ids) if len(base) < len(index.docs) else len(ids))
+                    for key, ids in index.facets[facet].items()
+                ]
+                facets[facet] = [
+                    {'id': key, 'name': index.facet_name(facet, key), 'count': count}
+                    for key, count in sorted(counts, key=lambda item: (-item[1], str(item[0]))) if count
+                ]
+
+            page = index.page(hits, after, page_size + 1)
+            # Campos indexados: la página se responde sin consultar la base
+            items = [index.describe(device_id) for _, device_id in page[:page_size]]
+
+        next_cursor = encode_cursor(list(page[page_size - 1])) if len(page) > page_size else None
+        return SearchResult(items, facets, next_cursor, len(hits))
+
+
+index = DeviceSearchIndex()
@@ -0,0 +1,74 @@
+# dispositivos/services.py
+"""Consultas agregadas reutilizables por las vistas y la API."""
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Alert, Category, Zone
+
+# Etiquetas que usan los templates para cada severidad almacenada
+SEVERITY_LABELS = {
+    'grave': 'Grave',
+    'alta': 'Alto',
+    'media': 'Mediano',
+}
+ALERT_TYPE_LABELS = dict(Alert.TYPE_CHOICES)
+
+
+def _live_devices(organization):
+    # Count sobre la relación no pasa por LiveManager: excluir los borrados a mano
+    return Q(devices__organization=organization, devices__deleted_at__isnull=True)
+
+
+def devices_by_category(organization):
+    """Conteo de dispositivos por categoría en una sola consulta agrupada."""
+    rows = (
+        Category.objects.filter(organization=organization)
+        .annotate(device_count=Count('devices', filter=_live_devices(organization)))
+        .order_by('id')
+        .values_list('name', 'device_count')
+    )
+    return dict(rows)
+
+
+def devices_by_zone(organization):
+    """Conteo de dispositivos por zona en una sola consulta agrupada."""
+    rows = (
+        Zone.objects.filter(organization=organization)
+        .annotate(device_count=Count('devices', filter=_live_devices(organization)))
+        .order_by('id')
+        .values_list('name', 'device_count')
+    )
+    return dict(rows)
+
+
+def alerts_by_severity(organization, since):
+    """Conteo de alertas desde ``since`` por severidad, con todas las severidades presentes."""
+    counts = {label: 0 for label in SEVERITY_LABELS.values()}
+    rows = (
+        Alert.objects.filter(organization=organization, alert_date__gte=since)
+        .order_by()
+        .values('severity')
+        .annotate(total=Count('id'))
+    )
+    for row in rows:
+        label = SEVERITY_LABELS.get(row['severity'])
+        if label:
+            counts[label] = row['total']
+    return counts
+
+
+def dashboard_stats(organization, days=7):
+    """
+    Estadísticas del dashboard con un número constante de consultas.
+
+    Devuelve un diccionario serializable a JSON, pensado para ser usado tanto
+    por la vista HTML como por la API.
+    """
+    since = timezone.now() - timedelta(days=days)
+    return {
+        'devices_by_category': devices_by_category(organization),
+        'devices_by_zone': devices_by_zone(organization),
+        'alerts_by_severity': alerts_by_severity(organization, since),
+    }
@@ -0,0 +1,106 @@
+# dispositivos/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import invalidate_organization_blocks
+from .events import publish_alerts, publish_zone_load
+from .middleware import invalidate_organization
+from .models import Alert, Category, Device, Measurement, Membership, Organization, Zone
+from .rollups import forget_device
+from .rules import engine as rule_engine
+from .search import index as search_index
+from .zoneload import tracker as zone_load
+
+
+# Invalidación del caché de organizaciones por usuario
+@receiver([post_save, post_delete], sender=Organization)
+def organization_changed(sender, instance, **kwargs):
+    invalidate_organization(organization_id=instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Membership)
+def membership_changed(sender, instance, **kwargs):
+    invalidate_organization(user_id=instance.user_id)
+
+
+# Invalidación de bloques cacheados (dashboard, resumen de alertas).
+# Las inserciones con bulk_create no emiten señales; quienes las usan
+# invalidan explícitamente (ver ingestion.py y rollups.py). Measurement sólo
+# escucha post_save: un receptor de post_delete impediría a Django borrar
+# las mediciones de una cascada con un DELETE directo y lo obligaría a
+# cargarlas todas; la cascada ya invalida desde el dispositivo o la zona.
+@receiver([post_save, post_delete], sender=Device)
+@receiver(post_save, sender=Measurement)
+@receiver([post_save, post_delete], sender=Alert)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Zone)
+def organization_data_changed(sender, instance, **kwargs):
+    invalidate_organization_blocks(instance.organization_id)
+
+
+# Agregados de consumo: el borrado lógico resta el dispositivo (rollups.py)
+@receiver(post_save, sender=Device)
+def device_rollups_soft_deleted(sender, instance, update_fields=None, **kwargs):
+    if instance.deleted_at is not None and update_fields and 'deleted_at' in update_fields:
+        forget_device(instance)
+
+
+# Metadatos cacheados por el motor de reglas (potencia nominal, capacidad de zona)
+@receiver([post_save, post_delete], sender=Device)
+def device_rules_changed(sender, instance, **kwargs):
+    rule_engine.forget_device(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Zone)
+def zone_rules_changed(sender, instance, **kwargs):
+    rule_engine.forget_zone(instance.pk)
+
+
+# Totales de carga por zona mantenidos en memoria (zoneload.py)
+@receiver(post_save, sender=Device)
+def device_load_saved(sender, instance, **kwargs):
+    zone_load.device_changed(instance)
+    publish_zone_load(instance.organization_id)
+
+
+@receiver(post_delete, sender=Device)
+def device_load_deleted(sender, instance, **kwargs):
+    zone_load.device_removed(instance.pk)
+
+
+@receiver(post_save, sender=Zone)
+def zone_load_saved(sender, instance, **kwargs):
+    if instance.deleted_at is not None:
+        zone_load.zone_removed(instance)
+    else:
+        zone_load.zone_changed(instance)
+
+
+@receiver(post_delete, sender=Zone)
+def zone_load_deleted(sender, instance, **kwargs):
+    zone_load.zone_removed(instance)
+
+
+# Alertas creadas una a una (admin, seed_data); las masivas se publican donde se crean
+@receiver(post_save, sender=Alert)
+def alert_created(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish_alerts([instance]))
+
+
+# Índice de búsqueda de dispositivos en memoria (search.py)
+@receiver(post_save, sender=Device)
+def device_search_saved(sender, instance, created, **kwargs):
+    search_index.device_changed(instance, created=created)
+
+
+@receiver(post_delete, sender=Device)
+def device_search_deleted(sender, instance, **kwargs):
+    search_index.device_removed(instance)
+
+
+@receiver([post_save, post_delete], sender=Zone)
+@receiver([post_save, post_delete], sender=Category)
+def device_search_labels_changed(sender, instance, **kwargs):
+    search_index.forget_organization(instance.organization_id)
@@ -0,0 +1,65 @@
+# dispositivos/testing.py
+"""
+Ayudas para pruebas de rendimiento: presupuestos de consultas por vista.
+
+Uso en un TestCase con datos cargados (p. ej. ``seed_data`` o ``loadgen``)::
+
+    from dispositivos.testing import QueryBudgetMixin
+
+    class ViewBudgetTests(QueryBudgetMixin, TestCase):
+        def test_budgets(self):
+            self.client.force_login(user)
+            self.assertViewBudgets(device=device)
+
+Los presupuestos cuentan todas las consultas de la petición (sesión, usuario y
+membresía incluidas) y no dependen de cuántos dispositivos o mediciones haya:
+una vista que vuelva a tener un N+1 los supera apenas los datos crecen.
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .instrumentation import get_budget
+
+# Vistas principales verificadas por check_view_budgets; el máximo de consultas
+# de cada una sale de PERFORMANCE_BUDGETS (el mismo que usa el middleware)
+BUDGETED_VIEWS = ('dashboard', 'device_list', 'device_detail', 'measurement_list', 'alert_summary')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def assert_query_budget(client, url_name, budget=None, args=None, data=None):
+    """
+    Hace GET a la vista ``url_name`` y falla si emite más consultas que su
+    presupuesto. Devuelve la respuesta para verificaciones adicionales.
+    """
+    budget = get_budget(url_name)['queries'] if budget is None else budget
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(reverse(url_name, args=args), data)
+    if response.status_code != 200:
+        raise AssertionError(f'{url_name} returned {response.status_code}')
+    if len(queries) > budget:
+        listing = '\n'.join(f'{n}. {query["sql"]}' for n, query in enumerate(queries.captured_queries, 1))
+        raise QueryBudgetExceeded(
+            f'{url_name} issued {len(queries)} queries (budget {budget}):\n{listing}'
+        )
+    return response
+
+
+def check_view_budgets(client, device):
+    """Verifica los presupuestos de las vistas principales; ``device`` se usa para el detalle."""
+    for url_name in BUDGETED_VIEWS:
+        args = [device.pk] if url_name == 'device_detail' else None
+        assert_query_budget(client, url_name, args=args)
+
+
+class QueryBudgetMixin:
+    """Mezcla para TestCase con aserciones de presupuesto de consultas."""
+
+    def assertQueryBudget(self, url_name, budget=None, args=None, data=None):
+        return assert_query_budget(self.client, url_name, budget=budget, args=args, data=data)
+
+    def assertViewBudgets(self, device):
+        check_view_budgets(self.client, device)
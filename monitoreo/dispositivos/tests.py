@@ -1,3 +1,1519 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import multiprocessing
+import tempfile
+import threading
+import time as time_module
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, Sum
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from benchmarks import suite
+
+from . import jobs, loadgen, search
+from .analytics import rolling_mean, series_stats
+from .anomalies import detect_anomalies, reset_anomaly_state
+from .archive import archive_measurements, archived_models, hot_boundary, read_history
+from .caching import cached_block, get_cache, invalidate_organization_blocks
+from .columnar import decode, encode, pack_measurements, read_series
+from .events import broker, format_event
+from .export import export_history
+from .forecasting import refresh, zone_forecast
+from .middleware import organization_cache, resolve_organization
+from .models import (
+    Alert, AnomalyState, Category, Device, DeviceRollup, ForecastState, JobRun, Measurement, MeasurementArchive,
+    Membership, MonthlyReport, Organization, ReadingBlock, Watermark, Zone, ZoneRollup,
+)
+from .pagination import MEASUREMENT_ORDERING, InvalidCursor, encode_cursor, keyset_paginate
+from .presence import backfill_last_seen, offline_devices, sweep_offline_devices, touch_last_seen
+from .purge import purge_deleted
+from .reports import REFRESH_OVERLAP, dirty_months, refresh_reports
+from .rollups import rebuild_rollups, update_rollups
+from .rules import RollingWindow, RuleEngine, engine as rule_engine, severity_for
+from .search import index as search_index
+from .services import dashboard_stats
+from .testing import BUDGETED_VIEWS, QueryBudgetMixin
+from .views import LIVE_FEED_RETRY_MS
+from .zoneload import ZoneLoadTracker, tracker as zone_load
+
+
+def reset_process_state():
+    """Vacía los cachés en proceso para que cada prueba parta en frío."""
+    get_cache().clear()
+    organization_cache.clear()
+    search_index.reset()
+    rule_engine.reset()
+    zone_load.reset()
+
+
+def drop_archive_tables():
+    """Las tablas de archivo se crean fuera de las migraciones: el flush no las borra."""
+    with connection.schema_editor() as editor:
+        for model in archived_models():
+            editor.delete_model(model)
+
+
+# Presupuestos de consultas de las vistas principales (PERFORMANCE_BUDGETS)
+class ViewBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        loadgen.generate(organizations=2, zones=3, devices=30, days=2, interval=3600, alert_rate=0.05)
+        cls.organization = Organization.objects.order_by('id').first()
+        cls.user = User.objects.create_user('budget', password='budget')
+        Membership.objects.create(user=cls.user, organization=cls.organization)
+        cls.device = Device.objects.filter(organization=cls.organization).order_by('id').first()
+
+    def setUp(self):
+        reset_process_state()
+        self.client.force_login(self.user)
+
+    def test_budgets_with_cold_cache(self):
+        self.assertViewBudgets(device=self.device)
+
+    def test_budgets_with_warm_cache(self):
+        self.assertViewBudgets(device=self.device)
+        self.assertViewBudgets(device=self.device)
+
+    def test_each_view_within_budget(self):
+        for url_name in BUDGETED_VIEWS:
+            with self.subTest(view=url_name):
+                reset_process_state()
+                args = [self.device.pk] if url_name == 'device_detail' else None
+                self.assertQueryBudget(url_name, args=args)
+
+    def test_filtered_lists_within_budget(self):
+        self.assertQueryBudget('device_list', data={'q': self.device.name, 'zone': self.device.zone_id})
+        self.assertQueryBudget('measurement_list', data={'device': self.device.pk})
+
+    def test_device_detail_scoped_to_organization(self):
+        other = Device.objects.exclude(organization=self.organization).first()
+        response = self.client.get(f'/devices/{other.pk}/')
+        self.assertEqual(response.status_code, 404)
+
+
+# Índices compuestos de Measurement y Alert: los planes de SQLite los usan
+class IndexPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        loadgen.generate(organizations=2, zones=2, devices=5, days=2, interval=3600, alert_rate=0.1)
+        cls.organization = Organization.objects.order_by('id').first()
+        cls.device = Device.objects.filter(organization=cls.organization).order_by('id').first()
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f'USING INDEX {index}', plan)
+        # El orden sale del índice, sin ordenar en una tabla temporal
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_measurement_listings(self):
+        self.assertUsesIndex(
+            Measurement.objects.filter(organization=self.organization).order_by(*MEASUREMENT_ORDERING)[:51],
+            'measurement_org_ts_idx')
+        self.assertUsesIndex(
+            Measurement.objects.filter(device=self.device).order_by(*MEASUREMENT_ORDERING)[:20],
+            'measurement_device_ts_idx')
+
+    def test_alert_filters(self):
+        week_ago = timezone.now() - timedelta(days=7)
+        self.assertUsesIndex(
+            Alert.objects.filter(organization=self.organization, alert_date__gte=week_ago).order_by('-alert_date'),
+            'alert_org_date_idx')
+        self.assertUsesIndex(
+            Alert.objects.filter(organization=self.organization, severity='grave', alert_date__gte=week_ago),
+            'alert_org_sev_date_idx')
+        self.assertUsesIndex(Alert.objects.filter(device=self.device).order_by('-alert_date')[:10],
+                             'alert_device_date_idx')
+
+    def test_soft_deleted_rows_stay_out_of_partial_indexes(self):
+        # Sin el filtro de LiveManager la condición del índice parcial no se cumple
+        plan = Measurement.all_objects.filter(organization=self.organization).order_by(*MEASUREMENT_ORDERING).explain()
+        self.assertNotIn('measurement_org_ts_idx', plan)
+
+
+# Paginación por cursor (pagination.py)
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Pages', email='pages@example.com')
+        category = Category.objects.create(organization=cls.organization, name='Meters')
+        zone = Zone.objects.create(organization=cls.organization, name='Plant', max_capacity=10)
+        cls.device = Device.objects.create(organization=cls.organization, name='Meter', category=category,
+                                           zone=zone, power_watts=1000, consumption=0)
+        # Tres lecturas por instante: el id desempata dentro de cada timestamp
+        start = timezone.now().replace(microsecond=0) - timedelta(hours=10)
+        Measurement.objects.bulk_create(
+            Measurement(organization=cls.organization, device=cls.device, timestamp=start + timedelta(hours=hour),
+                        consumption_kwh=Decimal(hour))
+            for hour in range(10) for _ in range(3)
+        )
+        cls.user = User.objects.create_user('pages', password='pages')
+        Membership.objects.create(user=cls.user, organization=cls.organization)
+
+    def setUp(self):
+        reset_process_state()
+        self.client.force_login(self.user)
+
+    def walk(self, page_size):
+        ids, cursor = [], None
+        while True:
+            page = keyset_paginate(Measurement.objects.all(), MEASUREMENT_ORDERING, cursor, page_size)
+            ids.extend(measurement.id for measurement in page)
+            if not page.has_next:
+                return ids
+            cursor = page.next_cursor
+
+    def test_cursor_round_trip_visits_every_row_once(self):
+        expected = list(Measurement.objects.order_by(*MEASUREMENT_ORDERING).values_list('id', flat=True))
+        for page_size in (1, 4, 7, 30, 50):
+            self.assertEqual(self.walk(page_size), expected)
+
+    def test_rows_inserted_between_pages_do_not_shift_the_next_page(self):
+        first = keyset_paginate(Measurement.objects.all(), MEASUREMENT_ORDERING, None, 5)
+        Measurement.objects.create(organization=self.organization, device=self.device,
+                                   timestamp=timezone.now(), consumption_kwh=Decimal('1.000'))
+        second = keyset_paginate(Measurement.objects.all(), MEASUREMENT_ORDERING, first.next_cursor, 5)
+        expected = list(Measurement.objects.order_by(*MEASUREMENT_ORDERING).values_list('id', flat=True))
+        self.assertEqual([m.id for m in second], expected[expected.index(first.items[-1].id) + 1:][:5])
+
+    def test_tampered_cursors_are_rejected(self):
+        valid = keyset_paginate(Measurement.objects.all(), MEASUREMENT_ORDERING, None, 5).next_cursor
+        tampered = [
+            'not a cursor!',
+            valid[:-3],
+            encode_cursor(['2024-01-01T00:00:00+00:00']),
+            encode_cursor({'timestamp': '2024-01-01T00:00:00+00:00', 'id': 1}),
+            encode_cursor(['yesterday', 1]),
+            encode_cursor(['2024-01-01T00:00:00+00:00', 'one']),
+        ]
+        for cursor in tampered:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursor):
+                    keyset_paginate(Measurement.objects.all(), MEASUREMENT_ORDERING, cursor, 5)
+                # La API responde 400; el listado HTML vuelve a la primera página
+                self.assertEqual(self.client.get('/api/v1/measurements/', {'cursor': cursor}).status_code, 400)
+                response = self.client.get('/measurements/', {'cursor': cursor, 'page_size': 5})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['measurements'][0].id, self.walk(5)[0])
+
+
+# Organización de cada request (middleware.py)
+class OrganizationScopingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organizations, cls.devices, cls.users = [], [], []
+        for name in ('North', 'South'):
+            organization = Organization.objects.create(name=name, email=f'{name.lower()}@example.com')
+            category = Category.objects.create(organization=organization, name='Meters')
+            zone = Zone.objects.create(organization=organization, name='Plant', max_capacity=10)
+            cls.devices.append(Device.objects.create(organization=organization, name=f'{name} meter',
+                                                     category=category, zone=zone, power_watts=1000, consumption=0))
+            user = User.objects.create_user(name.lower(), password=name.lower())
+            Membership.objects.create(user=user, organization=organization)
+            cls.organizations.append(organization)
+            cls.users.append(user)
+        cls.outsider = User.objects.create_user('outsider', password='outsider')
+
+    def setUp(self):
+        reset_process_state()
+
+    def device_names(self):
+        return [device['name'] for device in self.client.get('/api/v1/devices/').json()['results']]
+
+    def test_members_only_see_their_organization(self):
+        for user, device, other in zip(self.users, self.devices, reversed(self.devices)):
+            with self.subTest(user=user.username):
+                self.client.force_login(user)
+                self.assertEqual(self.device_names(), [device.name])
+                self.assertEqual(self.client.get(f'/devices/{device.id}/').status_code, 200)
+                self.assertEqual(self.client.get(f'/devices/{other.id}/').status_code, 404)
+                self.assertEqual(self.client.get(f'/api/v1/devices/{other.id}/').status_code, 404)
+
+    def test_user_without_membership_sees_no_organization(self):
+        self.client.force_login(self.outsider)
+        self.assertEqual(self.device_names(), [])
+        self.assertEqual(self.client.get(f'/devices/{self.devices[0].id}/').status_code, 404)
+        self.client.logout()
+        # Sólo el visitante anónimo de la demo recibe la primera organización
+        self.assertEqual(self.device_names(), [self.devices[0].name])
+
+    def test_resolution_is_cached_and_invalidated_by_membership_changes(self):
+        user = self.users[0]
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_organization(user), self.organizations[0])
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_organization(user), self.organizations[0])
+
+        Membership.objects.filter(user=user).get().delete()
+        self.assertIsNone(resolve_organization(user))
+        Membership.objects.create(user=user, organization=self.organizations[1])
+        self.assertEqual(resolve_organization(user), self.organizations[1])
+        self.client.force_login(user)
+        self.assertEqual(self.device_names(), [self.devices[1].name])
+
+
+# Exportación en streaming (export.py)
+class MeasurementExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Export', email='export@example.com')
+        other = Organization.objects.create(name='Other', email='other@example.com')
+        cls.devices = []
+        for organization, name in ((cls.organization, 'Meter A'), (cls.organization, 'Meter B'), (other, 'Other')):
+            category, _ = Category.objects.get_or_create(organization=organization, name='Meters')
+            zone, _ = Zone.objects.get_or_create(organization=organization, name='Plant', max_capacity=10)
+            cls.devices.append(Device.objects.create(organization=organization, name=name, category=category,
+                                                     zone=zone, power_watts=1000, consumption=0))
+        cls.start = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=50)
+        Measurement.objects.bulk_create(
+            Measurement(organization=device.organization, device=device, timestamp=cls.start + timedelta(hours=hour),
+                        consumption_kwh=Decimal(hour).scaleb(-1))
+            for device in cls.devices for hour in range(50)
+        )
+        cls.user = User.objects.create_user('export', password='export')
+        Membership.objects.create(user=cls.user, organization=cls.organization)
+
+    def setUp(self):
+        reset_process_state()
+        self.client.force_login(self.user)
+
+    def export(self, **params):
+        response = self.client.get('/measurements/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def csv_rows(self, body):
+        return list(csv.reader(io.StringIO(body.decode())))
+
+    def test_csv_streams_the_organization_in_order(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('filename="measurements.csv"', response['Content-Disposition'])
+        header, *rows = self.csv_rows(body)
+        self.assertEqual(header, ['timestamp', 'device_id', 'device', 'zone', 'category', 'consumption_kwh'])
+        self.assertEqual(len(rows), 100)
+        self.assertEqual({row[2] for row in rows}, {'Meter A', 'Meter B'})
+        self.assertEqual([row[0] for row in rows], sorted(row[0] for row in rows))
+
+    def test_ndjson_and_filters(self):
+        since = self.start + timedelta(hours=10)
+        _, body = self.export(format='ndjson', device=self.devices[1].id, since=since.isoformat(),
+                              until=(since + timedelta(hours=5)).isoformat())
+        records = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([record['consumption_kwh'] for record in records], ['1.000', '1.100', '1.200', '1.300', '1.400'])
+        self.assertEqual({record['device'] for record in records}, {'Meter B'})
+
+    def test_gzip_matches_plain_output_across_chunks(self):
+        # Bloques chicos: la respuesta sale en varias partes y se comprime al vuelo
+        with mock.patch('dispositivos.export.FLUSH_BYTES', 256):
+            chunks = list(self.client.get('/measurements/export/').streaming_content)
+            response = self.client.get('/measurements/export/', {'gzip': '1'})
+            compressed = b''.join(response.streaming_content)
+        self.assertGreater(len(chunks), 10)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('filename="measurements.csv.gz"', response['Content-Disposition'])
+        self.assertEqual(gzip.decompress(compressed), b''.join(chunks))
+
+    def test_invalid_requests_are_rejected(self):
+        self.assertEqual(self.client.get('/measurements/export/', {'format': 'xml'}).status_code, 400)
+        since = self.start.isoformat()
+        self.assertEqual(self.client.get('/measurements/export/', {'since': since, 'until': since}).status_code, 400)
+        admin = User.objects.create_superuser('export-admin', password='export-admin')
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get('/measurements/export/', {'organization': 'abc'}).status_code, 400)
+        _, body = self.export(organization=self.devices[2].organization_id)
+        self.assertEqual({row[2] for row in self.csv_rows(body)[1:]}, {'Other'})
+
+
+# Comparación de resultados de la suite de benchmarks (benchmarks/suite.py)
+class BenchmarkCompareTests(SimpleTestCase):
+    def run_result(self, view_ms=10.0, queries=5, ingest_ms=100.0, rebuild_ms=50.0, views=('dashboard',)):
+        view = {'median_ms': view_ms, 'p95_ms': view_ms * 2, 'queries_cold': queries, 'queries_warm': 1,
+                'peak_memory_kb': 512.0}
+        return {'sizes': {'small': {
+            'views': {label: dict(view) for label in views},
+            'ingestion': {'elapsed_ms': ingest_ms, 'queries_per_batch': 4, 'peak_memory_kb': 2048.0},
+            'rollups': {'incremental_ms': 5.0, 'rebuild_ms': rebuild_ms},
+        }}}
+
+    def regressions(self, current, threshold=0.2):
+        return {(item['section'], item['name'], item['metric']): item['change']
+                for item in suite.compare(self.run_result(), current, threshold)}
+
+    def test_identical_or_faster_runs_pass(self):
+        self.assertEqual(self.regressions(self.run_result()), {})
+        self.assertEqual(self.regressions(self.run_result(view_ms=5.0, queries=3, ingest_ms=50.0)), {})
+        # Dentro del umbral
+        self.assertEqual(self.regressions(self.run_result(view_ms=11.9, rebuild_ms=59.0)), {})
+
+    def test_slowdowns_beyond_threshold_are_flagged(self):
+        self.assertEqual(self.regressions(self.run_result(view_ms=15.0, rebuild_ms=100.0)), {
+            ('view', 'dashboard', 'median_ms'): '+50%',
+            ('view', 'dashboard', 'p95_ms'): '+50%',
+            ('rollups', 'build_rollups', 'rebuild_ms'): '+100%',
+        })
+        self.assertEqual(self.regressions(self.run_result(view_ms=15.0), threshold=0.6), {})
+
+    def test_any_extra_query_is_a_regression(self):
+        self.assertEqual(self.regressions(self.run_result(queries=6)), {('view', 'dashboard', 'queries_cold'): '+20%'})
+        baseline = self.run_result(queries=0)
+        self.assertEqual([item['change'] for item in suite.compare(baseline, self.run_result(queries=1), 0.2)],
+                         ['new'])
+
+    def test_views_missing_from_either_run_are_ignored(self):
+        self.assertEqual(self.regressions(self.run_result(view_ms=100.0, views=('device_list',))), {})
+
+    def test_command_line_exit_status(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        paths = {}
+        for name, result in (('before', self.run_result()), ('same', self.run_result()),
+                             ('slower', self.run_result(ingest_ms=300.0))):
+            paths[name] = f'{directory}/{name}.json'
+            with open(paths[name], 'w') as output:
+                json.dump(result, output)
+        for current, status in (('same', 0), ('slower', 1)):
+            with self.subTest(current=current), \
+                    mock.patch('sys.argv', ['suite.py', '--compare', paths['before'], paths[current]]), \
+                    mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                with self.assertRaises(SystemExit) as exit_status:
+                    suite.main()
+            self.assertEqual(exit_status.exception.code, status)
+            self.assertIn(f'{status} regressions', stdout.getvalue())
+
+
+# Lecturas empaquetadas en ReadingBlock (columnar.py)
+class ColumnarTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Columnar', email='columnar@example.com')
+        category = Category.objects.create(organization=cls.organization, name='Meters')
+        zone = Zone.objects.create(organization=cls.organization, name='Plant', max_capacity=10)
+        cls.device = Device.objects.create(
+            organization=cls.organization, name='Meter', category=category, zone=zone,
+            power_watts=1000, consumption=0,
+        )
+        cls.now = timezone.now().replace(microsecond=0)
+        Measurement.objects.bulk_create(
+            Measurement(
+                organization=cls.organization, device=cls.device,
+                timestamp=cls.now - timedelta(hours=hours, minutes=7),
+                consumption_kwh=Decimal('1.250') + Decimal(hours % 5),
+            )
+            for hours in range(1, 24 * 5)
+        )
+
+    def consume(self):
+        """Deja a los consumidores por id al día, como lo harían sus cron."""
+        update_rollups()
+        detect_anomalies()
+
+    def hourly_rollups(self):
+        return sorted(DeviceRollup.objects.filter(period='hour').values_list(
+            'bucket_start', 'total_kwh', 'min_kwh', 'max_kwh', 'reading_count'))
+
+    def series(self):
+        return read_series(lambda queryset: queryset.filter(device=self.device),
+                           self.now - timedelta(days=7), self.now)
+
+    def test_encode_decode_round_trip(self):
+        ms = np.array([1_700_000_000_000, 1_700_000_000_001, 1_700_000_900_000, 1_700_086_400_000], dtype=np.int64)
+        wh = np.array([0, 1, 123_456_789, 7], dtype=np.int64)
+        timestamps, values = encode(ms, wh)
+        decoded_ms, decoded_wh = decode(int(ms[0]), len(ms), timestamps, values)
+        np.testing.assert_array_equal(decoded_ms, ms)
+        np.testing.assert_array_equal(decoded_wh, wh)
+
+    def test_single_reading_round_trip(self):
+        timestamps, values = encode(np.array([42], dtype=np.int64), np.array([5], dtype=np.int64))
+        decoded_ms, decoded_wh = decode(42, 1, timestamps, values)
+        self.assertEqual(decoded_ms.tolist(), [42])
+        self.assertEqual(decoded_wh.tolist(), [5])
+
+    def test_packs_only_what_every_consumer_processed(self):
+        update_rollups()
+        self.assertEqual(pack_measurements(delete_rows=True)['readings'], 0)
+        detect_anomalies()
+        self.assertGreater(pack_measurements(delete_rows=True)['readings'], 0)
+
+    def test_packed_series_matches_rows(self):
+        self.consume()
+        expected_ms, expected_kwh = self.series()
+        pack_measurements(delete_rows=True)
+        self.assertTrue(ReadingBlock.objects.exists())
+        ms, kwh = self.series()
+        np.testing.assert_array_equal(ms, expected_ms)
+        np.testing.assert_allclose(kwh, expected_kwh)
+
+    def test_late_reading_merges_into_packed_day(self):
+        self.consume()
+        pack_measurements(delete_rows=True)
+        block = ReadingBlock.objects.order_by('day').first()
+        late_at = timezone.make_aware(datetime.combine(block.day, time(0, 1)))
+        Measurement.objects.create(organization=self.organization, device=self.device,
+                                   timestamp=late_at, consumption_kwh=Decimal('9.999'))
+
+        # Antes de volver a empaquetar se lee de la fila
+        ms, kwh = self.series()
+        self.assertIn(late_at.timestamp(), ms.tolist())
+        total = kwh.sum()
+
+        self.consume()
+        pack_measurements(delete_rows=True)
+        block.refresh_from_db()
+        self.assertFalse(Measurement.objects.filter(timestamp=late_at).exists())
+        block_ms, block_wh = decode(block.base_ms, block.reading_count, block.timestamps, block.values)
+        self.assertEqual(block_ms[0], int(late_at.timestamp() * 1000))
+        self.assertEqual(block_wh[0], 9999)
+        self.assertTrue(np.all(np.diff(block_ms) >= 0))
+        ms, kwh = self.series()
+        self.assertAlmostEqual(kwh.sum(), total)
+        self.assertEqual(ms.tolist().count(late_at.timestamp()), 1)
+
+    def test_rebuild_and_export_read_packed_rows(self):
+        self.consume()
+        expected = self.hourly_rollups()
+        rows = list(export_history(lambda queryset: queryset.filter(organization=self.organization)))
+        pack_measurements(delete_rows=True)
+        self.assertLess(Measurement.objects.count(), len(rows))
+
+        rebuild_rollups()
+        self.assertEqual(self.hourly_rollups(), expected)
+        exported = list(export_history(lambda queryset: queryset.filter(organization=self.organization)))
+        self.assertEqual([row[0] for row in exported], [row[0] for row in rows])
+        self.assertEqual(sum(row[-1] for row in exported), sum(row[-1] for row in rows))
+
+    def test_soft_deleted_device_hidden_from_blocks(self):
+        self.consume()
+        pack_measurements(delete_rows=True)
+        self.device.soft_delete()
+        ms, _ = self.series()
+        self.assertEqual(len(ms), 0)
+        self.assertEqual(list(export_history(lambda queryset: queryset.filter(organization=self.organization))), [])
+        self.assertFalse(DeviceRollup.objects.exists())
+        self.assertFalse(ZoneRollup.objects.exists())
+
+
+# Analítica vectorizada de consumo (analytics.py)
+class AnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Analytics', email='analytics@example.com')
+        category = Category.objects.create(organization=cls.organization, name='Meters')
+        cls.zone = Zone.objects.create(organization=cls.organization, name='Plant', max_capacity=1)
+        cls.device = Device.objects.create(organization=cls.organization, name='Meter', category=category,
+                                           zone=cls.zone, power_watts=2000, consumption=0)
+        # Dos lecturas por hora durante 3 días; el consumo sigue la hora del día
+        now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        moments = [now - timedelta(hours=hour, minutes=minute) for hour in range(1, 73) for minute in (15, 45)]
+        cls.readings = [(moment, Decimal(moment.hour).scaleb(-2)) for moment in moments]
+        Measurement.objects.bulk_create(
+            Measurement(organization=cls.organization, device=cls.device, timestamp=timestamp, consumption_kwh=kwh)
+            for timestamp, kwh in cls.readings
+        )
+        cls.user = User.objects.create_user('analytics', password='analytics')
+        Membership.objects.create(user=cls.user, organization=cls.organization)
+
+    def setUp(self):
+        reset_process_state()
+        self.client.force_login(self.user)
+
+    def test_series_stats_match_a_plain_python_reference(self):
+        timestamps = np.array([int(timestamp.timestamp()) for timestamp, _ in self.readings])
+        kwh = np.array([float(value) for _, value in self.readings])
+        start, hours = int(timestamps.min()) // 3600 * 3600, 72
+        stats = series_stats(timestamps, kwh, start, hours, rated_kw=2, capacity_kw=1)
+
+        hourly = [0.0] * hours
+        for timestamp, value in zip(timestamps, kwh):
+            hourly[(timestamp - start) // 3600] += value
+        self.assertEqual(stats['readings'], len(self.readings))
+        self.assertAlmostEqual(stats['total_kwh'], round(sum(kwh), 3))
+        self.assertAlmostEqual(stats['peak_kw'], round(max(hourly), 3))
+        self.assertEqual(stats['peak_hour'], 23)
+        self.assertAlmostEqual(stats['rolling_24h_kw']['latest'], round(sum(hourly[-24:]) / 24, 3))
+        self.assertAlmostEqual(stats['load_factor'], round(sum(hourly) / hours / 2, 4))
+        self.assertEqual(stats['utilization']['hours_over_capacity'], sum(1 for value in hourly if value > 1))
+        self.assertEqual(rolling_mean(np.arange(5.0), 2).tolist(), [0.5, 1.5, 2.5, 3.5])
+        self.assertEqual(rolling_mean(np.arange(3.0), 4).size, 0)
+
+    def test_api_reads_packed_days_and_scopes_by_organization(self):
+        device = self.client.get(f'/api/devices/{self.device.id}/analytics/', {'days': 7}).json()
+        zone = self.client.get(f'/api/zones/{self.zone.id}/analytics/', {'days': 7}).json()
+        self.assertEqual(device['readings'], len(self.readings))
+        self.assertEqual(zone['total_kwh'], device['total_kwh'])
+        self.assertIn('hours_over_capacity', zone['utilization'])
+
+        # Los días empaquetados dan las mismas estadísticas
+        update_rollups()
+        detect_anomalies()
+        pack_measurements(after_days=1, delete_rows=True)
+        self.assertLess(Measurement.objects.count(), len(self.readings))
+        packed = self.client.get(f'/api/devices/{self.device.id}/analytics/', {'days': 7}).json()
+        self.assertEqual(packed, device)
+
+        outsider = User.objects.create_user('analytics-outsider', password='outsider')
+        other = Organization.objects.create(name='Elsewhere', email='elsewhere@example.com')
+        Membership.objects.create(user=outsider, organization=other)
+        self.client.force_login(outsider)
+        self.assertEqual(self.client.get(f'/api/devices/{self.device.id}/analytics/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/zones/{self.zone.id}/analytics/').status_code, 404)
+
+
+# Detección de dispositivos sin reportar (presence.py)
+class OfflineSweepTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Presence', email='presence@example.com')
+        category = Category.objects.create(organization=cls.organization, name='Meters')
+        zone = Zone.objects.create(organization=cls.organization, name='Plant', max_capacity=10)
+        cls.now = timezone.now()
+        cls.devices = {}
+        for name, silence, status in (
+            ('fresh', 5, 'active'), ('late', 50, 'active'), ('silent', 150, 'active'),
+            ('maintenance', 150, 'maintenance'), ('deleted', 150, 'active'), ('never', None, 'active'),
+        ):
+            device = Device.objects.create(organization=cls.organization, name=name, category=category, zone=zone,
+                                           power_watts=1000, consumption=0, status=status)
+            if silence is not None:
+                Measurement.objects.create(organization=cls.organization, device=device,
+                                           timestamp=cls.now - timedelta(minutes=silence),
+                                           consumption_kwh=Decimal('1.000'))
+            cls.devices[name] = device
+        backfill_last_seen(cls.organization)
+        cls.devices['deleted'].soft_delete()
+
+    def sweep(self, **options):
+        return {alert.device_id: alert.severity
+                for alert in sweep_offline_devices(offline_after=timedelta(minutes=30), now=self.now, **options)}
+
+    def offline_alerts(self, status='active'):
+        return Alert.objects.filter(alert_type='device_offline', status=status)
+
+    def test_sweep_flags_silent_active_devices_once(self):
+        expected = {self.devices['late'].id: 'media', self.devices['silent'].id: 'grave'}
+        self.assertEqual(self.sweep(dry_run=True), expected)
+        self.assertFalse(self.offline_alerts().exists())
+
+        with self.assertNumQueries(1):
+            list(offline_devices(timedelta(minutes=30), self.now))
+        self.assertEqual(self.sweep(), expected)
+        self.assertEqual(self.offline_alerts().count(), 2)
+        # Ya alertados: el siguiente barrido no duplica
+        self.assertEqual(self.sweep(), {})
+
+        self.now += timedelta(minutes=100)
+        self.assertEqual(self.sweep(), {self.devices['fresh'].id: 'alta'})
+
+    def test_new_reading_resolves_alert_and_late_reading_does_not_rewind(self):
+        self.sweep()
+        device = self.devices['silent']
+        reading = Measurement(organization=self.organization, device=device, timestamp=self.now,
+                              consumption_kwh=Decimal('2.500'))
+        late = Measurement(organization=self.organization, device=device,
+                           timestamp=self.now - timedelta(minutes=90), consumption_kwh=Decimal('9.000'))
+        touch_last_seen([reading, late])
+        device.refresh_from_db()
+        self.assertEqual((device.last_seen_at, device.last_reading_kwh), (self.now, Decimal('2.500')))
+        self.assertEqual(list(self.offline_alerts('resolved').values_list('device_id', flat=True)), [device.id])
+
+        touch_last_seen([late])
+        device.refresh_from_db()
+        self.assertEqual(device.last_seen_at, self.now)
+
+        # Vuelve a callar: una alerta nueva, posterior a la última lectura
+        self.now += timedelta(minutes=45)
+        self.assertEqual(self.sweep(), {device.id: 'media', self.devices['fresh'].id: 'media'})
+
+
+# Carga por zona en memoria (zoneload.py)
+class ZoneLoadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Load', email='load@example.com')
+        cls.category = Category.objects.create(organization=cls.organization, name='Meters')
+        cls.zones = [Zone.objects.create(organization=cls.organization, name=name, max_capacity=capacity)
+                     for name, capacity in (('East', 5), ('West', 2))]
+        cls.devices = [
+            Device.objects.create(organization=cls.organization, name=f'Meter {number}', category=cls.category,
+                                  zone=cls.zones[number % 2], power_watts=1000, consumption=1000 * (number + 1))
+            for number in range(4)
+        ]
+
+    def setUp(self):
+        reset_process_state()
+
+    def assertMatchesReconcile(self):
+        """El estado incremental del tracker global coincide con uno recién cargado de la base."""
+        fresh = ZoneLoadTracker()
+        self.assertEqual(zone_load.snapshot(self.organization.id), fresh.snapshot(self.organization.id))
+
+    def test_incremental_updates_match_reconcile(self):
+        before = {zone['name']: zone for zone in zone_load.snapshot(self.organization.id)}
+        self.assertEqual((before['East']['device_kw'], before['West']['device_kw']), (4.0, 6.0))
+        self.assertEqual(before['West']['status'], 'over')
+
+        device = self.devices[0]
+        device.consumption = 2500
+        device.save()
+        self.assertMatchesReconcile()
+        device.status = 'inactive'
+        device.save()
+        self.assertMatchesReconcile()
+        moved = self.devices[1]
+        moved.zone = self.zones[0]
+        moved.save()
+        self.assertMatchesReconcile()
+        self.devices[2].soft_delete()
+        self.assertMatchesReconcile()
+        self.devices[3].delete()
+        self.assertMatchesReconcile()
+        Device.objects.create(organization=self.organization, name='New', category=self.category,
+                              zone=self.zones[1], power_watts=1000, consumption=1500)
+        zone = self.zones[1]
+        zone.max_capacity = 10
+        zone.save()
+        self.assertMatchesReconcile()
+
+        # Lecturas de la última hora, como las suma la ingesta al confirmar
+        readings = Measurement.objects.bulk_create(
+            Measurement(organization=self.organization, device=moved,
+                        timestamp=timezone.now() - timedelta(minutes=minutes), consumption_kwh=Decimal('0.750'))
+            for minutes in (5, 20, 40, 90)
+        )
+        zone_load.add_measurements(readings)
+        self.assertMatchesReconcile()
+        east = {zone['name']: zone for zone in zone_load.snapshot(self.organization.id)}['East']
+        self.assertEqual(east['measured_kw'], 2.25)
+
+    def test_changes_without_signals_wait_for_reconcile(self):
+        zone_load.snapshot(self.organization.id)
+        Device.objects.filter(pk=self.devices[1].pk).update(consumption=0)
+        self.assertEqual({zone['name']: zone['device_kw'] for zone in zone_load.snapshot(self.organization.id)},
+                         {'East': 4.0, 'West': 6.0})
+        with mock.patch('dispositivos.zoneload.time.monotonic',
+                        return_value=time_module.monotonic() + zone_load.reconcile_seconds + 1):
+            self.assertEqual({zone['name']: zone['device_kw'] for zone in zone_load.snapshot(self.organization.id)},
+                             {'East': 4.0, 'West': 4.0})
+        self.assertMatchesReconcile()
+
+
+# Feed en vivo por server-sent events (events.py)
+class LiveFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Live', email='live@example.com')
+        category = Category.objects.create(organization=cls.organization, name='Meters')
+        zone = Zone.objects.create(organization=cls.organization, name='Plant', max_capacity=4)
+        cls.device = Device.objects.create(organization=cls.organization, name='Meter', category=category,
+                                           zone=zone, power_watts=1000, consumption=1000)
+        cls.user = User.objects.create_user('live', password='live')
+        Membership.objects.create(user=cls.user, organization=cls.organization)
+
+    def setUp(self):
+        reset_process_state()
+
+    def test_wsgi_answers_one_batch_without_subscribing(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/api/live/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        retry, event = response.content.decode().split('\n\n', 1)
+        self.assertEqual(retry, f'retry: {LIVE_FEED_RETRY_MS}')
+        event_type, data = event.strip().split('\n')
+        self.assertEqual(event_type, 'event: zone_load')
+        zones = json.loads(data.removeprefix('data: '))['zones']
+        self.assertEqual([(zone['name'], zone['device_kw'], zone['utilization']) for zone in zones],
+                         [('Plant', 1.0, 0.25)])
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    def test_wsgi_without_organization(self):
+        self.client.force_login(User.objects.create_user('live-outsider', password='outsider'))
+        self.assertEqual(self.client.get('/api/live/').status_code, 404)
+
+    async def test_asgi_streams_published_events(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        response = await client.get('/api/live/')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['X-Accel-Buffering'], 'no')
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'event: zone_load\n'))
+        self.assertEqual(broker.subscriber_count(), 1)
+
+        broker.publish(self.organization.id, 'alert', {'device': self.device.id, 'severity': 'grave'})
+        self.assertEqual(await anext(stream),
+                         format_event('alert', {'device': self.device.id, 'severity': 'grave'}).encode())
+        # Al desconectarse el cliente, el handler ASGI cancela la lectura pendiente
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(broker.subscriber_count(), 0)
+
+
+# Pronóstico sobre agregados atrasados (forecasting.py)
+class ForecastTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Forecast', email='forecast@example.com')
+        category = Category.objects.create(organization=cls.organization, name='Loads')
+        cls.zone = Zone.objects.create(organization=cls.organization, name='Hall', max_capacity=10)
+        cls.device = Device.objects.create(
+            organization=cls.organization, name='Constant', category=category, zone=cls.zone,
+            power_watts=5000, consumption=0,
+        )
+        cls.now = timezone.now().replace(minute=30, second=0, microsecond=0)
+
+    def readings(self, hours):
+        Measurement.objects.bulk_create(
+            Measurement(organization=self.organization, device=self.device,
+                        timestamp=self.now - timedelta(hours=hour), consumption_kwh=Decimal('5.000'))
+            for hour in hours
+        )
+        update_rollups()
+
+    def test_hours_not_yet_rolled_up_are_not_fitted(self):
+        self.readings(range(12, 24 * 20))
+        lagging = zone_forecast(self.zone, now=self.now)
+        self.assertAlmostEqual(lagging['peak_kw'], 5.0, places=3)
+
+        self.readings(range(0, 12))
+        later = self.now + timedelta(hours=1)
+        incremental = zone_forecast(self.zone, now=later)
+        refit = refresh('zone', [self.zone], now=later, refit=True)[self.zone.pk]
+        self.assertAlmostEqual(incremental['peak_kw'], 5.0, places=3)
+        self.assertAlmostEqual(refit.level, 5.0, places=3)
+
+    def test_forecast_api_does_not_write_state(self):
+        self.readings(range(0, 24 * 3))
+        for url in (f'/api/zones/{self.zone.pk}/forecast/', f'/api/devices/{self.device.pk}/forecast/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertFalse(ForecastState.objects.exists())
+
+    def test_owner_without_rollups_reports_no_data(self):
+        silent = Device.objects.create(organization=self.organization, name='Silent', category=self.device.category,
+                                       zone=self.zone, power_watts=1000, consumption=0)
+        for url in (f'/api/zones/{self.zone.pk}/forecast/', f'/api/devices/{silent.pk}/forecast/'):
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(data['status'], 'no_data')
+                self.assertIsNone(data['peak_kw'])
+                self.assertIsNone(data['hours_at_risk'])
+                self.assertEqual(data['hours'], [])
+
+        self.readings(range(0, 24 * 3))
+        self.assertEqual(self.client.get(f'/api/devices/{silent.pk}/forecast/').json()['status'], 'no_data')
+        data = self.client.get(f'/api/devices/{self.device.pk}/forecast/').json()
+        self.assertNotEqual(data['status'], 'no_data')
+        self.assertAlmostEqual(data['peak_kw'], 5.0, places=3)
+
+
+# Ingesta masiva por /measurements/ingest/ (ingestion.py)
+class IngestTests(TestCase):
+    url = '/measurements/ingest/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Ingest', email='ingest@example.com')
+        other = Organization.objects.create(name='Other', email='other@example.com')
+        for organization in (cls.organization, other):
+            category = Category.objects.create(organization=organization, name='Meters')
+            zone = Zone.objects.create(organization=organization, name='Plant', max_capacity=10)
+            Device.objects.create(organization=organization, name='Meter', category=category, zone=zone,
+                                  power_watts=1000, consumption=0)
+        cls.device = Device.objects.get(organization=cls.organization)
+        cls.foreign = Device.objects.get(organization=other)
+        cls.user = User.objects.create_user('gateway', password='gateway')
+        Membership.objects.create(user=cls.user, organization=cls.organization)
+
+    def setUp(self):
+        reset_process_state()
+        self.client.force_login(self.user)
+
+    def post(self, readings, content_type='application/json'):
+        body = readings if isinstance(readings, str) else json.dumps(readings)
+        return self.client.post(self.url, data=body, content_type=content_type)
+
+    def test_accepts_json_and_csv_rows(self):
+        response = self.post([{'device': self.device.pk, 'consumption_kwh': '1.5',
+                               'timestamp': '2024-01-01T00:00:00Z'}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 1)
+        response = self.post(f'device,consumption_kwh,timestamp\n{self.device.pk},2.25,2024-01-01T01:00:00Z\n',
+                             content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(Measurement.objects.values_list('consumption_kwh', flat=True)),
+                         [Decimal('1.500'), Decimal('2.250')])
+
+    def test_rejects_invalid_rows_individually(self):
+        response = self.post({'readings': [
+            {'device': self.device.pk, 'consumption_kwh': '1'},
+            {'device': 'abc', 'consumption_kwh': '1'},
+            {'device': self.device.pk, 'consumption_kwh': '-1'},
+            {'device': self.device.pk, 'consumption_kwh': '1', 'timestamp': 'yesterday'},
+        ]})
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['created'], 1)
+        self.assertEqual([row['row'] for row in data['rejected']], [2, 3, 4])
+
+    def test_rejects_devices_of_other_organizations(self):
+        response = self.post([{'device': self.foreign.pk, 'consumption_kwh': '1'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['rejected'],
+                         [{'row': 1, 'error': f'device {self.foreign.pk} does not exist'}])
+        self.assertFalse(Measurement.objects.exists())
+
+    def test_refuses_anonymous_and_users_without_organization(self):
+        reading = [{'device': self.device.pk, 'consumption_kwh': '1'}]
+        self.client.logout()
+        self.assertEqual(self.post(reading).status_code, 401)
+        self.client.force_login(User.objects.create_user('stranger', password='stranger'))
+        self.assertEqual(self.post(reading).status_code, 403)
+        self.assertFalse(Measurement.objects.exists())
+
+    def test_refuses_other_content_types(self):
+        reading = json.dumps([{'device': self.device.pk, 'consumption_kwh': '1'}])
+        for content_type in ('text/plain', 'application/x-www-form-urlencoded'):
+            with self.subTest(content_type=content_type):
+                self.assertEqual(self.post(reading, content_type=content_type).status_code, 415)
+        self.assertFalse(Measurement.objects.exists())
+
+
+# Informes mensuales incrementales (reports.py)
+class MonthlyReportTests(TestCase):
+    months = (datetime(2024, 1, 1).date(), datetime(2024, 2, 1).date(), datetime(2024, 3, 1).date())
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Reports', email='reports@example.com')
+        category = Category.objects.create(organization=cls.organization, name='Meters')
+        zone = Zone.objects.create(organization=cls.organization, name='Plant', max_capacity=10)
+        cls.device = Device.objects.create(organization=cls.organization, name='Meter', category=category,
+                                           zone=zone, power_watts=1000, consumption=0)
+        Measurement.objects.bulk_create(
+            Measurement(organization=cls.organization, device=cls.device,
+                        timestamp=timezone.make_aware(datetime.combine(month.replace(day=15), time(hour))),
+                        consumption_kwh=Decimal('2.000'))
+            for month in cls.months for hour in range(24)
+        )
+        update_rollups()
+
+    def age(self):
+        """Deja los agregados antes del margen ``REFRESH_OVERLAP`` del último cálculo."""
+        DeviceRollup.objects.update(updated_at=F('updated_at') - REFRESH_OVERLAP * 2)
+
+    def test_first_refresh_builds_every_month(self):
+        self.assertEqual(refresh_reports(self.organization.id), list(self.months))
+        self.assertEqual(sorted(MonthlyReport.objects.values_list('month', 'total_kwh')),
+                         [(month, Decimal('48.000')) for month in self.months])
+
+    def test_late_reading_regenerates_only_its_month(self):
+        refresh_reports(self.organization.id)
+        self.age()
+        untouched = dict(MonthlyReport.objects.values_list('month', 'updated_at'))
+        since = MonthlyReport.objects.first().source_until
+        self.assertEqual(dirty_months(self.organization.id, since), [])
+        self.assertEqual(refresh_reports(self.organization.id), [])
+
+        Measurement.objects.create(organization=self.organization, device=self.device,
+                                   timestamp=timezone.make_aware(datetime(2024, 2, 20, 12)),
+                                   consumption_kwh=Decimal('5.000'))
+        update_rollups()
+        self.assertEqual(dirty_months(self.organization.id, since), [self.months[1]])
+        self.assertEqual(refresh_reports(self.organization.id), [self.months[1]])
+
+        reports = {report.month: report for report in MonthlyReport.objects.all()}
+        self.assertEqual(reports[self.months[1]].total_kwh, Decimal('53.000'))
+        self.assertEqual(reports[self.months[1]].reading_count, 25)
+        for month in (self.months[0], self.months[2]):
+            self.assertEqual(reports[month].updated_at, untouched[month])
+
+
+# Generador de datos sintéticos (loadgen.py)
+class LoadGeneratorTests(TestCase):
+    options = ('--organizations', '1', '--zones', '2', '--devices', '3', '--days', '1', '--interval', '3600')
+
+    def setUp(self):
+        reset_process_state()
+
+    def readings(self):
+        return list(Measurement.objects.order_by('timestamp', 'device__name').values_list(
+            'device__name', 'timestamp', 'consumption_kwh'))
+
+    def test_fixed_start_is_reproducible(self):
+        call_command('generate_load_data', *self.options, '--start', '2024-03-01', stdout=io.StringIO())
+        first = self.readings()
+        self.assertEqual(first[0][1], timezone.make_aware(datetime(2024, 3, 1)))
+        self.assertEqual(len(first), 24 * 3)
+        call_command('generate_load_data', *self.options, '--start', '2024-03-01', '--clear', stdout=io.StringIO())
+        self.assertEqual(self.readings(), first)
+
+    def test_generate_invalidates_cached_blocks_and_search_index(self):
+        warmed = []
+
+        def progress(done, expected, elapsed):
+            # A mitad de la carga alguien lee el dashboard y busca: ambos quedan en caché
+            if not warmed:
+                organization = Organization.objects.get()
+                warmed.append(cached_block(organization, 'dashboard_stats', lambda: dashboard_stats(organization)))
+                search_index.search(organization.id)
+
+        loadgen.generate(zones=2, devices=3, days=1, interval=3600, alert_rate=0.5, chunk_size=3, progress=progress)
+        organization = Organization.objects.get()
+        stats = cached_block(organization, 'dashboard_stats', lambda: dashboard_stats(organization))
+        self.assertLess(sum(warmed[0]['alerts_by_severity'].values()), Alert.objects.count())
+        self.assertEqual(sum(stats['alerts_by_severity'].values()), Alert.objects.count())
+        self.assertNotIn(organization.id, search_index.organizations)
+
+
+# Trabajos en procesos (jobs.py): necesitan datos confirmados, visibles desde los workers
+class JobTests(TransactionTestCase):
+    def setUp(self):
+        reset_process_state()
+        loadgen.generate(organizations=3, zones=2, devices=6, days=40, interval=6 * 3600, alert_rate=0.05)
+        update_rollups()
+
+    def run_job(self, *args, **options):
+        call_command('run_job', 'monthly_reports', *args, workers=2, stdout=io.StringIO(), stderr=io.StringIO(),
+                     **options)
+        return JobRun.objects.first()
+
+    def test_runs_with_two_workers_and_resumes(self):
+        run = self.run_job()
+        self.assertEqual(run.status, 'completed')
+        self.assertEqual(run.shards.filter(status='done').count(), 3)
+        organizations = list(Organization.objects.order_by('id').values_list('id', flat=True))
+        self.assertEqual(set(MonthlyReport.objects.values_list('organization_id', flat=True)), set(organizations))
+
+        # Interrupción a mitad: un fragmento quedó pendiente y sin informes
+        interrupted = run.shards.get(key=f'organization:{organizations[0]}')
+        JobRun.objects.filter(pk=run.pk).update(status='running')
+        run.shards.filter(pk=interrupted.pk).update(status='pending', result=None)
+        MonthlyReport.objects.filter(organization_id=organizations[0]).delete()
+        finished = dict(run.shards.exclude(pk=interrupted.pk).values_list('pk', 'updated_at'))
+
+        resumed = self.run_job(resume=True)
+        self.assertEqual(resumed.pk, run.pk)
+        self.assertEqual(resumed.status, 'completed')
+        self.assertTrue(MonthlyReport.objects.filter(organization_id=organizations[0]).exists())
+        self.assertEqual(dict(run.shards.exclude(pk=interrupted.pk).values_list('pk', 'updated_at')), finished)
+
+        # Sin --resume empieza una ejecución nueva con todos los fragmentos
+        self.assertNotEqual(self.run_job().pk, run.pk)
+
+    def test_retries_shard_when_sqlite_is_locked(self):
+        calls = []
+
+        def flaky(shard):
+            calls.append(shard)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        with mock.patch.dict(jobs.JOBS, {'flaky': (flaky, ('organization',), ())}), \
+                mock.patch.object(jobs.time, 'sleep'):
+            _, result = jobs._run_shard('flaky', {'organization': 1}, {})
+        self.assertEqual(result, 'ok')
+        self.assertEqual(len(calls), 3)
+
+
+# Conteos del dashboard (services.py)
+class DashboardStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Stats', email='stats@example.com')
+        category = Category.objects.create(organization=cls.organization, name='Meters')
+        zone = Zone.objects.create(organization=cls.organization, name='Plant', max_capacity=10)
+        cls.devices = [
+            Device.objects.create(organization=cls.organization, name=f'Meter {number}', category=category,
+                                  zone=zone, power_watts=1000, consumption=0)
+            for number in range(3)
+        ]
+        cls.user = User.objects.create_user('stats', password='stats')
+        Membership.objects.create(user=cls.user, organization=cls.organization)
+
+    def setUp(self):
+        reset_process_state()
+        self.client.force_login(self.user)
+
+    def test_soft_deleted_devices_are_not_counted(self):
+        self.assertEqual(self.client.get('/api/dashboard/').json()['devices_by_zone'], {'Plant': 3})
+        self.devices[0].soft_delete()
+        stats = dashboard_stats(self.organization)
+        self.assertEqual(stats['devices_by_category'], {'Meters': 2})
+        self.assertEqual(stats['devices_by_zone'], {'Plant': 2})
+        # El bloque cacheado se invalida con el borrado lógico
+        self.assertEqual(self.client.get('/api/dashboard/').json()['devices_by_category'], {'Meters': 2})
+
+
+# Bloque cacheado del resumen de alertas (caching.py)
+class AlertSummaryCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Summary', email='summary@example.com')
+        category = Category.objects.create(organization=cls.organization, name='Meters')
+        zone = Zone.objects.create(organization=cls.organization, name='Plant', max_capacity=10)
+        cls.device = Device.objects.create(organization=cls.organization, name='Meter', category=category,
+                                           zone=zone, power_watts=1000, consumption=0)
+        cls.user = User.objects.create_user('summary', password='summary')
+        Membership.objects.create(user=cls.user, organization=cls.organization)
+        cls.alert().save()
+
+    @classmethod
+    def alert(cls, severity='grave'):
+        return Alert(organization=cls.organization, device=cls.device, alert_type='anomaly', severity=severity,
+                     message='Consumo fuera de lo normal', alert_date=timezone.now())
+
+    def setUp(self):
+        reset_process_state()
+        self.client.force_login(self.user)
+
+    def recent(self):
+        return self.client.get('/alerts/').context['recent_alerts']
+
+    def test_block_holds_plain_values(self):
+        cache = get_cache()
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            recent = self.recent()
+        (_, value, _), _ = next(args for args in cache_set.call_args_list if args[0][0].endswith(':alert_summary'))
+        self.assertEqual(value, recent)
+        self.assertEqual(type(value[0]), dict)
+        self.assertEqual((value[0]['device__name'], value[0]['type_label']), ('Meter', 'Anomaly'))
+        self.assertContains(self.client.get('/alerts/'), f'/devices/{self.device.id}/')
+
+    def test_saved_alert_invalidates_block(self):
+        self.assertEqual(len(self.recent()), 1)
+        self.alert(severity='media').save()
+        self.assertEqual([alert['severity'] for alert in self.recent()], ['media', 'grave'])
+
+    def test_invalidation_from_another_process_reaches_shared_cache(self):
+        location = self.enterContext(tempfile.TemporaryDirectory())
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+        with override_settings(CACHES={'default': shared}):
+            self.assertEqual(len(self.recent()), 1)
+            # bulk_create no emite señales: el bloque queda viejo hasta que alguien invalide
+            Alert.objects.bulk_create([self.alert()])
+            self.assertEqual(len(self.recent()), 1)
+
+            # Como build_rollups o detect_anomalies corriendo en otro proceso
+            worker = multiprocessing.get_context('fork').Process(
+                target=invalidate_organization_blocks, args=(self.organization.id,))
+            worker.start()
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+            self.assertEqual(len(self.recent()), 2)
+
+
+# Ventanas deslizantes y reglas de alertas en la ingesta (rules.py)
+class RuleEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Rules', email='rules@example.com')
+        category = Category.objects.create(organization=cls.organization, name='Meters')
+        zone = Zone.objects.create(organization=cls.organization, name='Plant', max_capacity=100)
+        cls.device = Device.objects.create(organization=cls.organization, name='Meter', category=category,
+                                           zone=zone, power_watts=1000, consumption=0)
+        cls.start = timezone.now().replace(microsecond=0) - timedelta(days=1)
+
+    def reading(self, minutes, kwh):
+        return Measurement(organization=self.organization, device=self.device,
+                           timestamp=self.start + timedelta(minutes=minutes), consumption_kwh=Decimal(kwh))
+
+    def evaluate(self, engine, *readings):
+        with self.captureOnCommitCallbacks(execute=True):
+            return engine.evaluate(list(readings))
+
+    def test_window_sums_and_expires(self):
+        window = RollingWindow(3600)
+        window.add(0, 1.0)
+        window.add(1800, 2.0)
+        self.assertEqual(window.total, 3.0)
+        self.assertEqual(window.average_kw(), 3.0)
+        window.add(3600, 4.0)  # la lectura de 0 queda justo fuera
+        self.assertEqual(window.total, 6.0)
+        self.assertEqual(RollingWindow(1800).average_kw(), 0.0)
+
+    def test_late_reading_expires_in_order(self):
+        window = RollingWindow(3600)
+        window.add(0, 1.0)
+        window.add(1800, 1.0)
+        window.add(600, 5.0)   # atrasada, dentro de la ventana
+        window.add(-1800, 9.0)  # atrasada, ya fuera de la ventana
+        self.assertEqual(window.total, 7.0)
+        window.add(3650, 1.0)
+        self.assertEqual(window.total, 7.0)
+        window.add(4300, 1.0)  # expira la atrasada de 600
+        self.assertEqual(list(window.readings), [(1800, 1.0), (3650, 1.0), (4300, 1.0)])
+        self.assertEqual(window.total, 3.0)
+
+    def test_severity_thresholds(self):
+        self.assertIsNone(severity_for(0.99))
+        self.assertEqual(severity_for(1.0), 'media')
+        self.assertEqual(severity_for(1.25), 'alta')
+        self.assertEqual(severity_for(1.49), 'alta')
+        self.assertEqual(severity_for(1.5), 'grave')
+
+    def test_cooldown_deduplicates_alerts(self):
+        engine = RuleEngine(window_seconds=3600, cooldown_seconds=3600)
+        alerts = self.evaluate(engine, self.reading(0, '1.300'), self.reading(10, '0.100'))
+        self.assertEqual([(alert.alert_type, alert.severity) for alert in alerts], [('high_consumption', 'alta')])
+        self.assertEqual(self.evaluate(engine, self.reading(30, '1.000')), [])
+        later = self.evaluate(engine, self.reading(70, '2.000'))
+        self.assertEqual([(alert.alert_type, alert.severity) for alert in later], [('high_consumption', 'grave')])
+
+    def test_rolled_back_batch_leaves_no_state(self):
+        engine = RuleEngine(window_seconds=3600, cooldown_seconds=3600)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.assertEqual(len(engine.process([self.reading(0, '2.000')])), 1)
+                raise RuntimeError('ingest failed')
+        self.assertEqual(engine.device_windows, {})
+        self.assertEqual(engine.last_alert, {})
+        # Reintento de la misma ingesta: vuelve a alertar
+        self.assertEqual(len(self.evaluate(engine, self.reading(0, '2.000'))), 1)
+        self.assertEqual(engine.device_windows[self.device.pk].total, 2.0)
+
+
+# Reinicio del detector de anomalías (anomalies.py)
+class AnomalyResetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Anomalies', email='anomalies@example.com')
+        category = Category.objects.create(organization=cls.organization, name='Meters')
+        zone = Zone.objects.create(organization=cls.organization, name='Plant', max_capacity=10)
+        cls.device = Device.objects.create(organization=cls.organization, name='Meter', category=category,
+                                           zone=zone, power_watts=1000, consumption=0)
+        start = timezone.now() - timedelta(days=5)
+        Measurement.objects.bulk_create(
+            Measurement(organization=cls.organization, device=cls.device, timestamp=start + timedelta(hours=hour),
+                        consumption_kwh=Decimal('50.000') if hour % 40 == 39 else Decimal('1.000') + hour % 3)
+            for hour in range(24 * 5)
+        )
+        Alert.objects.create(organization=cls.organization, device=cls.device, alert_type='high_consumption',
+                             severity='media', message='rule alert', alert_date=start)
+
+    def anomalies(self):
+        return sorted(Alert.all_objects.filter(alert_type='anomaly').values_list('alert_date', 'message'))
+
+    def test_reset_rescores_without_duplicating_alerts(self):
+        detect_anomalies()
+        first = self.anomalies()
+        self.assertTrue(first)
+
+        with mock.patch('dispositivos.anomalies.invalidate_organization_blocks') as invalidate, \
+                self.captureOnCommitCallbacks(execute=True) as callbacks, \
+                self.assertNumQueries(6):  # savepoint, organizaciones, 3 DELETE, release
+            reset_anomaly_state()
+        self.assertEqual(len(callbacks), 1)
+        invalidate.assert_called_once_with(self.organization.id)
+        self.assertFalse(Alert.all_objects.filter(alert_type='anomaly').exists())
+        self.assertFalse(AnomalyState.objects.exists())
+        self.assertFalse(Watermark.objects.filter(name='anomaly_detector').exists())
+        self.assertEqual(Alert.objects.filter(alert_type='high_consumption').count(), 1)
+
+        with mock.patch('dispositivos.anomalies.publish_alerts'):
+            detect_anomalies()
+        self.assertEqual(self.anomalies(), first)
+
+
+# Validadores HTTP de la API de sólo lectura (api.py)
+class ApiConditionalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Api', email='api@example.com')
+        category = Category.objects.create(organization=cls.organization, name='Meters')
+        zone = Zone.objects.create(organization=cls.organization, name='Plant', max_capacity=10)
+        cls.devices = [
+            Device.objects.create(organization=cls.organization, name=f'Meter {number}', category=category,
+                                  zone=zone, power_watts=1000, consumption=0)
+            for number in range(3)
+        ]
+        cls.user = User.objects.create_user('api', password='api')
+        Membership.objects.create(user=cls.user, organization=cls.organization)
+
+    def setUp(self):
+        reset_process_state()
+        self.client.force_login(self.user)
+
+    def test_list_uses_only_etag(self):
+        response = self.client.get('/api/v1/devices/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/v1/devices/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Sin Last-Modified, If-Modified-Since nunca da un 304
+        future = 'Fri, 01 Jan 2100 00:00:00 GMT'
+        self.assertEqual(self.client.get('/api/v1/devices/', HTTP_IF_MODIFIED_SINCE=future).status_code, 200)
+
+        # La fila más reciente sale de la página: el ETag cambia
+        self.devices[-1].soft_delete()
+        response = self.client.get('/api/v1/devices/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_detail_uses_etag_and_last_modified(self):
+        url = f'/api/v1/devices/{self.devices[0].pk}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        Device.objects.filter(pk=self.devices[0].pk).update(
+            name='Renamed', updated_at=F('updated_at') + timedelta(seconds=2))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    def test_soft_delete_touches_measurements_and_alerts(self):
+        device = self.devices[0]
+        measurement = Measurement.objects.create(organization=self.organization, device=device,
+                                                 timestamp=timezone.now(), consumption_kwh=Decimal('1.000'))
+        alert = Alert.objects.create(organization=self.organization, device=device, alert_type='high_consumption',
+                                     severity='media', message='load', alert_date=timezone.now())
+        device.soft_delete()
+        device.refresh_from_db()
+        for obj in (measurement, alert):
+            before = obj.updated_at
+            obj = type(obj).all_objects.get(pk=obj.pk)
+            self.assertEqual(obj.updated_at, device.deleted_at)
+            self.assertGreater(obj.updated_at, before)
+
+
+# Índice de búsqueda de dispositivos (search.py)
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Search', email='search@example.com')
+        category = Category.objects.create(organization=cls.organization, name='Solar')
+        zone = Zone.objects.create(organization=cls.organization, name='Roof', max_capacity=10)
+        cls.device = Device.objects.create(organization=cls.organization, name='Solar Panels', category=category,
+                                           zone=zone, power_watts=2500, consumption=0)
+
+    def setUp(self):
+        reset_process_state()
+
+    def test_page_comes_from_the_index(self):
+        search_index.search(self.organization.id)
+        with self.assertNumQueries(1):  # sólo la versión de la organización
+            result = search_index.search(self.organization.id, query='sol pan')
+        self.assertEqual(result.items, [{'id': self.device.pk, 'name': 'Solar Panels', 'model': '',
+                                         'category': 'Solar', 'zone': 'Roof', 'status': 'active',
+                                         'power_watts': 2500}])
+        self.device.power_watts = 3000
+        self.device.save()
+        self.assertEqual(search_index.search(self.organization.id).items[0]['power_watts'], 3000)
+
+    def test_version_is_read_without_the_lock(self):
+        held = []
+        version = search.organization_version
+
+        def try_lock():
+            if search_index._lock.acquire(timeout=1):
+                search_index._lock.release()
+                held.append(True)
+
+        def probe(organization_id):
+            # Otro hilo debe poder tomar el lock mientras se consulta la versión
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+            return version(organization_id)
+
+        with mock.patch.object(search, 'organization_version', probe):
+            search_index.search(self.organization.id)
+            search_index.search(self.organization.id)
+        self.assertEqual(held, [True, True])
+
+
+# Archivo mensual de mediciones (archive.py): crea tablas, fuera de una transacción
+class ArchiveTests(TransactionTestCase):
+    now = timezone.make_aware(datetime(2024, 6, 15, 12))
+
+    def setUp(self):
+        reset_process_state()
+        self.organization = Organization.objects.create(name='Archive', email='archive@example.com')
+        category = Category.objects.create(organization=self.organization, name='Meters')
+        zone = Zone.objects.create(organization=self.organization, name='Plant', max_capacity=10)
+        self.device = Device.objects.create(organization=self.organization, name='Meter', category=category,
+                                            zone=zone, power_watts=1000, consumption=0)
+        # Días 10 y 20 de enero a marzo (se archivan) y de junio (quedan en la tabla principal)
+        Measurement.objects.bulk_create(
+            self.reading(datetime(2024, month, day, hour), Decimal(month * 100 + day).scaleb(-2))
+            for month in (1, 2, 3, 6) for day in (10, 20) for hour in (0, 12)
+        )
+        self.all_rows = self.history()
+
+    def tearDown(self):
+        drop_archive_tables()
+
+    def reading(self, moment, kwh):
+        return Measurement(organization=self.organization, device=self.device,
+                           timestamp=timezone.make_aware(moment), consumption_kwh=kwh)
+
+    def history(self, since=None, until=None):
+        return list(read_history(lambda queryset: queryset.filter(device=self.device),
+                                 ('timestamp', 'id', 'consumption_kwh'), since=since, until=until))
+
+    def archive(self, **options):
+        return [(month.month, rows, status)
+                for month, rows, status in archive_measurements(retention_days=60, now=self.now, **options)]
+
+    def hourly_rollups(self):
+        return sorted(DeviceRollup.objects.filter(period='hour').values_list(
+            'bucket_start', 'total_kwh', 'reading_count'))
+
+    def test_months_wait_for_rollups(self):
+        self.assertEqual(self.archive(), [(1, 4, 'pending_rollups'), (2, 4, 'pending_rollups'),
+                                          (3, 4, 'pending_rollups')])
+        update_rollups()
+        self.assertEqual(self.archive(dry_run=True), [(1, 4, 'dry_run'), (2, 4, 'dry_run'), (3, 4, 'dry_run')])
+        self.assertEqual(Measurement.objects.count(), 16)
+        self.assertFalse(MeasurementArchive.objects.exists())
+
+    def test_archive_moves_months_and_reads_through(self):
+        update_rollups()
+        rollups = self.hourly_rollups()
+        self.assertEqual(self.archive(), [(1, 4, 'archived'), (2, 4, 'archived'), (3, 4, 'archived')])
+
+        self.assertEqual(Measurement.objects.count(), 4)
+        self.assertEqual(hot_boundary(), timezone.make_aware(datetime(2024, 4, 1)))
+        archives = MeasurementArchive.objects.order_by('month')
+        self.assertEqual([(archive.table_name, archive.row_count) for archive in archives],
+                         [(f'dispositivos_measurement_2024{month:02}', 4) for month in (1, 2, 3)])
+        self.assertEqual(archives[1].first_timestamp, timezone.make_aware(datetime(2024, 2, 10)))
+        self.assertEqual(archives[1].last_timestamp, timezone.make_aware(datetime(2024, 2, 20, 12)))
+
+        # Misma historia, con los mismos ids, en orden cronológico
+        self.assertEqual(self.history(), self.all_rows)
+        since, until = timezone.make_aware(datetime(2024, 2, 15)), timezone.make_aware(datetime(2024, 6, 11))
+        self.assertEqual(self.history(since, until), [row for row in self.all_rows if since <= row[0] < until])
+        recent = timezone.make_aware(datetime(2024, 5, 1))
+        with self.assertNumQueries(2):  # Sólo el límite del archivo y la tabla principal
+            self.assertEqual(self.history(since=recent), self.all_rows[-4:])
+
+        # Los agregados no cambian, ni al reconstruirlos desde las tablas de archivo
+        self.assertEqual(self.hourly_rollups(), rollups)
+        rebuild_rollups()
+        self.assertEqual(self.hourly_rollups(), rollups)
+
+    def test_late_reading_in_archived_month(self):
+        update_rollups()
+        self.archive()
+        late = self.reading(datetime(2024, 2, 15, 6), Decimal('9.999'))
+        late.save()
+        history = self.history()
+        self.assertEqual(len(history), len(self.all_rows) + 1)
+        self.assertEqual(history[6][1:], (late.id, Decimal('9.999')))
+        self.assertEqual([row[0] for row in history], sorted(row[0] for row in history))
+
+        # Pendiente hasta que los agregados la procesan; después se suma al mes ya archivado
+        self.assertEqual(self.archive(), [(2, 1, 'pending_rollups')])
+        update_rollups()
+        self.assertEqual(self.archive(), [(2, 1, 'archived')])
+        self.assertEqual(MeasurementArchive.objects.get(month=datetime(2024, 2, 1).date()).row_count, 5)
+        self.assertEqual(self.history(), history)
+
+
+# Borrado lógico y purga en bloques, archivo y agregados (purge.py, rollups.py)
+class SoftDeleteLifecycleTests(TransactionTestCase):
+    def setUp(self):
+        reset_process_state()
+        self.organization = Organization.objects.create(name='Lifecycle', email='lifecycle@example.com')
+        category = Category.objects.create(organization=self.organization, name='Meters')
+        zone = Zone.objects.create(organization=self.organization, name='Plant', max_capacity=10)
+        self.deleted, self.kept = (
+            Device.objects.create(organization=self.organization, name=name, category=category, zone=zone,
+                                  power_watts=1000, consumption=0)
+            for name in ('Deleted', 'Kept')
+        )
+        now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        # Un día hace ~5 meses (se archiva) y los últimos 3 días (se empaquetan salvo el último)
+        moments = [now - timedelta(days=150, hours=hour) for hour in range(24)]
+        moments += [now - timedelta(hours=hour, minutes=10) for hour in range(1, 72)]
+        Measurement.objects.bulk_create(
+            Measurement(organization=self.organization, device=device, timestamp=moment,
+                        consumption_kwh=Decimal('1.500') if device.name == 'Kept' else Decimal('4.000'))
+            for device in (self.deleted, self.kept) for moment in moments
+        )
+        update_rollups()
+        detect_anomalies()
+        self.assertEqual(archive_measurements(retention_days=60)[0][2], 'archived')
+        pack_measurements(delete_rows=True)
+        self.assertTrue(ReadingBlock.objects.filter(device=self.deleted).exists())
+
+    def tearDown(self):
+        drop_archive_tables()
+
+    def hourly(self, model, period='hour', **filters):
+        return sorted(model.objects.filter(period=period, **filters).values_list(
+            'bucket_start', 'total_kwh', 'min_kwh', 'max_kwh', 'reading_count'))
+
+    def readings(self, device):
+        return list(read_history(lambda queryset: queryset.filter(device=device), ('timestamp', 'id')))
+
+    def assert_only_kept_device(self):
+        self.assertEqual(self.hourly(DeviceRollup, device=self.deleted), [])
+        self.assertEqual(self.hourly(ZoneRollup), self.hourly(DeviceRollup, device=self.kept))
+
+    def test_soft_delete_hides_then_purge_removes(self):
+        kept_rollups = self.hourly(DeviceRollup, device=self.kept)
+        self.assertGreater(len(self.readings(self.deleted)), 24)
+        self.deleted.soft_delete()
+
+        # Oculto: lecturas de archivo, tabla principal y bloques
+        self.assertEqual(self.readings(self.deleted), [])
+        ms, _ = read_series(lambda queryset: queryset.filter(device=self.deleted),
+                            timezone.now() - timedelta(days=200), timezone.now())
+        self.assertEqual(len(ms), 0)
+        self.assertEqual(list(export_history(lambda queryset: queryset.filter(device=self.deleted))), [])
+
+        # Reconstruir no vuelve a sumar sus bloques ni sus filas archivadas
+        rebuild_rollups()
+        self.assert_only_kept_device()
+        self.assertEqual(self.hourly(DeviceRollup, device=self.kept), kept_rollups)
+
+        # Purga: bloques, filas archivadas y agregados desaparecen con el dispositivo
+        counts = purge_deleted(now=timezone.now() + timedelta(days=31))
+        self.assertEqual(counts['Device'], 1)
+        self.assertFalse(Device.all_objects.filter(pk=self.deleted.pk).exists())
+        self.assertFalse(ReadingBlock.objects.filter(device_id=self.deleted.pk).exists())
+        for model in archived_models():
+            self.assertFalse(model.objects.filter(device_id=self.deleted.pk).exists())
+            self.assertEqual(MeasurementArchive.objects.get(table_name=model._meta.db_table).row_count, 24)
+        rebuild_rollups()
+        self.assertEqual(self.hourly(DeviceRollup, device=self.kept), kept_rollups)
+        self.assertEqual(self.hourly(ZoneRollup), kept_rollups)
+
+    def test_incremental_rollups_match_rebuild_after_soft_delete(self):
+        kept_rollups = self.hourly(DeviceRollup, device=self.kept)
+        self.deleted.soft_delete()
+        self.assert_only_kept_device()
+        self.assertEqual(self.hourly(DeviceRollup, device=self.kept), kept_rollups)
+
+        # Una lectura nueva del dispositivo vivo sigue el camino incremental
+        Measurement.objects.create(organization=self.organization, device=self.kept,
+                                   timestamp=timezone.now().replace(minute=50, second=0, microsecond=0),
+                                   consumption_kwh=Decimal('2.000'))
+        update_rollups()
+        incremental = {period: self.hourly(ZoneRollup, period) for period in ('hour', 'day')}
+        self.assert_only_kept_device()
+
+        rebuild_rollups()
+        self.assertEqual({period: self.hourly(ZoneRollup, period) for period in ('hour', 'day')}, incremental)
+        self.assert_only_kept_device()
@@ -1,16 +1,46 @@
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from datetime import datetime, timedelta
-from .models import Device, Category, Zone, Measurement, Alert, Organization
-from .forms import DeviceForm  # Necesitas actualizar este archivo también
+import asyncio
+from asgiref.sync import sync_to_async
+from .models import Device, Category, Zone, Measurement, Alert, MonthlyReport, Organization
+from .forms import DeviceForm, MeasurementFilterForm
+from .ingestion import PayloadError, UnsupportedContentType, ingest_measurements, parse_payload
+from .services import ALERT_TYPE_LABELS, SEVERITY_LABELS, dashboard_stats
+from .rollups import device_daily_consumption, zone_consumption
+from .analytics import device_analytics, zone_analytics
+from .forecasting import device_forecast, zone_forecast
+from .reports import render_csv, report_context
+from .caching import cached_block, stats as cache_stats
+from .export import CONTENT_TYPES, export_history, stream_measurements
+from .zoneload import tracker as zone_load
+from .search import STATUS_LABELS, index as search_index
+from .events import broker, format_event
+from .api import RESOURCES, ApiError
+from .instrumentation import metrics_snapshot
+from .pagination import (
+    MEASUREMENT_ORDERING, InvalidCursor, get_page_size, keyset_paginate,
+)
+
+# Segundos sin eventos antes de enviar un keep-alive por el feed en vivo
+LIVE_FEED_HEARTBEAT_SECONDS = 15
+# Bajo WSGI el feed responde un lote y cierra; el navegador reconecta tras este intervalo
+LIVE_FEED_RETRY_MS = 10000
 
 # Dashboard principal - requerido por la evaluación
 def dashboard(request):
-    # Por ahora usar la primera organización, después se vinculará con autenticación
+    # Organización resuelta por OrganizationMiddleware
     try:
-        organization = Organization.objects.first()
-        if not organization:
-            # Crear organización por defecto si no existe
+        organization = request.organization
+        if not organization and not request.user.is_authenticated:
+            # Crear organización por defecto si no existe (sólo la demo anónima)
             organization = Organization.objects.create(
                 name="Demo Organization", 
                 email="demo@ecoenergy.com"
@@ -24,67 +54,123 @@ def dashboard(request):
             organization=organization
         ).select_related('device').order_by('-timestamp')[:10]
         
-        # Dispositivos por categoría (conteo)
-        devices_by_category = {}
-        categories = Category.objects.filter(organization=organization)
-        for category in categories:
-            count = Device.objects.filter(category=category, organization=organization).count()
-            devices_by_category[category.name] = count
+        # Conteos por categoría, zona y severidad con consultas agrupadas (cacheados)
+        stats = cached_block(organization, 'dashboard_stats', lambda: dashboard_stats(organization))
+        devices_by_category = stats['devices_by_category']
+        devices_by_zone = stats['devices_by_zone']
+        alerts_by_severity = stats['alerts_by_severity']
         
-        # Dispositivos por zona (conteo)
-        devices_by_zone = {}
-        zones = Zone.objects.filter(organization=organization)
-        for zone in zones:
-            count = Device.objects.filter(zone=zone, organization=organization).count()
-            devices_by_zone[zone.name] = count
+        # Consumo de la semana por zona, leído desde los agregados diarios (cacheado)
+        consumption_by_zone = cached_block(
+            organization, 'zone_consumption', lambda: zone_consumption(organization)
+        )
         
-        # Alertas de la semana por severidad
-        week_ago = timezone.now() - timedelta(days=7)
-        alerts_by_severity = {}
-        severities = ['Grave', 'Alto', 'Mediano']
-        for severity in severities:
-            count = Alert.objects.filter(
-                organization=organization,
-                alert_date__gte=week_ago,
-                severity=severity
-            ).count()
-            alerts_by_severity[severity] = count
+        # Carga actual por zona desde el tracker en memoria
+        zone_loads = zone_load.snapshot(organization.id)
     else:
         latest_measurements = []
         devices_by_category = {}
         devices_by_zone = {}
         alerts_by_severity = {}
+        consumption_by_zone = {}
+        zone_loads = []
     
     context = {
         'latest_measurements': latest_measurements,
         'devices_by_category': devices_by_category,
         'devices_by_zone': devices_by_zone,
         'alerts_by_severity': alerts_by_severity,
+        'consumption_by_zone': consumption_by_zone,
+        'zone_loads': zone_loads,
     }
     return render(request, "dispositivos/dashboard.html", context)
 
-# Listado de dispositivos con filtro por categoría
+def _paginate(request, queryset, ordering):
+    """Página por cursor según ?cursor=&page_size=, y query string de la siguiente."""
+    page_size = get_page_size(request.GET.get('page_size'))
+    try:
+        page = keyset_paginate(queryset, ordering, request.GET.get('cursor'), page_size)
+    except InvalidCursor:
+        page = keyset_paginate(queryset, ordering, None, page_size)
+    
+    next_query = None
+    if page.has_next:
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_query = params.urlencode()
+    return page, next_query
+
+def _int_param(request, name):
+    try:
+        return int(request.GET[name])
+    except (KeyError, ValueError):
+        return None
+
+def _device_search(request, organization, cursor=None):
+    """Búsqueda en el índice según ?q=&category=&zone=&status=&page_size=."""
+    status = request.GET.get('status') or None
+    if status not in STATUS_LABELS:
+        status = None
+    # Las facetas se validan contra el índice de la organización (sin
+    # consultar la base): un id ajeno o inválido simplemente no coincide
+    return search_index.search(
+        organization.id if organization else None,
+        query=request.GET.get('q', ''),
+        category=_int_param(request, 'category'),
+        zone=_int_param(request, 'zone'),
+        status=status,
+        cursor=cursor,
+        page_size=get_page_size(request.GET.get('page_size')),
+    )
+
+# Búsqueda de dispositivos por prefijo con conteos por categoría, zona y estado
+def device_search_api(request):
+    organization = request.organization
+    if not organization:
+        return JsonResponse({'error': 'No organization configured'}, status=404)
+    try:
+        result = _device_search(request, organization, request.GET.get('cursor'))
+    except InvalidCursor as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse({
+        'count': result.count,
+        'next_cursor': result.next_cursor,
+        'results': result.items,
+        'facets': result.facets,
+    })
+
+# Listado de dispositivos con búsqueda y filtros por categoría, zona y estado, paginado por cursor
 def device_list(request):
-    organization = Organization.objects.first()  # Temporal
+    organization = request.organization
     
-    devices = Device.objects.filter(organization=organization).select_related("category", "zone")
-    categories = Category.objects.filter(organization=organization)
+    try:
+        result = _device_search(request, organization, request.GET.get('cursor'))
+    except InvalidCursor:
+        result = _device_search(request, organization)
+    # La página sale completa del índice, sin volver a cargar los dispositivos
+    devices = [dict(item, status_label=STATUS_LABELS.get(item['status'], item['status'])) for item in result.items]
     
-    # Filtro por categoría
-    category_filter = request.GET.get('category')
-    if category_filter:
-        devices = devices.filter(category__id=category_filter)
+    next_query = None
+    if result.next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = result.next_cursor
+        next_query = params.urlencode()
     
     context = {
         'devices': devices,
-        'categories': categories,
-        'selected_category': category_filter,
+        'count': result.count,
+        'facets': result.facets,
+        'next_query': next_query,
+        'query': request.GET.get('q', ''),
+        'selected_category': request.GET.get('category'),
+        'selected_zone': request.GET.get('zone'),
+        'selected_status': request.GET.get('status'),
     }
     return render(request, "dispositivos/device_list.html", context)
 
 # Detalle de dispositivo con mediciones y alertas
 def device_detail(request, device_id):
-    organization = Organization.objects.first()  # Temporal
+    organization = request.organization
     device = get_object_or_404(Device, id=device_id, organization=organization)
     
     # Mediciones del dispositivo
@@ -93,47 +179,268 @@ def device_detail(request, device_id):
     # Alertas del dispositivo
     alerts = Alert.objects.filter(device=device).order_by('-alert_date')[:10]
     
+    # Consumo diario de las últimas 2 semanas desde los agregados
+    daily_consumption = device_daily_consumption(device, days=14)
+    
     context = {
         'device': device,
         'measurements': measurements,
         'alerts': alerts,
+        'daily_consumption': daily_consumption,
     }
     return render(request, "dispositivos/device_detail.html", context)
 
-# Listado global de mediciones
+# Listado global de mediciones con filtros, paginado por cursor (timestamp, id)
 def measurement_list(request):
-    organization = Organization.objects.first()  # Temporal
+    organization = request.organization
     
     measurements = Measurement.objects.filter(
         organization=organization
-    ).select_related('device').order_by('-timestamp')[:50]
+    ).select_related('device')
+    
+    filter_form = MeasurementFilterForm(request.GET, organization=organization)
+    measurements = filter_form.filter_queryset(measurements)
+    page, next_query = _paginate(request, measurements, MEASUREMENT_ORDERING)
     
     context = {
-        'measurements': measurements,
+        'measurements': page.items,
+        'page': page,
+        'next_query': next_query,
+        'filter_form': filter_form,
     }
     return render(request, "dispositivos/measurement_list.html", context)
 
+# Exportación de mediciones en streaming (CSV/NDJSON, gzip opcional)
+def measurement_export(request):
+    organization = request.organization
+    # Los superusuarios pueden exportar otra organización con ?organization=<id>
+    if request.user.is_superuser and request.GET.get('organization'):
+        try:
+            organization_id = int(request.GET['organization'])
+        except ValueError:
+            return JsonResponse({'error': 'organization must be an integer'}, status=400)
+        organization = get_object_or_404(Organization, id=organization_id)
+    
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in CONTENT_TYPES:
+        return JsonResponse({'error': 'format must be csv or ndjson'}, status=400)
+    
+    filter_form = MeasurementFilterForm(request.GET, organization=organization)
+    if not filter_form.is_valid():
+        return JsonResponse({'errors': filter_form.errors}, status=400)
+    # Rangos históricos se leen también de las tablas de archivo y de los
+    # bloques empaquetados; el rango de fechas lo aplica export_history
+    rows = export_history(
+        lambda queryset: filter_form.filter_devices(queryset.filter(organization=organization)),
+        since=filter_form.cleaned_data.get('since'),
+        until=filter_form.cleaned_data.get('until'),
+    )
+    
+    compress = request.GET.get('gzip') in ('1', 'true')
+    filename = f'measurements.{fmt}' + ('.gz' if compress else '')
+    response = StreamingHttpResponse(
+        stream_measurements(None, fmt=fmt, compress=compress, rows=rows),
+        content_type='application/gzip' if compress else CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+# Ingesta masiva de mediciones (JSON o CSV) desde los gateways
+@csrf_exempt
+@require_POST
+def measurement_ingest(request):
+    # Sólo usuarios con membresía: el anónimo de la demo no escribe en la
+    # organización por defecto
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    organization = request.organization
+    if not organization:
+        return JsonResponse({'error': 'User has no organization'}, status=403)
+    try:
+        rows = parse_payload(request.body, request.content_type)
+        # Sólo dispositivos de la organización de quien envía el lote
+        result = ingest_measurements(rows, chunk_size=request.GET.get('chunk_size'), organization=organization)
+    except UnsupportedContentType as exc:
+        return JsonResponse({'error': str(exc)}, status=415)
+    except PayloadError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    status = 201 if result.created else 400
+    return JsonResponse(result.as_dict(), status=status)
+
+# Estadísticas del dashboard en JSON
+def dashboard_stats_api(request):
+    organization = request.organization
+    if not organization:
+        return JsonResponse({'error': 'No organization configured'}, status=404)
+    return JsonResponse(cached_block(organization, 'dashboard_stats', lambda: dashboard_stats(organization)))
+
+def _analytics_days(request, default=30):
+    try:
+        days = int(request.GET.get('days', default))
+    except ValueError:
+        days = default
+    return max(1, min(days, 365))
+
+# Estadísticas vectorizadas (NumPy) de un dispositivo
+def device_analytics_api(request, device_id):
+    device = get_object_or_404(Device, id=device_id, organization=request.organization)
+    return JsonResponse(device_analytics(device, days=_analytics_days(request)))
+
+# Estadísticas vectorizadas (NumPy) de una zona frente a su capacidad máxima
+def zone_analytics_api(request, zone_id):
+    zone = get_object_or_404(Zone, id=zone_id, organization=request.organization)
+    return JsonResponse(zone_analytics(zone, days=_analytics_days(request)))
+
+def _forecast_hours(request, default=24):
+    try:
+        hours = int(request.GET.get('hours', default))
+    except ValueError:
+        hours = default
+    return max(1, min(hours, 168))
+
+# Pronóstico de consumo de las próximas horas del dispositivo frente a su potencia nominal
+def device_forecast_api(request, device_id):
+    device = get_object_or_404(Device, id=device_id, organization=request.organization)
+    # GET de sólo lectura: ajusta en memoria desde el estado guardado
+    return JsonResponse(device_forecast(device, hours=_forecast_hours(request), persist=False))
+
+# Pronóstico de carga de la zona frente a max_capacity (anticipa zone_limit_exceeded)
+def zone_forecast_api(request, zone_id):
+    zone = get_object_or_404(Zone, id=zone_id, organization=request.organization)
+    return JsonResponse(zone_forecast(zone, hours=_forecast_hours(request), persist=False))
+
+# Carga actual por zona frente a su capacidad (totales en memoria, sin consultas)
+def zone_load_api(request):
+    organization = request.organization
+    if not organization:
+        return JsonResponse({'error': 'No organization configured'}, status=404)
+    return JsonResponse({'zones': zone_load.snapshot(organization.id)})
+
+# Feed en vivo del dashboard (server-sent events). Con ASGI la conexión queda
+# abierta; bajo WSGI (runserver) Django juntaría todo el stream antes de enviar
+# nada, así que se responde sólo la carga actual y el navegador vuelve a
+# pedirla cada LIVE_FEED_RETRY_MS (sondeo)
+async def live_feed(request):
+    organization = request.organization
+    if not organization:
+        return JsonResponse({'error': 'No organization configured'}, status=404)
+    
+    if not isinstance(request, ASGIRequest):
+        zones = await sync_to_async(zone_load.snapshot)(organization.id)
+        response = HttpResponse(
+            f'retry: {LIVE_FEED_RETRY_MS}\n\n' + format_event('zone_load', {'zones': zones}),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        return response
+    
+    async def events():
+        subscription = broker.subscribe(organization.id)
+        try:
+            # Estado inicial para que el cliente no espere a la primera lectura
+            zones = await sync_to_async(zone_load.snapshot)(organization.id)
+            yield format_event('zone_load', {'zones': zones})
+            while True:
+                try:
+                    event_type, data = await subscription.get(timeout=LIVE_FEED_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comentario SSE: mantiene viva la conexión a través de proxies
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_event(event_type, data)
+        finally:
+            broker.unsubscribe(subscription)
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# API REST de sólo lectura (dispositivos/api.py)
+def _api_resource(name):
+    resource = RESOURCES.get(name)
+    if resource is None:
+        raise Http404('Unknown resource')
+    return resource
+
+def _conditional_json(request, data, etag, last_modified):
+    """Responde 304 si el cliente ya tiene esta versión; si no, el JSON con sus validadores."""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = JsonResponse(data)
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+def api_list(request, resource):
+    spec = _api_resource(resource)
+    try:
+        fields = spec.parse_fields(request.GET.get('fields'))
+        queryset = spec.queryset(request.organization, fields, request.GET)
+        page = keyset_paginate(
+            queryset, spec.ordering, request.GET.get('cursor'), get_page_size(request.GET.get('page_size'))
+        )
+    except (ApiError, InvalidCursor) as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    
+    # Sólo ETag: el Last-Modified de una página no es monótono (ver api.py)
+    etag, _ = spec.version(page.items, resource, fields, page.next_cursor)
+    return _conditional_json(request, {
+        'results': [spec.serialize(obj, fields) for obj in page.items],
+        'next_cursor': page.next_cursor,
+        'page_size': page.page_size,
+    }, etag, None)
+
+def api_detail(request, resource, pk):
+    spec = _api_resource(resource)
+    try:
+        fields = spec.parse_fields(request.GET.get('fields'))
+    except ApiError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    obj = get_object_or_404(spec.queryset(request.organization, fields), pk=pk)
+    etag, last_modified = spec.version([obj], resource, fields)
+    return _conditional_json(request, spec.serialize(obj, fields), etag, last_modified)
+
+# Contadores de aciertos/fallos del caché de bloques
+def cache_stats_api(request):
+    return JsonResponse(cache_stats.snapshot())
+
+# Percentiles de consultas y tiempos por vista (InstrumentationMiddleware)
+def metrics_api(request):
+    return JsonResponse({
+        'enabled': settings.PERFORMANCE_INSTRUMENTATION,
+        'views': metrics_snapshot(),
+    })
+
 # Resumen de alertas de la semana
 def alert_summary(request):
-    organization = Organization.objects.first()  # Temporal
+    organization = request.organization
     week_ago = timezone.now() - timedelta(days=7)
     
-    # Alertas de la semana por severidad
-    alerts_by_severity = {}
-    severities = ['Grave', 'Alto', 'Mediano']
-    for severity in severities:
-        alerts = Alert.objects.filter(
+    # Diccionarios simples y no instancias: el bloque puede vivir en un caché compartido
+    week_alerts = cached_block(organization, 'alert_summary', lambda: [
+        dict(alert, type_label=ALERT_TYPE_LABELS.get(alert['alert_type'], alert['alert_type']))
+        for alert in Alert.objects.filter(
             organization=organization,
-            alert_date__gte=week_ago,
-            severity=severity
-        ).order_by('-alert_date')
-        alerts_by_severity[severity] = alerts
+            alert_date__gte=week_ago
+        ).order_by('-alert_date').values(
+            'id', 'device_id', 'device__name', 'alert_type', 'severity', 'message', 'alert_date'
+        )
+    ])
+    
+    # Alertas de la semana por severidad (agrupadas en memoria, una sola consulta)
+    alerts_by_severity = {label: [] for label in SEVERITY_LABELS.values()}
+    for alert in week_alerts:
+        label = SEVERITY_LABELS.get(alert['severity'])
+        if label:
+            alerts_by_severity[label].append(alert)
     
     # Alertas recientes
-    recent_alerts = Alert.objects.filter(
-        organization=organization,
-        alert_date__gte=week_ago
-    ).select_related('device').order_by('-alert_date')[:10]
+    recent_alerts = week_alerts[:10]
     
     context = {
         'alerts_by_severity': alerts_by_severity,
@@ -141,6 +448,21 @@ def alert_summary(request):
     }
     return render(request, "dispositivos/alert_summary.html", context)
 
+# Informes mensuales precalculados (ver reports.py)
+def monthly_report_list(request):
+    organization = request.organization
+    reports = MonthlyReport.objects.filter(organization=organization).only(
+        'month', 'total_kwh', 'device_count', 'alert_count', 'source_until')
+    return render(request, "dispositivos/monthly_report_list.html", {'reports': reports})
+
+def monthly_report(request, year, month):
+    report = get_object_or_404(MonthlyReport, organization=request.organization, month__year=year, month__month=month)
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(render_csv(report), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="report-{report.month:%Y-%m}.csv"'
+        return response
+    return render(request, "dispositivos/monthly_report.html", report_context(report))
+
 # Funciones CRUD manteniendo compatibilidad
 def inicio(request):
     return dashboard(request)
@@ -166,36 +488,37 @@ def panel_dispositivos(request):
 # CRUD para dispositivos
 def crear_dispositivo(request):
     if request.method == 'POST':
-        form = DeviceForm(request.POST)
+        form = DeviceForm(request.POST, organization=request.organization)
         if form.is_valid():
             device = form.save(commit=False)
-            device.organization = Organization.objects.first()  # Temporal
+            device.organization = request.organization
             device.save()
             return redirect('dashboard')
     else:
-        form = DeviceForm()
+        form = DeviceForm(organization=request.organization)
     return render(request, 'dispositivos/crear.html', {'form': form})
 
 def editar_dispositivo(request, dispositivo_id):
-    organization = Organization.objects.first()  # Temporal
+    organization = request.organization
     device = get_object_or_404(Device, id=dispositivo_id, organization=organization)
     
     if request.method == 'POST':
-        form = DeviceForm(request.POST, instance=device)
+        form = DeviceForm(request.POST, instance=device, organization=organization)
         if form.is_valid():
             form.save()
             return redirect('device_detail', device_id=device.id)
     else:
-        form = DeviceForm(instance=device)
+        form = DeviceForm(instance=device, organization=organization)
     
     return render(request, 'dispositivos/editar.html', {'form': form, 'device': device})
 
 def eliminar_dispositivo(request, dispositivo_id):
-    organization = Organization.objects.first()  # Temporal
+    organization = request.organization
     device = get_object_or_404(Device, id=dispositivo_id, organization=organization)
     
     if request.method == 'POST':
-        device.delete()
+        # Borrado lógico; purge_deleted elimina definitivamente las filas antiguas
+        device.soft_delete()
         return redirect('dashboard')
     
     return render(request, 'dispositivos/eliminar.html', {'device': device})
\ No newline at end of file
@@ -0,0 +1,186 @@
+# dispositivos/zoneload.py
+"""
+Carga actual por zona frente a ``Zone.max_capacity``, mantenida en memoria.
+
+Por cada zona se guardan dos totales acumulados:
+
+- ``device_kw``: suma de ``Device.consumption`` (W) de los dispositivos activos,
+  ajustada por diferencia cuando un dispositivo cambia de consumo, estado o zona.
+- ``measured_kw``: kWh recibidos en la última hora (ventana deslizante), que
+  equivale a la potencia promedio medida.
+
+El estado de cada organización se carga desde la base la primera vez que se
+pide y se vuelve a reconciliar cada ``ZONE_LOAD_RECONCILE_SECONDS`` para
+corregir cambios que no pasan por señales (``QuerySet.update``, otros procesos).
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Device, Measurement, Zone
+from .rules import RollingWindow
+
+DEFAULT_RECONCILE_SECONDS = 300
+WINDOW_SECONDS = 3600
+WARNING_RATIO = 0.8
+
+
+class _ZoneState:
+    __slots__ = ('name', 'capacity_kw', 'device_watts', 'window')
+
+    def __init__(self, name, capacity_kw):
+        self.name = name
+        self.capacity_kw = capacity_kw
+        self.device_watts = 0
+        self.window = RollingWindow(WINDOW_SECONDS)
+
+
+def load_status(ratio):
+    if ratio is None:
+        return 'unknown'
+    if ratio >= 1:
+        return 'over'
+    if ratio >= WARNING_RATIO:
+        return 'warning'
+    return 'ok'
+
+
+def _contribution(device):
+    return device.consumption if device.status == 'active' and device.deleted_at is None else 0
+
+
+class ZoneLoadTracker:
+    def __init__(self, reconcile_seconds=None):
+        self.reconcile_seconds = reconcile_seconds or getattr(
+            settings, 'ZONE_LOAD_RECONCILE_SECONDS', DEFAULT_RECONCILE_SECONDS)
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.organizations = {}  # organization_id -> {zone_id: _ZoneState}
+            self.devices = {}        # device_id -> (organization_id, zone_id, watts)
+            self.loaded = {}         # organization_id -> monotonic de la última reconciliación
+
+    # -- Carga y reconciliación -------------------------------------------------
+
+    def reconcile(self, organization_id):
+        """Reemplaza el estado de la organización por lo que hay en la base (3 consultas)."""
+        zones = {
+            zone_id: _ZoneState(name, float(capacity or 0))
+            for zone_id, name, capacity in Zone.objects.filter(
+                organization_id=organization_id).values_list('id', 'name', 'max_capacity')
+        }
+        devices = {}
+        for device_id, zone_id, consumption, status in Device.objects.filter(
+                organization_id=organization_id).values_list('id', 'zone_id', 'consumption', 'status'):
+            watts = consumption if status == 'active' else 0
+            devices[device_id] = (organization_id, zone_id, watts)
+            if zone_id in zones:
+                zones[zone_id].device_watts += watts
+
+        recent = Measurement.objects.filter(
+            organization_id=organization_id,
+            timestamp__gt=timezone.now() - timedelta(seconds=WINDOW_SECONDS),
+        ).order_by('timestamp').values_list('device__zone_id', 'timestamp', 'consumption_kwh')
+        for zone_id, timestamp, kwh in recent:
+            if zone_id in zones:
+                zones[zone_id].window.add(timestamp.timestamp(), float(kwh))
+
+        with self._lock:
+            for device_id in [d for d, item in self.devices.items() if item[0] == organization_id]:
+                del self.devices[device_id]
+            self.organizations[organization_id] = zones
+            self.devices.update(devices)
+            self.loaded[organization_id] = time.monotonic()
+
+    def _zone(self, organization_id, zone_id):
+        return self.organizations.get(organization_id, {}).get(zone_id)
+
+    def _ensure_loaded(self, organization_id):
+        loaded_at = self.loaded.get(organization_id)
+        if loaded_at is None or time.monotonic() - loaded_at > self.reconcile_seconds:
+            self.reconcile(organization_id)
+
+    # -- Actualizaciones incrementales -----------------------------------------
+
+    def device_changed(self, device):
+        """Aplica la diferencia de consumo/estado/zona de un dispositivo guardado."""
+        with self._lock:
+            if device.organization_id not in self.loaded:
+                return
+            self._remove_device(device.pk)
+            watts = _contribution(device)
+            self.devices[device.pk] = (device.organization_id, device.zone_id, watts)
+            state = self._zone(device.organization_id, device.zone_id)
+            if state is not None:
+                state.device_watts += watts
+
+    def device_removed(self, device_id):
+        with self._lock:
+            self._remove_device(device_id)
+
+    def _remove_device(self, device_id):
+        previous = self.devices.pop(device_id, None)
+        if previous is not None:
+            state = self._zone(previous[0], previous[1])
+            if state is not None:
+                state.device_watts -= previous[2]
+
+    def zone_changed(self, zone):
+        with self._lock:
+            zones = self.organizations.get(zone.organization_id)
+            if zones is None:
+                return
+            state = zones.get(zone.pk)
+            if state is None:
+                zones[zone.pk] = _ZoneState(zone.name, float(zone.max_capacity or 0))
+            else:
+                state.name = zone.name
+                state.capacity_kw = float(zone.max_capacity or 0)
+
+    def zone_removed(self, zone):
+        with self._lock:
+            self.organizations.get(zone.organization_id, {}).pop(zone.pk, None)
+
+    def add_measurements(self, measurements):
+        """Suma las lecturas nuevas a la ventana de su zona (sólo organizaciones cargadas)."""
+        with self._lock:
+            for measurement in measurements:
+                device = self.devices.get(measurement.device_id)
+                if device is None:
+                    continue
+                state = self._zone(device[0], device[1])
+                if state is not None:
+                    state.window.add(measurement.timestamp.timestamp(), float(measurement.consumption_kwh))
+
+    # -- Lectura -----------------------------------------------------------------
+
+    def snapshot(self, organization_id):
+        """Carga de cada zona de la organización, ordenada por nombre."""
+        self._ensure_loaded(organization_id)
+        now = time.time()
+        zones = []
+        with self._lock:
+            for zone_id, state in self.organizations.get(organization_id, {}).items():
+                state.window.expire(now)
+                device_kw = state.device_watts / 1000
+                measured_kw = max(state.window.average_kw(), 0.0)
+                ratio = max(device_kw, measured_kw) / state.capacity_kw if state.capacity_kw else None
+                zones.append({
+                    'zone': zone_id,
+                    'name': state.name,
+                    'capacity_kw': round(state.capacity_kw, 3),
+                    'device_kw': round(device_kw, 3),
+                    'measured_kw': round(measured_kw, 3),
+                    'utilization': round(ratio, 4) if ratio is not None else None,
+                    'status': load_status(ratio),
+                })
+        zones.sort(key=lambda item: item['name'])
+        return zones
+
+
+tracker = ZoneLoadTracker()
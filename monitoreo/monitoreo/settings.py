@@ -40,10 +40,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Sólo se activa con PERFORMANCE_INSTRUMENTATION = True
+    'dispositivos.instrumentation.InstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'dispositivos.middleware.OrganizationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -73,6 +76,17 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Base de pruebas en archivo: los trabajos de jobs.py la abren desde otros procesos
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    }
+}
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ecoenergy',
     }
 }
 
@@ -121,4 +135,74 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 DEFAULT_FROM_EMAIL = 'EcoEnergy <noreply@ecoenergy.com>'
 EMAIL_USE_LOCALTIME = True
-DEFAULT_CHARSET = 'utf-8'
\ No newline at end of file
+DEFAULT_CHARSET = 'utf-8'
+
+# Ingesta masiva de mediciones
+MEASUREMENT_INGEST_CHUNK_SIZE = 1000
+MEASUREMENT_INGEST_MAX_ROWS = 50000
+
+# Caché en proceso de la organización de cada usuario (OrganizationMiddleware)
+ORGANIZATION_CACHE_SIZE = 1024
+ORGANIZATION_CACHE_TTL = 300  # segundos
+
+# Caché de bloques del dashboard y resumen de alertas (dispositivos/caching.py).
+# LocMemCache es por proceso: con varios workers o comandos de gestión que
+# invalidan, usar un alias compartido, p. ej.
+#   CACHES['shared'] = {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#                       'LOCATION': 'redis://127.0.0.1:6379'}
+#   DISPOSITIVOS_CACHE_ALIAS = 'shared'
+DISPOSITIVOS_CACHE_ALIAS = 'default'
+DISPOSITIVOS_CACHE_TIMEOUT = 300  # segundos
+
+# Motor de reglas de alertas en la ingesta (dispositivos/rules.py)
+ALERT_RULE_WINDOW_SECONDS = 3600
+ALERT_RULE_COOLDOWN_SECONDS = 3600
+
+# Minutos sin lecturas para considerar un dispositivo desconectado (sweep_offline_devices)
+DEVICE_OFFLINE_AFTER_MINUTES = 30
+
+# Días de mediciones en la tabla principal; lo anterior va a tablas mensuales (archive_measurements)
+MEASUREMENT_RETENTION_DAYS = 90
+
+# Días de agregados horarios usados para ajustar los pronósticos (forecasting.py)
+FORECAST_HISTORY_DAYS = 28
+
+# Detección de anomalías por dispositivo (detect_anomalies, dispositivos/anomalies.py)
+ANOMALY_Z_THRESHOLD = 3.5  # desviaciones para considerar una lectura anómala
+ANOMALY_WARMUP_READINGS = 24  # lecturas antes de empezar a puntuar
+ANOMALY_FLATLINE_READINGS = 12  # lecturas idénticas seguidas de un medidor trabado
+ANOMALY_COOLDOWN_SECONDS = 3600
+
+# Dispositivos de mayor consumo listados en cada informe mensual (build_reports)
+REPORT_TOP_DEVICES = 10
+
+# Antigüedad mínima (días) de un día completo para empaquetarlo en bloques (pack_measurements)
+READING_BLOCK_AFTER_DAYS = 1
+
+# Días que una fila con borrado lógico se conserva antes de purge_deleted
+SOFT_DELETE_PURGE_AFTER_DAYS = 30
+
+# Segundos entre reconciliaciones de la carga por zona en memoria (zoneload.py)
+ZONE_LOAD_RECONCILE_SECONDS = 300
+
+# Segundos entre reconstrucciones del índice de búsqueda de dispositivos (search.py)
+DEVICE_SEARCH_RECONCILE_SECONDS = 300
+
+# Reintentos de un fragmento de run_job que falla por "database is locked" (SQLite)
+JOB_LOCK_RETRIES = 5
+
+# Instrumentación de rendimiento por vista (dispositivos/instrumentation.py).
+# Desactivada por defecto; las métricas quedan en /api/metrics/
+PERFORMANCE_INSTRUMENTATION = False
+PERFORMANCE_SAMPLE_SIZE = 1000
+# Presupuestos por nombre de URL; 'default' aplica al resto. Los de consultas
+# (medidos con el caché de bloques frío, +1 de margen) también los verifica
+# dispositivos.testing.check_view_budgets
+PERFORMANCE_BUDGETS = {
+    'default': {'queries': 25, 'sql_ms': 200, 'total_ms': 500},
+    'dashboard': {'queries': 12},
+    'device_list': {'queries': 8},
+    'device_detail': {'queries': 9},
+    'measurement_list': {'queries': 7},
+    'alert_summary': {'queries': 4},
+}
@@ -22,6 +22,22 @@ from django.urls import path
 from dispositivos.views import (
     # Vistas principales requeridas por la evaluación
     dashboard, device_list, device_detail, measurement_list, alert_summary,
+    # Ingesta masiva de mediciones
+    measurement_ingest, measurement_export,
+    # Estadísticas agregadas en JSON
+    dashboard_stats_api, cache_stats_api, zone_load_api, metrics_api,
+    # Feed en vivo (SSE, ASGI)
+    live_feed,
+    # API REST de sólo lectura
+    api_list, api_detail,
+    # Analítica de consumo
+    device_analytics_api, zone_analytics_api,
+    # Pronóstico de consumo
+    device_forecast_api, zone_forecast_api,
+    # Búsqueda de dispositivos
+    device_search_api,
+    # Informes mensuales
+    monthly_report_list, monthly_report,
     # Vistas CRUD
     crear_dispositivo, editar_dispositivo, eliminar_dispositivo,
     # Vistas originales para compatibilidad
@@ -50,6 +66,22 @@ urlpatterns = [
     path('devices/<int:device_id>/', device_detail, name='device_detail'),  # HU3 - Detalle
     path('measurements/', measurement_list, name='measurement_list'),  # HU4 - Lista mediciones
     path('alerts/', alert_summary, name='alert_summary'),  # HU5 - Resumen alertas
+    path('reports/', monthly_report_list, name='monthly_report_list'),
+    path('reports/<int:year>/<int:month>/', monthly_report, name='monthly_report'),
+    path('measurements/ingest/', measurement_ingest, name='measurement_ingest'),
+    path('measurements/export/', measurement_export, name='measurement_export'),
+    path('api/dashboard/', dashboard_stats_api, name='dashboard_stats_api'),
+    path('api/cache/stats/', cache_stats_api, name='cache_stats_api'),
+    path('api/metrics/', metrics_api, name='metrics_api'),
+    path('api/devices/search/', device_search_api, name='device_search_api'),
+    path('api/devices/<int:device_id>/analytics/', device_analytics_api, name='device_analytics_api'),
+    path('api/zones/<int:zone_id>/analytics/', zone_analytics_api, name='zone_analytics_api'),
+    path('api/devices/<int:device_id>/forecast/', device_forecast_api, name='device_forecast_api'),
+    path('api/zones/<int:zone_id>/forecast/', zone_forecast_api, name='zone_forecast_api'),
+    path('api/zones/load/', zone_load_api, name='zone_load_api'),
+    path('api/live/', live_feed, name='live_feed'),
+    path('api/v1/<str:resource>/', api_list, name='api_list'),
+    path('api/v1/<str:resource>/<int:pk>/', api_detail, name='api_detail'),
     
     # Rutas CRUD
     path('devices/create/', crear_dispositivo, name='crear_dispositivo'),